@@ -17,7 +17,12 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from rag_project.db.base import Base
 from rag_project.db.models.content import Vector, ContentORM
-from rag_project.db.models.source import RejectReasonORM, CategoryORM, SourceORM, SourceCategoryORM
+from rag_project.db.models.source import (
+    RejectReasonORM, CategoryORM, SourceORM, SourceCategoryORM, SourceContentORM
+)
+from rag_project.db.models.job import IngestionJobORM
+from rag_project.db.models.crawl import CrawlORM, CrawlUrlORM
+from rag_project.db.vector_index import INDEX_NAME
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -35,6 +40,13 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+
+def include_object(object, name, type_, reflected, compare_to):
+    # The vector index is resized / switched by rag_project.db.index_maintenance: its form in the
+    # database differs from the model by design, autogenerate must not revert it
+    return not (type_ == "index" and name == INDEX_NAME)
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -57,6 +69,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -80,7 +93,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_object=include_object
         )
 
         with context.begin_transaction():
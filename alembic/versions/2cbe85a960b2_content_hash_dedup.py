@@ -0,0 +1,63 @@
+"""content_hash_dedup
+
+Revision ID: 2cbe85a960b2
+Revises: bfbb0a7570b5
+Create Date: 2026-10-18 10:41:07.552816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2cbe85a960b2'
+down_revision: Union[str, None] = 'bfbb0a7570b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('source_contents',
+    sa.Column('source_id', sa.Integer(), nullable=False),
+    sa.Column('content_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['content_id'], ['contents.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['source_id'], ['sources.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('source_id', 'content_id')
+    )
+    op.create_index('idx_source_contents_content', 'source_contents', ['content_id'], unique=False)
+
+    # Backfill: same digest as rag_project.utils.text_processing.compute_text_hash
+    op.add_column('contents', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.execute("UPDATE contents SET content_hash = encode(sha256(convert_to(coalesce(content, ''), 'UTF8')), 'hex')")
+
+    # Keep the oldest row of each duplicated content, linked to every source that produced it
+    op.execute("""
+        INSERT INTO source_contents (source_id, content_id)
+        SELECT DISTINCT c.source_id, kept.id
+        FROM contents c
+        JOIN (SELECT content_hash, min(id) AS id FROM contents GROUP BY content_hash) kept
+          ON kept.content_hash = c.content_hash
+        WHERE c.source_id IS NOT NULL
+        ON CONFLICT DO NOTHING
+    """)
+    op.execute("""
+        DELETE FROM contents c
+        USING (SELECT content_hash, min(id) AS id FROM contents GROUP BY content_hash) kept
+        WHERE c.content_hash = kept.content_hash AND c.id <> kept.id
+    """)
+
+    op.alter_column('contents', 'content_hash', nullable=False)
+    op.create_index('ux_content_hash', 'contents', ['content_hash'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Duplicates removed by the upgrade are not restored
+    op.drop_index('ux_content_hash', table_name='contents')
+    op.drop_column('contents', 'content_hash')
+    op.drop_index('idx_source_contents_content', table_name='source_contents')
+    op.drop_table('source_contents')
@@ -0,0 +1,58 @@
+"""compact_vector_index
+
+Revision ID: 45cfe1b94e0f
+Revises: d1787f14dd8f
+Create Date: 2026-10-18 19:05:47.318264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from rag_project.db.vector_index import INDEX_NAME, INDEX_METHODS, STORAGES, default_spec
+
+
+# revision identifiers, used by Alembic.
+revision: str = '45cfe1b94e0f'
+down_revision: Union[str, None] = 'd1787f14dd8f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _ensure_float32_index():
+    # Deterministic whatever the settings: the float32 (default) form of the index, created / restored when
+    # missing or in a compact form, with the same method. Compact storages (VECTOR_STORAGE) are switched by
+    # python -m rag_project.db.index_maintenance --storage ..., which builds concurrently.
+    bind = op.get_bind()
+    current = bind.execute(sa.text(
+        "SELECT am.amname, opc.opcname FROM pg_index i "
+        "JOIN pg_class c ON c.oid = i.indexrelid "
+        "JOIN pg_am am ON am.oid = c.relam "
+        "JOIN pg_opclass opc ON opc.oid = i.indclass[0] "
+        "WHERE c.relname = :name"
+    ), {"name": INDEX_NAME}).first()
+    if current is not None and current.opcname == STORAGES["vector"][0]:
+        return
+
+    rows = bind.execute(sa.text("SELECT count(*) FROM contents")).scalar()
+    if current is not None and current.amname in INDEX_METHODS:
+        spec = default_spec(rows, current.amname)
+    else:
+        spec = default_spec(rows)
+    op.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+    op.execute(spec.create_sql())
+    op.execute(spec.comment_sql())
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # No schema change: compact indexes are expression indexes over contents.embedding (float32, unchanged),
+    # searched through nearest_sql. A no-op on a database at d1787f14dd8f
+    _ensure_float32_index()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Earlier revisions only search the float32 form: a compact index built by index_maintenance is replaced
+    _ensure_float32_index()
@@ -0,0 +1,66 @@
+"""crawl_frontier
+
+Revision ID: 49f5d1059786
+Revises: c8a0ef58efbe
+Create Date: 2026-10-18 15:21:44.607193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '49f5d1059786'
+down_revision: Union[str, None] = 'c8a0ef58efbe'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('crawls',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('seeds', postgresql.ARRAY(sa.Text()), nullable=False),
+    sa.Column('sitemaps', postgresql.ARRAY(sa.Text()), nullable=False),
+    sa.Column('allowed_domains', postgresql.ARRAY(sa.String(length=255)), nullable=False),
+    sa.Column('max_depth', sa.Integer(), nullable=False),
+    sa.Column('max_pages', sa.Integer(), nullable=False),
+    sa.Column('source_type', postgresql.ENUM('DEFAULT', 'WEB', 'PDF', 'YOUTUBE', name='sourcetypeenum', create_type=False), nullable=False),
+    sa.Column('status', postgresql.ENUM('PENDING', 'RUNNING', 'SUCCEEDED', 'FAILED', name='jobstatusenum', create_type=False), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('worker_id', sa.String(length=100), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_crawl_status_id', 'crawls', ['status', 'id'], unique=False)
+
+    op.create_table('crawl_urls',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('crawl_id', sa.Integer(), nullable=False),
+    sa.Column('url', sa.String(length=2000), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.Column('status', sa.Enum('PENDING', 'RUNNING', 'INGESTED', 'UNCHANGED', 'SKIPPED', 'FAILED', name='crawlurlstatusenum'), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('fetched_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['crawl_id'], ['crawls.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ux_crawl_url', 'crawl_urls', ['crawl_id', 'url'], unique=True)
+    op.create_index('idx_crawl_url_frontier', 'crawl_urls', ['crawl_id', 'status', 'depth', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_crawl_url_frontier', table_name='crawl_urls')
+    op.drop_index('ux_crawl_url', table_name='crawl_urls')
+    op.drop_table('crawl_urls')
+    sa.Enum(name='crawlurlstatusenum').drop(op.get_bind(), checkfirst=True)
+    op.drop_index('idx_crawl_status_id', table_name='crawls')
+    op.drop_table('crawls')
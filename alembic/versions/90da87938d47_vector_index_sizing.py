@@ -0,0 +1,39 @@
+"""vector_index_sizing
+
+Revision ID: 90da87938d47
+Revises: 2cbe85a960b2
+Create Date: 2026-10-18 11:52:31.204718
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from rag_project.db.vector_index import INDEX_NAME, default_spec
+
+
+# revision identifiers, used by Alembic.
+revision: str = '90da87938d47'
+down_revision: Union[str, None] = '2cbe85a960b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Replaces the ivfflat (lists = 10) index by one sized from the current row count, whatever the settings:
+    # VECTOR_INDEX_TYPE / VECTOR_STORAGE are applied by python -m rag_project.db.index_maintenance,
+    # which also builds concurrently (this one blocks, inside the migration transaction).
+    rows = op.get_bind().execute(sa.text("SELECT count(*) FROM contents")).scalar()
+    spec = default_spec(rows)
+
+    op.drop_index(INDEX_NAME, table_name='contents')
+    op.execute(spec.create_sql())
+    op.execute(spec.comment_sql())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(INDEX_NAME, table_name='contents')
+    op.create_index(INDEX_NAME, 'contents', ['embedding'], unique=False, postgresql_using='ivfflat', postgresql_with={'lists': 10}, postgresql_ops={'embedding': 'vector_cosine_ops'})
@@ -0,0 +1,33 @@
+"""source_validators
+
+Revision ID: c8a0ef58efbe
+Revises: 90da87938d47
+Create Date: 2026-10-18 14:06:52.318405
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8a0ef58efbe'
+down_revision: Union[str, None] = '90da87938d47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nullable, no backfill: existing sources are fully re-ingested once, then refreshed conditionally
+    op.add_column('sources', sa.Column('etag', sa.String(length=255), nullable=True))
+    op.add_column('sources', sa.Column('last_modified', sa.String(length=64), nullable=True))
+    op.add_column('sources', sa.Column('text_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('sources', 'text_hash')
+    op.drop_column('sources', 'last_modified')
+    op.drop_column('sources', 'etag')
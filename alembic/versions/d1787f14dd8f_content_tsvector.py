@@ -0,0 +1,47 @@
+"""content_tsvector
+
+Revision ID: d1787f14dd8f
+Revises: 49f5d1059786
+Create Date: 2026-10-18 16:42:08.531270
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1787f14dd8f'
+down_revision: Union[str, None] = '49f5d1059786'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # simple dictionaries: lowercase only. The French one drops its stop words and passes the others on (ACCEPT = false)
+    op.execute("CREATE TEXT SEARCH DICTIONARY rag_stop_fr (TEMPLATE = pg_catalog.simple, STOPWORDS = french, ACCEPT = false)")
+    op.execute("CREATE TEXT SEARCH DICTIONARY rag_stop_en (TEMPLATE = pg_catalog.simple, STOPWORDS = english)")
+    op.execute("CREATE TEXT SEARCH CONFIGURATION rag_text (COPY = pg_catalog.simple)")
+    op.execute(
+        "ALTER TEXT SEARCH CONFIGURATION rag_text "
+        "ALTER MAPPING FOR asciiword, word, asciihword, hword, hword_asciipart, hword_part WITH rag_stop_fr, rag_stop_en"
+    )
+    # Stored generated column: the table is rewritten once (ACCESS EXCLUSIVE lock), then kept up to date by Postgres
+    op.add_column('contents', sa.Column(
+        'content_tsv', postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('rag_text', coalesce(content, ''))", persisted=True),
+        nullable=True
+    ))
+    op.create_index('idx_content_tsv', 'contents', ['content_tsv'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_content_tsv', table_name='contents', postgresql_using='gin')
+    op.drop_column('contents', 'content_tsv')
+    op.execute("DROP TEXT SEARCH CONFIGURATION rag_text")
+    op.execute("DROP TEXT SEARCH DICTIONARY rag_stop_en")
+    op.execute("DROP TEXT SEARCH DICTIONARY rag_stop_fr")
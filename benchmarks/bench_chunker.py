@@ -0,0 +1,80 @@
+"""
+Throughput of the chunkers: default_chunker (word count) vs TokenChunker (model tokenizer).
+
+    python -m benchmarks.bench_chunker --size-mb 8 --repeat 3
+    python -m benchmarks.bench_chunker --file page.txt
+
+Also reports how many chunks exceed the model max_seq_length, i.e. get truncated at embedding time.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from rag_project.config import EMBEDDING_MODEL_NAME, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+from rag_project.services.model_registry import model_registry
+from rag_project.utils.text_processing import TokenChunker, default_chunker
+
+WORDS = (
+    "embedding retrieval vector database postgres chunk sentence tokenizer question answer "
+    "le la les des une pour avec dans sur recherche sémantique modèle"
+).split()
+
+
+def fake_document(size_mb: float, seed: int = 0) -> str:
+    rng = np.random.default_rng(seed)
+    sentences = []
+    size = 0
+    while size < size_mb * 1024 * 1024:
+        sentence = " ".join(rng.choice(WORDS, size=rng.integers(5, 40))).capitalize() + "."
+        sentences.append(sentence)
+        size += len(sentence) + 1
+    # Paragraph break every ~8 sentences
+    return "\n\n".join(" ".join(sentences[i:i + 8]) for i in range(0, len(sentences), 8))
+
+
+def run(text: str, model_name: str, max_tokens: int, repeat: int):
+    model = model_registry.get(model_name)
+    token_chunker = TokenChunker.from_model(model, overlap_tokens=CHUNK_OVERLAP_TOKENS)
+    size_mb = len(text.encode("utf-8")) / 1024 / 1024
+
+    chunkers = {
+        "default_chunker": lambda: default_chunker(text, max_tokens),
+        "TokenChunker": lambda: list(token_chunker(text, max_tokens)),
+    }
+
+    print(f"{size_mb:.1f} MB, {model_name} (max_seq_length {model.max_seq_length}), "
+          f"max_tokens {max_tokens}, best of {repeat}")
+    for name, chunk in chunkers.items():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            chunks = chunk()
+            timings.append(time.perf_counter() - start)
+        seconds = min(timings)
+
+        n_tokens = np.array(token_chunker.count_tokens(chunks)) if chunks else np.zeros(1, dtype=int)
+        truncated = int((n_tokens > token_chunker.model_max_tokens).sum())
+        print(f"{name:<16} {seconds:8.3f}s {size_mb / seconds:8.2f} MB/s {len(chunks):8d} chunks  "
+              f"tokens max {n_tokens.max():5d} mean {n_tokens.mean():7.1f}  truncated {truncated}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=float, default=4.0, help="Size of the synthetic document")
+    parser.add_argument("--file", help="Chunk this text file instead of a synthetic document")
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--max-tokens", type=int, default=CHUNK_MAX_TOKENS)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = fake_document(args.size_mb)
+    run(text, args.model, args.max_tokens, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Rows/s of the contents bulk-load paths: ORM executemany (ContentCRUD.bulk_insert)
+vs binary COPY (ContentCRUD.copy_insert).
+
+    python -m benchmarks.bench_copy_loader --rows 50000 --repeat 3
+
+Needs a migrated database, every load is rolled back.
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from rag_project.db.crud.content import ContentCRUD
+from rag_project.db.crud.source import SourceCRUD
+from rag_project.db.session import AsyncSessionLocal, engine
+from rag_project.domain.models import SourceTypeEnum
+from rag_project.utils.text_processing import compute_text_hash
+
+
+def fake_rows(n_rows: int, dim: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    contents = [f"benchmark chunk {i} " + "lorem ipsum dolor sit amet " * 40 for i in range(n_rows)]
+    embeddings = rng.standard_normal((n_rows, dim), dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return contents, embeddings
+
+
+async def run(n_rows: int, dim: int, repeat: int):
+    contents, embeddings = fake_rows(n_rows, dim)
+    hashes = [compute_text_hash(content) for content in contents]
+
+    async with AsyncSessionLocal() as session:
+        source = await SourceCRUD(session).get_or_create_source("benchmark://copy-loader", SourceTypeEnum.DEFAULT)
+        crud = ContentCRUD(session)
+
+        async def orm_path():
+            # Conversion to per-row lists is part of the cost of this path
+            await crud.bulk_insert(
+                [
+                    {'text': text, 'embedding': emb, 'hash': content_hash}
+                    for text, emb, content_hash in zip(contents, embeddings.tolist(), hashes)
+                ],
+                source_id=source.id
+            )
+
+        async def copy_path():
+            await crud.copy_insert(contents, embeddings, np.full(n_rows, source.id), hashes)
+
+        results = {}
+        for name, load in (("orm executemany", orm_path), ("binary copy", copy_path)):
+            timings = []
+            for _ in range(repeat):
+                savepoint = await session.begin_nested()
+                start = time.perf_counter()
+                await load()
+                await session.flush()
+                timings.append(time.perf_counter() - start)
+                await savepoint.rollback()
+            results[name] = min(timings)
+
+        await session.rollback()
+
+    await engine.dispose()
+
+    baseline = results["orm executemany"]
+    print(f"{n_rows} rows, dim {dim}, best of {repeat}")
+    for name, seconds in results.items():
+        print(f"{name:<18} {seconds:8.3f}s {n_rows / seconds:12.0f} rows/s  x{baseline / seconds:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.dim, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Filtered vector search at 1% and 50% selectivity: filters pushed into the index scan vs post-filtering.
+
+    python -m benchmarks.bench_filtered_search --queries 200 --top-k 6
+    python -m benchmarks.bench_filtered_search --selectivity 0.01 0.1 0.5
+
+Needs a populated database; the benchmark categories are written in a transaction that is rolled back.
+For each selectivity a category is put on a random share of the sources, then the filtered top-k is searched:
+  exact: sequential scan, the reference
+  iterative: index scan with the filter, iterative scan (VECTOR_ITERATIVE_SCAN, as the API)
+  no iterative: same, iterative scan off (filtered rows found in the first ef_search / probes candidates only)
+  post-filter: unfiltered top-k, then filtered (the naive way)
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+
+import numpy as np
+from sqlalchemy import text
+
+from benchmarks.bench_vector_index import sample_queries
+from rag_project.db.crud.content import ContentCRUD
+from rag_project.db.session import AsyncSessionLocal, engine
+from rag_project.domain.models import RetrievalFilters
+
+CATEGORY = "bench-filtered-search"
+
+
+async def tag_sources(session, share: float) -> float:
+    # Category on a random share of the sources, returns the share of contents passing the filter
+    await session.execute(text(
+        "DELETE FROM source_categories WHERE category_id = (SELECT id FROM categories WHERE name = :name)"
+    ), {"name": CATEGORY})
+    await session.execute(text(
+        "INSERT INTO source_categories (source_id, category_id) "
+        "SELECT s.id, c.id FROM sources s, categories c WHERE c.name = :name AND random() < :share"
+    ), {"name": CATEGORY, "share": share})
+    passing = (await session.execute(text(
+        "SELECT count(*) FROM contents WHERE EXISTS ("
+        "  SELECT 1 FROM source_contents sc JOIN source_categories scat ON scat.source_id = sc.source_id "
+        "  JOIN categories c ON c.id = scat.category_id WHERE sc.content_id = contents.id AND c.name = :name)"
+    ), {"name": CATEGORY})).scalar()
+    total = (await session.execute(text("SELECT count(*) FROM contents"))).scalar()
+    return passing / max(total, 1)
+
+
+async def timed(queries: np.ndarray, search):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        docs = await search(query.tolist())
+        latencies.append(time.perf_counter() - start)
+        results.append([doc['id'] for doc in docs])
+    return results, np.array(latencies)
+
+
+def report(name: str, results: List[List[int]], exact: List[List[int]], latencies: np.ndarray, top_k: int):
+    recall = np.mean([len(set(found) & set(ref)) / len(ref) for found, ref in zip(results, exact) if ref])
+    rows = np.mean([len(found) for found in results])
+    print(f"  {name:<14} recall@k {recall:6.3f}  rows {rows:5.2f}/{top_k}  "
+          f"mean {1000 * latencies.mean():8.2f} ms  p95 {1000 * np.percentile(latencies, 95):8.2f} ms")
+
+
+async def run(n_queries: int, top_k: int, selectivities: List[float]):
+    async with AsyncSessionLocal() as session:
+        queries = await sample_queries(session, n_queries, noise=0.05)
+        crud = ContentCRUD(session)
+        await session.execute(text("INSERT INTO categories (name) VALUES (:name) ON CONFLICT (name) DO NOTHING"),
+                              {"name": CATEGORY})
+        filters = RetrievalFilters(only_accepted=False, categories=[CATEGORY])
+
+        async def filtered(query):
+            return await crud.find_similar_contents(query, top_k, min_similarity=-1.0, filters=filters)
+
+        async def post_filtered(query):
+            docs = await crud.find_similar_contents(query, top_k, min_similarity=-1.0)
+            passing = await crud.get_contents([doc['id'] for doc in docs], filters)
+            return [doc for doc in docs if doc['id'] in passing]
+
+        for share in selectivities:
+            selectivity = await tag_sources(session, share)
+            print(f"selectivity {100 * selectivity:.1f}% of the contents, {len(queries)} queries, top_k {top_k}")
+
+            await session.execute(text("SET LOCAL enable_indexscan = off"))
+            exact, latencies = await timed(queries, filtered)
+            report("exact", exact, exact, latencies, top_k)
+            await session.execute(text("SET LOCAL enable_indexscan = on"))
+
+            found, latencies = await timed(queries, filtered)
+            report("iterative", found, exact, latencies, top_k)
+
+            await session.execute(text("SET LOCAL hnsw.iterative_scan = off"))
+            await session.execute(text("SET LOCAL ivfflat.iterative_scan = off"))
+            found, latencies = await timed(queries, filtered)
+            report("no iterative", found, exact, latencies, top_k)
+            await session.execute(text("RESET hnsw.iterative_scan"))
+            await session.execute(text("RESET ivfflat.iterative_scan"))
+
+            found, latencies = await timed(queries, post_filtered)
+            report("post-filter", found, exact, latencies, top_k)
+
+        await session.rollback()
+
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=6)
+    parser.add_argument("--selectivity", type=float, nargs="*", default=[0.01, 0.5],
+                        help="Share of the sources in the filtered category")
+    args = parser.parse_args()
+    asyncio.run(run(args.queries, args.top_k, args.selectivity))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Throughput and output equivalence of the HTML extraction backends (HTML_PARSER).
+
+    python -m benchmarks.bench_html_extraction --fetch https://example.org/a https://example.org/b
+    python -m benchmarks.bench_html_extraction --corpus data/html_corpus --repeat 3
+
+--fetch saves the pages (downloaded as the scraper does) to the corpus directory. Without saved
+pages, synthetic ones are generated. Outputs are compared with html5lib, the reference: pages with
+an identical text, and share of the reference paragraphs found.
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from rag_project.exceptions import ScraperError
+from rag_project.services.scraping_service import WebScraper
+from rag_project.utils.html_extraction import EXTRACTORS
+
+REFERENCE = "html5lib"
+
+WORDS = (
+    "embedding retrieval vector database postgres chunk sentence tokenizer question answer "
+    "le la les des une pour avec dans sur recherche sémantique modèle"
+).split()
+
+
+def fake_page(rng: np.random.Generator) -> bytes:
+    def sentence() -> str:
+        return " ".join(rng.choice(WORDS, size=rng.integers(3, 30))).capitalize() + "."
+
+    paragraphs = []
+    for _ in range(rng.integers(20, 200)):
+        text = sentence()
+        if rng.random() < 0.3:
+            text = f"{text} <b>{sentence()}</b> <a href='#'>{sentence()}</a> &amp; {sentence()}"
+        paragraphs.append(f"<p>{text}</p>")
+        if rng.random() < 0.05:
+            paragraphs.append(paragraphs[rng.integers(0, len(paragraphs))])  # Duplicate
+        if rng.random() < 0.05:
+            paragraphs.append(f"<!-- {sentence()} --><script>var x = '{sentence()}';</script>")
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>Page</title>"
+        "<style>p { color: red; }</style></head><body>"
+        "<header>Site header with some navigation text</header>"
+        "<nav><ul><li>Home</li><li>Products and services</li></ul></nav>"
+        f"<main><article>{''.join(paragraphs)}</article></main>"
+        "<aside>Related articles you might like to read</aside>"
+        "<footer>Copyright and legal information</footer></body></html>"
+    ).encode("utf-8")
+
+
+def load_corpus(directory: str) -> Dict[str, bytes]:
+    if not os.path.isdir(directory):
+        return {}
+    pages = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".html"):
+            with open(os.path.join(directory, name), "rb") as f:
+                pages[name] = f.read()
+    return pages
+
+
+async def fetch_corpus(urls: List[str], directory: str):
+    os.makedirs(directory, exist_ok=True)
+    scraper = WebScraper()
+
+    async def save(url: str):
+        try:
+            html = (await scraper.fetch(url)).content
+        except Exception as e:
+            print(f"{url}: {e}")
+            return
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16] + ".html"
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(html)
+        print(f"{url}: {len(html)} bytes -> {name}")
+
+    try:
+        await asyncio.gather(*(save(url) for url in urls))
+    finally:
+        await scraper.aclose()
+
+
+def run(pages: Dict[str, bytes], repeat: int):
+    size_mb = sum(len(html) for html in pages.values()) / 1024 / 1024
+    print(f"{len(pages)} pages, {size_mb:.1f} MB, best of {repeat}")
+
+    outputs = {}
+    for name, extract in EXTRACTORS.items():
+        try:
+            extract(b"<p>warm up</p>")
+        except (ImportError, ScraperError) as e:
+            print(f"{name:<12} skipped: {e}")
+            continue
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            texts = {page: extract(html) for page, html in pages.items()}
+            timings.append(time.perf_counter() - start)
+        outputs[name] = texts
+        seconds = min(timings)
+        print(f"{name:<12} {seconds:8.3f}s {size_mb / seconds:8.2f} MB/s {len(pages) / seconds:8.1f} pages/s")
+
+    if REFERENCE not in outputs:
+        return
+    reference = outputs[REFERENCE]
+    for name, texts in outputs.items():
+        if name == REFERENCE:
+            continue
+        identical = sum(texts[page] == reference[page] for page in pages)
+        found, expected = 0, 0
+        for page in pages:
+            paragraphs = set(reference[page].split("\n\n")) - {""}
+            found += len(paragraphs & set(texts[page].split("\n\n")))
+            expected += len(paragraphs)
+        recall = found / expected if expected else 1.0
+        print(f"{name:<12} identical to {REFERENCE}: {identical}/{len(pages)} pages, "
+              f"{100 * recall:.2f}% of its paragraphs")
+        for page in [page for page in pages if texts[page] != reference[page]][:3]:
+            print(f"    differs: {page}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--corpus", default="data/html_corpus", help="Directory of saved .html pages")
+    parser.add_argument("--fetch", nargs="+", metavar="URL", help="Download these pages to the corpus first")
+    parser.add_argument("--pages", type=int, default=200, help="Synthetic pages when the corpus is empty")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.fetch:
+        asyncio.run(fetch_corpus(args.fetch, args.corpus))
+
+    pages = load_corpus(args.corpus)
+    if not pages:
+        rng = np.random.default_rng(0)
+        pages = {f"synthetic-{i}": fake_page(rng) for i in range(args.pages)}
+    run(pages, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
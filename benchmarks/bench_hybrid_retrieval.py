@@ -0,0 +1,109 @@
+"""
+Vector vs hybrid (full-text + vector, reciprocal rank fusion) retrieval: hit rate, MRR and latency.
+
+    python -m benchmarks.bench_hybrid_retrieval --queries 200 --top-k 6
+    python -m benchmarks.bench_hybrid_retrieval --candidates 20 40 80 --rrf-k 60
+
+Needs a populated database (migrated to the content_tsv column), read only. Queries are built from
+sampled chunks, the chunk they come from is the expected hit:
+  keyword: a question around the most specific term of the chunk (code, acronym, longest word)
+  natural: the first words of the chunk
+"""
+import argparse
+import asyncio
+import re
+import time
+from typing import List, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from rag_project.config import HYBRID_RRF_K, HYBRID_CANDIDATES, ENCODE_BATCH_SIZE
+from rag_project.db.crud.content import ContentCRUD
+from rag_project.db.session import AsyncSessionLocal, engine
+from rag_project.services.model_registry import model_registry
+
+TERM_PATTERN = re.compile(r"\w[\w\-.]*\w")
+KEYWORD_TEMPLATE = "Que signifie {} ?"
+
+
+def specific_term(content: str) -> str:
+    # Codes and acronyms first (digits, inner capitals), then the longest word
+    terms = TERM_PATTERN.findall(content)
+    coded = [term for term in terms if any(ch.isdigit() for ch in term) or any(ch.isupper() for ch in term[1:])]
+    return max(coded or terms or [content[:20]], key=len)
+
+
+async def sample_queries(session, n_queries: int) -> List[Tuple[int, str, str]]:
+    # (content id, keyword question, natural question)
+    rows = (await session.execute(
+        text("SELECT id, content FROM contents WHERE length(content) > 200 ORDER BY random() LIMIT :n"),
+        {"n": n_queries}
+    )).all()
+    return [
+        (content_id, KEYWORD_TEMPLATE.format(specific_term(content)), " ".join(content.split()[:12]))
+        for content_id, content in rows
+    ]
+
+
+async def evaluate(search, questions: List[str], vectors: np.ndarray, expected: List[int]):
+    latencies, ranks = [], []
+    for question, vector, content_id in zip(questions, vectors, expected):
+        start = time.perf_counter()
+        docs = await search(question, vector.tolist())
+        latencies.append(time.perf_counter() - start)
+        ids = [doc['id'] for doc in docs]
+        ranks.append(ids.index(content_id) + 1 if content_id in ids else None)
+    hits = np.mean([rank is not None for rank in ranks])
+    mrr = np.mean([1.0 / rank if rank else 0.0 for rank in ranks])
+    return hits, mrr, np.array(latencies)
+
+
+def report(name: str, hits: float, mrr: float, latencies: np.ndarray):
+    print(f"{name:<34} hit@k {hits:6.3f}  MRR {mrr:6.3f}  "
+          f"mean {1000 * latencies.mean():8.2f} ms  p95 {1000 * np.percentile(latencies, 95):8.2f} ms")
+
+
+async def run(n_queries: int, top_k: int, candidates: List[int], rrf_k: int):
+    model = model_registry.get()  # Default embedding model, as the questions of the API
+
+    async with AsyncSessionLocal() as session:
+        samples = await sample_queries(session, n_queries)
+        expected = [content_id for content_id, _, _ in samples]
+        crud = ContentCRUD(session)
+        print(f"{len(samples)} chunks sampled, top_k {top_k}, rrf_k {rrf_k}")
+
+        for kind, questions in (("keyword", [s[1] for s in samples]), ("natural", [s[2] for s in samples])):
+            vectors = model.encode(questions, batch_size=ENCODE_BATCH_SIZE, normalize_embeddings=True)
+
+            async def vector_search(question, vector):
+                return await crud.find_similar_contents(vector, top_k, min_similarity=-1.0)
+
+            report(f"{kind} vector", *await evaluate(vector_search, questions, vectors, expected))
+
+            for n_candidates in candidates:
+                async def hybrid_search(question, vector):
+                    return await crud.find_hybrid_contents(
+                        question, vector, top_k, min_similarity=-1.0, candidates=n_candidates, rrf_k=rrf_k
+                    )
+
+                report(f"{kind} hybrid candidates={n_candidates}",
+                       *await evaluate(hybrid_search, questions, vectors, expected))
+        await session.rollback()
+
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=6)
+    parser.add_argument("--candidates", type=int, nargs="*", default=[HYBRID_CANDIDATES],
+                        help="Candidates per ranking before fusion")
+    parser.add_argument("--rrf-k", type=int, default=HYBRID_RRF_K)
+    args = parser.parse_args()
+    asyncio.run(run(args.queries, args.top_k, args.candidates, args.rrf_k))
+
+
+if __name__ == "__main__":
+    main()
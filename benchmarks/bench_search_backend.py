@@ -0,0 +1,61 @@
+"""
+Latency of the similarity search backends: pgvector (postgres) vs in process memory-mapped copy (mmap).
+
+    python -m benchmarks.bench_search_backend --queries 500 --top-k 6
+
+Needs a populated database, read only. The mmap copy is synced into --dir first.
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from benchmarks.bench_vector_index import sample_queries
+from rag_project.db.mmap_index import MmapVectorIndex
+from rag_project.db.session import AsyncSessionLocal, engine
+from rag_project.services.search_backend import MmapSearchBackend, PostgresSearchBackend, sync_vector_index
+
+
+async def run(n_queries: int, top_k: int, directory: str, dim: int):
+    index = MmapVectorIndex(directory, dim)
+    await sync_vector_index(index)
+
+    async with AsyncSessionLocal() as session:
+        queries = await sample_queries(session, n_queries, noise=0.05)
+        print(f"{len(index)} rows, {len(queries)} queries, top_k {top_k}")
+
+        # Search alone, then search + contents lookup as seen by RagService
+        timings = {"mmap top-k only": []}
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, top_k)
+            timings["mmap top-k only"].append(time.perf_counter() - start)
+
+        for name, backend in (("postgres", PostgresSearchBackend()), ("mmap", MmapSearchBackend(index))):
+            timings[name] = []
+            for query in queries:
+                start = time.perf_counter()
+                await backend.search(session, query.tolist(), top_k, min_similarity=-1.0)
+                timings[name].append(time.perf_counter() - start)
+        await session.rollback()
+
+    await engine.dispose()
+
+    for name, latencies in timings.items():
+        latencies = np.array(latencies)
+        print(f"{name:<16} mean {1000 * latencies.mean():8.3f} ms  p95 {1000 * np.percentile(latencies, 95):8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=6)
+    parser.add_argument("--dir", default="data/bench_vectors", help="Directory of the memory-mapped copy")
+    parser.add_argument("--dim", type=int, default=384)
+    args = parser.parse_args()
+    asyncio.run(run(args.queries, args.top_k, args.dir, args.dim))
+
+
+if __name__ == "__main__":
+    main()
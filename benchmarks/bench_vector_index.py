@@ -0,0 +1,88 @@
+"""
+Recall@k vs latency of the vector index for a range of probes (ivfflat) / ef_search (hnsw),
+against exact search (sequential scan) on the same queries.
+
+    python -m benchmarks.bench_vector_index --queries 200 --top-k 6
+    python -m benchmarks.bench_vector_index --values 1 4 16 64
+
+Needs a populated database, read only. Queries are stored embeddings with some noise added.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+import numpy as np
+from sqlalchemy import text
+
+from rag_project.db.crud.content import ContentCRUD
+from rag_project.db.session import AsyncSessionLocal, engine
+from rag_project.db.vector_index import get_index_state
+
+DEFAULT_VALUES = {"ivfflat": [1, 2, 4, 8, 16, 32, 64], "hnsw": [10, 20, 40, 80, 160, 320]}
+
+
+async def sample_queries(session, n_queries: int, noise: float, seed: int = 0) -> np.ndarray:
+    rows = (await session.execute(
+        text("SELECT embedding::text FROM contents ORDER BY random() LIMIT :n"), {"n": n_queries}
+    )).scalars()
+    queries = np.array([json.loads(row) for row in rows], dtype=np.float32)
+    queries += noise * np.random.default_rng(seed).standard_normal(queries.shape, dtype=np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+async def search_all(crud: ContentCRUD, queries: np.ndarray, top_k: int, **knobs):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        docs = await crud.find_similar_contents(query.tolist(), top_k, min_similarity=-1.0, **knobs)
+        latencies.append(time.perf_counter() - start)
+        results.append({doc['id'] for doc in docs})
+    return results, np.array(latencies)
+
+
+def report(name: str, latencies: np.ndarray, recall: float):
+    print(f"{name:<18} recall@k {recall:6.3f}  "
+          f"mean {1000 * latencies.mean():8.2f} ms  p95 {1000 * np.percentile(latencies, 95):8.2f} ms")
+
+
+async def run(n_queries: int, top_k: int, noise: float, values: List[int]):
+    async with AsyncSessionLocal() as session:
+        state = await get_index_state(await session.connection())
+        if state is None:
+            raise SystemExit("No vector index, run python -m rag_project.db.index_maintenance first")
+        knob = "probes" if state.method == "ivfflat" else "ef_search"
+        values = values or DEFAULT_VALUES[state.method]
+
+        queries = await sample_queries(session, n_queries, noise)
+        crud = ContentCRUD(session)
+        print(f"{state.rows} rows, {state.method} {state.options}, {len(queries)} queries, top_k {top_k}")
+
+        # Exact search: index scans disabled for this transaction only
+        await session.execute(text("SET LOCAL enable_indexscan = off"))
+        exact, latencies = await search_all(crud, queries, top_k)
+        report("exact", latencies, 1.0)
+        await session.rollback()
+
+        for value in values:
+            found, latencies = await search_all(crud, queries, top_k, **{knob: value})
+            recall = np.mean([len(f & e) / len(e) for f, e in zip(found, exact) if e])
+            report(f"{knob}={value}", latencies, recall)
+        await session.rollback()
+
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=6)
+    parser.add_argument("--noise", type=float, default=0.05, help="Gaussian noise added to the sampled embeddings")
+    parser.add_argument("--values", type=int, nargs="*", help="probes / ef_search values, depends on the index")
+    args = parser.parse_args()
+    asyncio.run(run(args.queries, args.top_k, args.noise, args.values))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Index size, latency and recall@k of the vector storages (float32, halfvec, binary quantized) with re-scoring.
+
+    python -m benchmarks.bench_vector_storage --queries 200 --top-k 6
+    python -m benchmarks.bench_vector_storage --storages halfvec bit --rescore 1 4 8 16 --index-type hnsw
+
+Needs a populated database; the benchmark indexes are built in a transaction that is rolled back
+(blocking build: run it on a copy of a large table). For each storage an index of its form is built,
+then the queries search it for top_k x rescore candidates, re-scored on the float32 embeddings.
+rescore 1 is the ranking of the compact index alone. Reference: exact search (sequential scan).
+"""
+import argparse
+import asyncio
+from typing import List
+
+import numpy as np
+from sqlalchemy import text
+
+from benchmarks.bench_vector_index import sample_queries, search_all
+from rag_project.config import VECTOR_INDEX_TYPE
+from rag_project.db.crud.content import ContentCRUD
+from rag_project.db.session import AsyncSessionLocal, engine
+from rag_project.db.vector_index import INDEX_NAME, INDEX_METHODS, STORAGES, IndexSpec, count_rows, rescore_factor
+
+BENCH_INDEX = "ix_bench_vector_storage"
+
+
+def report(name: str, latencies: np.ndarray, recall: float):
+    print(f"  {name:<12} recall@k {recall:6.3f}  "
+          f"mean {1000 * latencies.mean():8.2f} ms  p95 {1000 * np.percentile(latencies, 95):8.2f} ms")
+
+
+async def relation_mb(session, name: str) -> float:
+    size = (await session.execute(text("SELECT pg_relation_size(CAST(:name AS regclass))"), {"name": name})).scalar()
+    return size / 1024 ** 2
+
+
+async def run(n_queries: int, top_k: int, noise: float, storages: List[str], rescores: List[int], index_type: str):
+    async with AsyncSessionLocal() as session:
+        queries = await sample_queries(session, n_queries, noise)
+        crud = ContentCRUD(session)
+        rows = await count_rows(await session.connection())
+        table_mb = (await session.execute(text("SELECT pg_total_relation_size('contents')"))).scalar() / 1024 ** 2
+        print(f"{rows} rows, contents {table_mb:.0f} MB with its indexes, {index_type}, "
+              f"{len(queries)} queries, top_k {top_k}")
+
+        await session.execute(text("SET LOCAL enable_indexscan = off"))
+        exact, latencies = await search_all(crud, queries, top_k, storage="vector")
+        report("exact", latencies, 1.0)
+        await session.execute(text("SET LOCAL enable_indexscan = on"))
+
+        # Only the benchmark index can serve the searches
+        await session.execute(text(f"DROP INDEX IF EXISTS {INDEX_NAME}"))
+        await session.execute(text("SET LOCAL maintenance_work_mem = '1GB'"))
+        for storage in storages:
+            spec = IndexSpec.for_rows(rows, index_type, storage)
+            await session.execute(text(spec.create_sql(BENCH_INDEX)))
+            print(f"{storage}: index {await relation_mb(session, BENCH_INDEX):.1f} MB")
+
+            factors = [1] if storage == "vector" else rescores or [1, rescore_factor(storage)]
+            for factor in factors:
+                found, latencies = await search_all(crud, queries, top_k, storage=storage, rescore_factor=factor)
+                recall = np.mean([len(f & e) / len(e) for f, e in zip(found, exact) if e])
+                report(f"rescore x{factor}", latencies, recall)
+            await session.execute(text(f"DROP INDEX {BENCH_INDEX}"))
+
+        await session.rollback()
+
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=6)
+    parser.add_argument("--noise", type=float, default=0.05, help="Gaussian noise added to the sampled embeddings")
+    parser.add_argument("--storages", choices=tuple(STORAGES), nargs="*", default=list(STORAGES))
+    parser.add_argument("--rescore", type=int, nargs="*", help="Candidates per result, default: 1 and the storage one")
+    parser.add_argument("--index-type", choices=INDEX_METHODS, default=VECTOR_INDEX_TYPE)
+    args = parser.parse_args()
+    asyncio.run(run(args.queries, args.top_k, args.noise, args.storages, args.rescore, args.index_type))
+
+
+if __name__ == "__main__":
+    main()
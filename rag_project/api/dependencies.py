@@ -1,19 +1,51 @@
-from fastapi import Depends
-from sentence_transformers import SentenceTransformer
+from typing import List, Optional
 
-from rag_project.db.session import get_session
+from fastapi import Query, Request
+
+from rag_project.domain.models import RetrievalFilters, SourceTypeEnum
+from rag_project.services.crawl_service import CrawlService
+from rag_project.services.embedding_batcher import EmbeddingBatcher
+from rag_project.services.embedding_cache import QueryEmbeddingCache
 from rag_project.services.ingestion_service import IngestionService
+from rag_project.services.job_service import JobService
+from rag_project.services.model_registry import ModelRegistry
 from rag_project.services.rag_service import RagService
 
 
-def get_ingestion_service(session=Depends(get_session)) -> IngestionService:
-    return IngestionService(session_factory=lambda: session)
+# Services are app-lifetime singletons built in lifespan, safe to share across requests
+
+def get_ingestion_service(request: Request) -> IngestionService:
+    return request.app.state.ingestion_service
+
+
+def get_job_service(request: Request) -> JobService:
+    return request.app.state.job_service
+
+
+def get_crawl_service(request: Request) -> CrawlService:
+    return request.app.state.crawl_service
+
+
+def get_rag_service(request: Request) -> RagService:
+    return request.app.state.rag_service
+
+
+def get_model_registry(request: Request) -> ModelRegistry:
+    return request.app.state.model_registry
+
+
+def get_embedding_batcher(request: Request) -> EmbeddingBatcher:
+    return request.app.state.embedding_batcher
 
 
-def get_rag_service(session=Depends(get_session)) -> RagService:
-    return RagService(session_factory=lambda: session)
+def get_embedding_cache(request: Request) -> Optional[QueryEmbeddingCache]:
+    return request.app.state.embedding_cache
 
 
-def get_embedding_model() -> SentenceTransformer:
-    # Load model only once (implicit cache)
-    return SentenceTransformer("all-MiniLM-L6-v2")
+def get_retrieval_filters(
+        include_rejected: bool = False,
+        source_type: Optional[List[SourceTypeEnum]] = Query(None),
+        category: Optional[List[str]] = Query(None)
+) -> RetrievalFilters:
+    # Query parameters of the questions: ?source_type=web&category=a&category=b
+    return RetrievalFilters(only_accepted=not include_rejected, source_types=source_type, categories=category)
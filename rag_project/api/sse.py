@@ -0,0 +1,40 @@
+import asyncio
+import json
+from typing import AsyncIterator, Awaitable, Callable
+
+from rag_project.config import SSE_DISCONNECT_POLL_SECONDS
+
+# Server-Sent Events framing, data is JSON so that newlines in tokens cannot break the stream
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # Nginx would otherwise buffer the whole response
+}
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def until_disconnected(tokens: AsyncIterator[str], is_disconnected: Callable[[], Awaitable[bool]],
+                             poll_seconds: float = SSE_DISCONNECT_POLL_SECONDS) -> AsyncIterator[str]:
+    """
+    Items of tokens until the client goes away: checked before every item and every poll_seconds while waiting
+    for the next one, so a stalled upstream does not keep the stream open. Closing tokens is left to the caller.
+    """
+    while True:
+        next_token = asyncio.ensure_future(tokens.__anext__())
+        try:
+            while not (await asyncio.wait({next_token}, timeout=poll_seconds))[0]:
+                if await is_disconnected():
+                    return
+        finally:
+            if not next_token.done():
+                next_token.cancel()
+                await asyncio.wait({next_token})  # tokens can only be closed once its __anext__ is over
+        try:
+            text = next_token.result()
+        except StopAsyncIteration:
+            return
+        if await is_disconnected():
+            return
+        yield text
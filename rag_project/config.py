@@ -0,0 +1,140 @@
+import os
+
+
+def _env_list(name: str, default: str) -> list:
+    return [item.strip() for item in os.environ.get(name, default).split(",") if item.strip()]
+
+
+# Embedding models
+EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+# Models loaded (and warmed) at startup, the default one is always included
+EMBEDDING_MODELS = _env_list("EMBEDDING_MODELS", EMBEDDING_MODEL_NAME)
+EMBEDDING_DEVICE = os.environ.get("EMBEDDING_DEVICE") or None  # None = auto (cuda if available)
+
+# Query embedding micro-batching
+EMBED_BATCH_MAX_SIZE = int(os.environ.get("EMBED_BATCH_MAX_SIZE", 64))
+EMBED_BATCH_WINDOW_MS = float(os.environ.get("EMBED_BATCH_WINDOW_MS", 5))
+
+# Database
+POSTGRES_HOST = os.environ.get("POSTGRES_HOST", "localhost")
+DATABASE_URL = os.environ.get(
+    "DATABASE_URL",
+    f"postgresql+psycopg://{os.environ.get('POSTGRES_USER')}:{os.environ.get('POSTGRES_PASSWORD')}"
+    f"@{POSTGRES_HOST}:5432/{os.environ.get('POSTGRES_DB', 'db')}"
+)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+
+# CPU bound work (model.encode) is run off the event loop in a bounded thread pool
+ENCODE_MAX_WORKERS = int(os.environ.get("ENCODE_MAX_WORKERS", 2))
+
+# Outgoing HTTP (scraper), one pooled client per process
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", 4))
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+HTTP_USER_AGENT = os.environ.get("HTTP_USER_AGENT", "rag-project/1.0")
+
+# LLM
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+LLM_MODEL = os.environ.get("LLM_MODEL", "gpt-4-turbo")
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 60))
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", 50))
+# /ask-stream checks the client every SSE_DISCONNECT_POLL_SECONDS, even while the LLM sends nothing
+SSE_DISCONNECT_POLL_SECONDS = float(os.environ.get("SSE_DISCONNECT_POLL_SECONDS", 1))
+
+# Scraper concurrency (shared by single and bulk ingestion)
+SCRAPER_MAX_CONCURRENCY = int(os.environ.get("SCRAPER_MAX_CONCURRENCY", 32))
+SCRAPER_MAX_PER_HOST = int(os.environ.get("SCRAPER_MAX_PER_HOST", 4))
+
+# Page download and text extraction
+SCRAPER_MAX_BYTES = int(os.environ.get("SCRAPER_MAX_BYTES", 5 * 1024 * 1024))  # decompressed body
+HTML_PARSER = os.environ.get("HTML_PARSER", "lxml")  # html5lib, lxml or selectolax
+
+# Bulk ingestion
+INGEST_URLS_MAX = int(os.environ.get("INGEST_URLS_MAX", 1000))
+ENCODE_BATCH_SIZE = int(os.environ.get("ENCODE_BATCH_SIZE", 64))  # forward pass size
+ENCODE_CALL_SIZE = int(os.environ.get("ENCODE_CALL_SIZE", 1024))  # texts per encode call
+
+# Ingestion workers
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", 2))
+WORKER_POLL_INTERVAL = float(os.environ.get("WORKER_POLL_INTERVAL", 1))
+WORKER_JOB_MAX_ATTEMPTS = int(os.environ.get("WORKER_JOB_MAX_ATTEMPTS", 3))
+WORKER_STALE_JOB_SECONDS = int(os.environ.get("WORKER_STALE_JOB_SECONDS", 900))  # without heartbeat
+WORKER_HEARTBEAT_SECONDS = float(os.environ.get("WORKER_HEARTBEAT_SECONDS", 30))  # running jobs touch updated_at
+
+# Chunking, in embedding model tokens (capped by the model max_seq_length)
+CHUNK_MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", 256))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", 32))
+
+# Metrics, the API serves them on /metrics; worker process i listens on WORKER_METRICS_PORT + i (0 = disabled)
+WORKER_METRICS_PORT = int(os.environ.get("WORKER_METRICS_PORT", 0))
+
+# Vector index on contents.embedding, (re)built by python -m rag_project.db.index_maintenance
+VECTOR_INDEX_TYPE = os.environ.get("VECTOR_INDEX_TYPE", "ivfflat")  # ivfflat | hnsw
+HNSW_M = int(os.environ.get("HNSW_M", 16))
+HNSW_EF_CONSTRUCTION = int(os.environ.get("HNSW_EF_CONSTRUCTION", 64))
+HNSW_EF_SEARCH = int(os.environ.get("HNSW_EF_SEARCH", 40))
+IVFFLAT_REBUILD_GROWTH = float(os.environ.get("IVFFLAT_REBUILD_GROWTH", 2))  # rows / rows at last build
+INDEX_MAINTENANCE_WORK_MEM = os.environ.get("INDEX_MAINTENANCE_WORK_MEM", "1GB")
+# Indexed form of the embeddings: vector (float32) | halfvec (float16, half the size) | bit (binary quantization, 1/32).
+# The column stays float32: compact indexes are searched for top_k x VECTOR_RESCORE_FACTOR candidates,
+# re-scored on the full precision embeddings (0 = default factor of the storage, see db/vector_index.py)
+VECTOR_STORAGE = os.environ.get("VECTOR_STORAGE", "vector")
+VECTOR_RESCORE_FACTOR = int(os.environ.get("VECTOR_RESCORE_FACTOR", 0))
+
+# Similarity search backend: postgres (pgvector index) | mmap (in process NumPy copy, see db/mmap_index.py)
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "postgres")
+VECTOR_STORE_DIR = os.environ.get("VECTOR_STORE_DIR", "data/vectors")
+
+# Semantic answer cache of /ask (per API process), invalidated through pg NOTIFY on ingestion
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", 1024))
+ANSWER_CACHE_TTL_SECONDS = float(os.environ.get("ANSWER_CACHE_TTL_SECONDS", 3600))
+ANSWER_CACHE_MIN_SIMILARITY = float(os.environ.get("ANSWER_CACHE_MIN_SIMILARITY", 0.95))
+
+# Exact-match cache of question embeddings (0 = disabled), optionally persisted in a local SQLite file
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", 4096))
+QUERY_EMBEDDING_CACHE_PATH = os.environ.get("QUERY_EMBEDDING_CACHE_PATH") or None
+
+# Prompt packing, in tokens of LLM_MODEL (tiktoken)
+PROMPT_MAX_TOKENS = int(os.environ.get("PROMPT_MAX_TOKENS", 3000))
+PROMPT_MIN_DOC_TOKENS = int(os.environ.get("PROMPT_MIN_DOC_TOKENS", 32))  # Smaller truncated documents are dropped
+
+# Batch questions (/ask-batch)
+ASK_BATCH_MAX = int(os.environ.get("ASK_BATCH_MAX", 1000))
+ASK_BATCH_LLM_CONCURRENCY = int(os.environ.get("ASK_BATCH_LLM_CONCURRENCY", 8))
+
+# Crawler (rag_project.workers.crawl_worker)
+CRAWL_CONCURRENCY = int(os.environ.get("CRAWL_CONCURRENCY", 16))  # pages in flight, all hosts
+CRAWL_HOST_DELAY = float(os.environ.get("CRAWL_HOST_DELAY", 0.5))  # min seconds between requests to a host
+CRAWL_MAX_DEPTH = int(os.environ.get("CRAWL_MAX_DEPTH", 3))
+CRAWL_MAX_PAGES = int(os.environ.get("CRAWL_MAX_PAGES", 1000))
+CRAWL_INGEST_BATCH = int(os.environ.get("CRAWL_INGEST_BATCH", 32))  # pages per ingestion transaction
+CRAWL_MAX_SITEMAPS = int(os.environ.get("CRAWL_MAX_SITEMAPS", 50))  # sitemap index recursion bound
+
+# Retrieval mode of the questions: vector | hybrid (full-text + vector, reciprocal rank fusion in one SQL)
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "vector")
+HYBRID_CANDIDATES = int(os.environ.get("HYBRID_CANDIDATES", 40))  # candidates per ranking, <= hnsw.ef_search
+HYBRID_RRF_K = int(os.environ.get("HYBRID_RRF_K", 60))  # score = sum of 1 / (k + rank) over the rankings
+
+# Filtered vector search (pgvector >= 0.8): the index scan goes on until enough rows pass the filters
+VECTOR_ITERATIVE_SCAN = os.environ.get("VECTOR_ITERATIVE_SCAN", "relaxed_order")  # off | relaxed_order | strict_order
+HNSW_MAX_SCAN_TUPLES = int(os.environ.get("HNSW_MAX_SCAN_TUPLES", 20000))  # bound of an iterative hnsw scan
+IVFFLAT_MAX_PROBES = int(os.environ.get("IVFFLAT_MAX_PROBES", 0))  # bound of an iterative ivfflat scan, 0 = all lists
+
+# Re-ranking of the retrieved chunks with a cross-encoder (disabled when RERANK_MODEL is empty),
+# e.g. cross-encoder/ms-marco-MiniLM-L-6-v2: RERANK_CANDIDATES retrieved, the best RERANK_TOP_N sent to the LLM
+RERANK_MODEL = os.environ.get("RERANK_MODEL", "")
+RERANK_CANDIDATES = int(os.environ.get("RERANK_CANDIDATES", 50))
+RERANK_TOP_N = int(os.environ.get("RERANK_TOP_N", 4))
+RERANK_MAX_LENGTH = int(os.environ.get("RERANK_MAX_LENGTH", 256))  # question + chunk, in cross-encoder tokens
+RERANK_BATCH_SIZE = int(os.environ.get("RERANK_BATCH_SIZE", 64))
+RERANK_BUDGET_MS = float(os.environ.get("RERANK_BUDGET_MS", 200))  # bi-encoder order beyond it
+RERANK_CACHE_SIZE = int(os.environ.get("RERANK_CACHE_SIZE", 20000))  # (question, chunk) scores kept
+# Own thread pool: a slow re-ranking does not hold the threads of the query encoding (ENCODE_MAX_WORKERS)
+RERANK_MAX_WORKERS = int(os.environ.get("RERANK_MAX_WORKERS", 1))
+
+# Maximal marginal relevance: the top_k chunks picked among MMR_CANDIDATES for relevance and diversity,
+# so that near-duplicate chunks do not fill the prompt. MMR_LAMBDA 1 = similarity order (disabled), 0 = diversity only
+MMR_LAMBDA = float(os.environ.get("MMR_LAMBDA", 1.0))
+MMR_CANDIDATES = int(os.environ.get("MMR_CANDIDATES", 20))
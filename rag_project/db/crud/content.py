@@ -1,85 +1,508 @@
-from typing import List, Dict
-from sqlalchemy import cast, literal, func, type_coerce, ARRAY, Float
+import json
+from collections import Counter
+from typing import AsyncIterator, List, Dict, Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import cast, func, select, insert, text, any_, ARRAY, String, Integer
 from pgvector.sqlalchemy import Vector
-from sqlalchemy.exc import SQLAlchemyError
 
-from rag_project.db.models.content import ContentORM
+from rag_project.config import HYBRID_CANDIDATES, HYBRID_RRF_K, VECTOR_STORAGE
+from rag_project.db.models.content import ContentORM, TEXT_SEARCH_CONFIG
+from rag_project.db.crud.operations.copy_loader import copy_contents, InsertedContent
 from rag_project.db.crud.base_crud import BaseCRUD
-from rag_project.domain.models import SourceTypeEnum
+from rag_project.domain.models import SourceTypeEnum, RetrievalFilters
 from rag_project.db.crud.source import SourceCRUD
-from rag_project.exceptions import DataBaseError
+from rag_project.db.notifications import notify_content_changed
+from rag_project.db.vector_index import nearest_sql
 from rag_project.logger import get_logger
+from rag_project.utils.text_processing import compute_text_hash
 
 logger = get_logger(__name__)
 
 
+def _filter_sql(content_id: str, filters: Optional[RetrievalFilters]) -> Tuple[str, dict]:
+    """
+    SQL condition on the content id expression content_id: one of its sources passes the filters.
+    Evaluated row by row during the index scan (semi join), iterative scans fetch more rows when needed.
+    """
+    if filters is None:
+        return "TRUE", {}
+    conditions, params = [], {}
+    if filters.only_accepted:
+        conditions.append("s.is_accepted")
+    if filters.source_types:
+        conditions.append("s.source_type = ANY(CAST(:filter_source_types AS sourcetypeenum[]))")
+        params['filter_source_types'] = [source_type.name for source_type in filters.source_types]  # Stored by name
+    if filters.categories:
+        conditions.append(
+            "EXISTS (SELECT 1 FROM source_categories scat JOIN categories cat ON cat.id = scat.category_id "
+            "WHERE scat.source_id = s.id AND cat.name = ANY(CAST(:filter_categories AS text[])))"
+        )
+        params['filter_categories'] = list(filters.categories)
+    if not conditions:
+        return "TRUE", {}
+    return (
+        "EXISTS (SELECT 1 FROM source_contents sc JOIN sources s ON s.id = sc.source_id "
+        f"WHERE sc.content_id = {content_id} AND {' AND '.join(conditions)})"
+    ), params
+
+
+def _hybrid_sql(vector: str, question: str, vector_ranking: Optional[str] = None, condition: str = "TRUE",
+                with_embeddings: bool = False) -> str:
+    """
+    Top-k of the reciprocal rank fusion of two candidate rankings: ANN (pgvector index) and full-text
+    (GIN index on content_tsv). vector / question are SQL expressions, vector_ranking replaces the ANN
+    ranking by precomputed (id, rank) rows. similarity stays the cosine similarity of every document.
+    condition: filter on contents.id (_filter_sql), applied in both rankings.
+    with_embeddings: embedding selected as the last column.
+    """
+    vector_ranking = vector_ranking or (
+        "SELECT v.id, row_number() OVER (ORDER BY v.distance) AS rank "
+        f"FROM ({nearest_sql(vector, condition=condition, limit=':candidates')}) v "
+        "WHERE 1 - v.distance >= :min_similarity"
+    )
+    # Any term of the question (OR), the rankings favour the documents with the most and closest ones
+    query = f"replace(plainto_tsquery('{TEXT_SEARCH_CONFIG}', {question})::text, ' & ', ' | ')::tsquery"
+    return (
+        "SELECT c.id, c.content, c.source_id, 1 - (c.embedding <=> " + vector + ") AS similarity, f.score"
+        f"{', c.embedding' if with_embeddings else ''} "
+        "FROM ("
+        "  SELECT h.id, sum(1.0 / (:rrf_k + h.rank)) AS score "
+        "  FROM ("
+        f"    ({vector_ranking}) "
+        "    UNION ALL "
+        "    (SELECT t.id, row_number() OVER (ORDER BY t.rank DESC, t.id) AS rank "
+        "     FROM ("
+        f"       SELECT contents.id, ts_rank_cd(contents.content_tsv, {query}) AS rank FROM contents "
+        f"       WHERE contents.content_tsv @@ {query} AND {condition} "
+        "       ORDER BY rank DESC, contents.id LIMIT :candidates"
+        "     ) t)"
+        "  ) h "
+        "  GROUP BY h.id"
+        ") f "
+        "JOIN contents c ON c.id = f.id "
+        "ORDER BY f.score DESC, c.id "
+        "LIMIT :top_k"
+    )
+
+
+def _document(content_id: int, content: str, source_id: int, similarity: float, score: float = None,
+              embedding=None) -> dict:
+    document = {'id': content_id, 'content': content, 'similarity': float(similarity), 'source_id': source_id}
+    if score is not None:
+        document['score'] = float(score)
+    if embedding is not None:  # Candidate vectors for a selection step (MMR), not part of DocumentDomain
+        document['embedding'] = np.asarray(embedding, dtype=np.float32)
+    return document
+
+
+def _content_columns(with_embeddings: bool) -> str:
+    return "contents.id, contents.content, contents.source_id" + (", contents.embedding" if with_embeddings else "")
+
+
+def _with_embeddings(statement, with_embeddings: bool):
+    # Raw SQL: the vector text representation parsed by pgvector
+    return statement.columns(embedding=Vector) if with_embeddings else statement
+
+
+class SourceChunks(NamedTuple):
+    source_url: str
+    chunk_hashes: List[str]  # Every chunk of the source, all linked to it
+    new_chunks: List[str]  # Chunks not stored yet, with their hashes and embeddings
+    new_hashes: List[str]
+    new_embeddings: np.ndarray
+    etag: Optional[str] = None  # Stored on the source with the chunks, see SourceCRUD.remember_fetch
+    last_modified: Optional[str] = None
+    text_hash: Optional[str] = None
+
+
 class ContentCRUD(BaseCRUD):
 
     def __init__(self, session):
         super().__init__(session)
         self.source_crud = SourceCRUD(session)
+        # (ids, embeddings) of the contents inserted through this crud, for the local vector index once committed
+        self.inserted_rows: List[Tuple[np.ndarray, np.ndarray]] = []
+
+    async def find_existing_hashes(self, content_hashes: Iterable[str]) -> Dict[str, int]:
+        # {content_hash: content_id} of the already stored chunks, in one query
+        content_hashes = list(set(content_hashes))
+        if not content_hashes:
+            return {}
+
+        stmt = select(ContentORM.content_hash, ContentORM.id).where(
+            ContentORM.content_hash == any_(cast(content_hashes, ARRAY(String)))
+        )
+        return {content_hash: content_id for content_hash, content_id in (await self.session.execute(stmt)).all()}
 
-    def store_chunks(
+    async def link_source_contents(self, source_ids: List[int], content_hashes: List[str]):
+        # (source_id, content_hash) pairs -> source_contents, existing links are kept
+        if not source_ids:
+            return
+
+        await self.session.execute(
+            text(
+                "INSERT INTO source_contents (source_id, content_id) "
+                "SELECT pairs.source_id, c.id "
+                "FROM unnest(CAST(:source_ids AS integer[]), CAST(:content_hashes AS varchar[])) "
+                "AS pairs(source_id, content_hash) "
+                "JOIN contents c ON c.content_hash = pairs.content_hash "
+                "ON CONFLICT DO NOTHING"
+            ),
+            {'source_ids': list(source_ids), 'content_hashes': list(content_hashes)}
+        )
+
+    async def unlink_stale_contents(self, source_ids: List[int], content_hashes: List[str],
+                                    refreshed_source_ids: Iterable[int]) -> List[Tuple[int, int]]:
+        """
+        Removes the links of the refreshed sources to the contents not in their (source_id, content_hash) pairs,
+        then the contents no other source links to. Returns the removed (source_id, content_id) links.
+        """
+        refreshed_source_ids = list(refreshed_source_ids)
+        if not refreshed_source_ids:
+            return []
+
+        removed = (await self.session.execute(
+            text(
+                "WITH keep AS ("
+                "  SELECT * FROM unnest(CAST(:source_ids AS integer[]), CAST(:content_hashes AS varchar[])) "
+                "  AS pairs(source_id, content_hash)"
+                ") "
+                "DELETE FROM source_contents sc "
+                "USING contents c "
+                "WHERE sc.content_id = c.id "
+                "AND sc.source_id = ANY(CAST(:refreshed AS integer[])) "
+                "AND NOT EXISTS ("
+                "  SELECT 1 FROM keep WHERE keep.source_id = sc.source_id AND keep.content_hash = c.content_hash"
+                ") "
+                "RETURNING sc.source_id, sc.content_id"
+            ),
+            {
+                'source_ids': list(source_ids),
+                'content_hashes': list(content_hashes),
+                'refreshed': refreshed_source_ids
+            }
+        )).all()
+        if not removed:
+            return []
+
+        # Orphans only: a chunk still produced by another source stays. Ids left in the mmap
+        # copy are dropped at search time (get_contents) until its next rebuild.
+        deleted = (await self.session.execute(
+            text(
+                "DELETE FROM contents c "
+                "WHERE c.id = ANY(CAST(:content_ids AS integer[])) "
+                "AND NOT EXISTS (SELECT 1 FROM source_contents sc WHERE sc.content_id = c.id) "
+                "RETURNING c.id"
+            ),
+            {'content_ids': list({content_id for _, content_id in removed})}
+        )).all()
+        logger.info(f"{len(removed)} stale chunk links removed, {len(deleted)} contents deleted")
+        return [(source_id, content_id) for source_id, content_id in removed]
+
+    async def store_chunks(
             self,
-            chunks: List[str],
-            embeddings: List[List[float]],
-            source_url: str,
+            source_chunks: SourceChunks,
             source_type: SourceTypeEnum = SourceTypeEnum.DEFAULT
     ) -> int:
+        counts = await self.store_sources_chunks([source_chunks], source_type)
+        return counts[source_chunks.source_url]
+
+    async def store_sources_chunks(
+            self,
+            sources_chunks: List[SourceChunks],
+            source_type: SourceTypeEnum = SourceTypeEnum.DEFAULT
+    ) -> Dict[str, int]:
+        # New chunks of every source in a single COPY, then every chunk (new or not) linked to its source,
+        # and the chunks a source no longer produces unlinked. Returns the number of inserted contents per source url.
 
-        source = self.source_crud.get_or_create_source(source_url, source_type)
+        if not sources_chunks:
+            return {}
 
-        contents = [
-            ContentORM(
-                content=text,
-                embedding=emb,
-                source_id=source.id
+        sources = await self.source_crud.get_or_create_sources(
+            [batch.source_url for batch in sources_chunks], source_type
+        )
+        source_ids = {batch.source_url: sources[batch.source_url].id for batch in sources_chunks}
+
+        new_batches = [batch for batch in sources_chunks if batch.new_chunks]
+        inserted = {}
+        if new_batches:
+            new_hashes = [content_hash for batch in new_batches for content_hash in batch.new_hashes]
+            new_embeddings = np.concatenate([batch.new_embeddings for batch in new_batches])
+            rows = await self.copy_insert(
+                [text for batch in new_batches for text in batch.new_chunks],
+                new_embeddings,
+                np.concatenate([np.full(len(batch.new_chunks), source_ids[batch.source_url]) for batch in new_batches]),
+                new_hashes
             )
-            for text, emb in zip(chunks, embeddings)
-        ]
+            inserted = Counter(row.source_id for row in rows)
 
-        self.session.bulk_save_objects(contents)  # FIXME: check if need bulk_save_objects
-        return len(contents)
+            if rows:
+                position = {content_hash: i for i, content_hash in enumerate(new_hashes)}
+                self.inserted_rows.append((
+                    np.array([row.id for row in rows], dtype=np.int64),
+                    new_embeddings[[position[row.content_hash] for row in rows]]
+                ))
+
+        pairs = {
+            (source_ids[batch.source_url], content_hash)
+            for batch in sources_chunks for content_hash in batch.chunk_hashes
+        }
+        await self.link_source_contents([pair[0] for pair in pairs], [pair[1] for pair in pairs])
+        removed = await self.unlink_stale_contents(
+            [pair[0] for pair in pairs], [pair[1] for pair in pairs], source_ids.values()
+        )
+
+        for batch in sources_chunks:
+            if batch.text_hash is not None:
+                self.source_crud.remember_fetch(
+                    sources[batch.source_url], batch.etag, batch.last_modified, batch.text_hash
+                )
+
+        # Delivered on commit, e.g. to drop the cached answers built on these sources
+        await notify_content_changed(self.session, set(inserted.keys()) | {source_id for source_id, _ in removed})
 
-    def find_similar_contents(
+        return {batch.source_url: inserted.get(source_ids[batch.source_url], 0) for batch in sources_chunks}
+
+    async def find_similar_contents(
             self,
             query_vector: List[float],
             top_k: int = 5,
-            min_similarity: float = 0.5
+            min_similarity: float = 0.5,
+            probes: Optional[int] = None,
+            ef_search: Optional[int] = None,
+            filters: Optional[RetrievalFilters] = None,
+            with_embeddings: bool = False,
+            storage: str = VECTOR_STORAGE,
+            rescore_factor: Optional[int] = None
     ) -> List[dict]:
+        # probes (ivfflat) / ef_search (hnsw): recall vs speed for this transaction only,
+        # database defaults set by index_maintenance otherwise. ef_search below top_k returns fewer rows.
+        # filters: checked during the index scan, which goes on (iterative scan) until top_k rows pass
+        # with_embeddings: 'embedding' (np.ndarray) in every row, the vectors are not fetched otherwise
+        # storage / rescore_factor: index searched, see nearest_sql (VECTOR_STORAGE, the index in place, by default)
+        if probes is not None:
+            await self.session.execute(select(func.set_config('ivfflat.probes', str(int(probes)), True)))
+        if ef_search is not None:
+            await self.session.execute(select(func.set_config('hnsw.ef_search', str(int(ef_search)), True)))
+
+        condition, params = _filter_sql("contents.id", filters)
+        columns = _content_columns(with_embeddings)
+        nearest = nearest_sql("CAST(:vector AS vector)", columns, condition, storage=storage, factor=rescore_factor)
+
+        # Ordered again outside: relaxed_order iterative scans may return the rows slightly out of order
+        rows = await self.session.execute(
+            _with_embeddings(text(
+                "SELECT n.id, n.content, n.source_id, 1 - n.distance AS similarity"
+                f"{', n.embedding' if with_embeddings else ''} "
+                f"FROM ({nearest}) n "
+                "WHERE 1 - n.distance >= :min_similarity "  # More intuitif than distance
+                "ORDER BY n.distance"
+            ), with_embeddings),
+            {
+                **params,
+                'vector': json.dumps([float(value) for value in query_vector]),
+                'top_k': top_k,
+                'min_similarity': min_similarity
+            }
+        )
+        return [
+            _document(content_id, content, source_id, similarity, embedding=embedding[0] if embedding else None)
+            for content_id, content, source_id, similarity, *embedding in rows.all()
+        ]
 
-        casted_vector = cast(query_vector, Vector)
-        distance_op = func.cosine_distance(ContentORM.embedding, casted_vector)
-        similarity_op = literal(1.0) - distance_op  # Similarity direct calculation
+    async def find_similar_contents_batch(
+            self,
+            query_vectors: np.ndarray,
+            top_k: int = 5,
+            min_similarity: float = 0.5,
+            filters: Optional[RetrievalFilters] = None,
+            with_embeddings: bool = False
+    ) -> List[List[dict]]:
+        # Top-k of every query vector in one round trip: LATERAL index scan per vector of the array
+        if not len(query_vectors):
+            return []
+        condition, params = _filter_sql("contents.id", filters)
+        columns = _content_columns(with_embeddings)
+
+        rows = await self.session.execute(
+            _with_embeddings(text(
+                "SELECT q.ord, c.id, c.content, c.source_id, 1 - c.distance AS similarity"
+                f"{', c.embedding' if with_embeddings else ''} "
+                "FROM unnest(CAST(:vectors AS vector[])) WITH ORDINALITY AS q(embedding, ord) "
+                f"CROSS JOIN LATERAL ({nearest_sql('q.embedding', columns, condition)}) c "
+                "WHERE 1 - c.distance >= :min_similarity "
+                "ORDER BY q.ord, c.distance"
+            ), with_embeddings),
+            {
+                'vectors': [json.dumps(vector) for vector in np.asarray(query_vectors, dtype=np.float32).tolist()],
+                'top_k': top_k,
+                'min_similarity': min_similarity,
+                **params
+            }
+        )
 
-        query = (
-            self.session.query(
-                ContentORM,
-                similarity_op.label("similarity"),
-                distance_op.label("distance")
+        results = [[] for _ in range(len(query_vectors))]
+        for ord_, content_id, content, source_id, similarity, *embedding in rows.all():
+            results[ord_ - 1].append(
+                _document(content_id, content, source_id, similarity, embedding=embedding[0] if embedding else None)
             )
-            .filter(similarity_op >= min_similarity)  # More intuitif tahn distance
-            .order_by(distance_op)
-            .limit(top_k)
+        return results
+
+    async def find_hybrid_contents(
+            self,
+            question: str,
+            query_vector: List[float],
+            top_k: int = 5,
+            min_similarity: float = 0.5,
+            candidates: int = HYBRID_CANDIDATES,
+            rrf_k: int = HYBRID_RRF_K,
+            vector_ids: Optional[List[int]] = None,
+            filters: Optional[RetrievalFilters] = None,
+            with_embeddings: bool = False
+    ) -> List[dict]:
+        """
+        Full-text and vector candidates fused server-side, one round trip. min_similarity only filters
+        the vector candidates: a full-text match is kept whatever its similarity.
+        vector_ids: ANN ranking already computed (mmap backend), best first.
+        """
+        condition, params = _filter_sql("contents.id", filters)
+        params = {
+            **params,
+            'vector': json.dumps([float(value) for value in query_vector]),
+            'question': question,
+            'top_k': top_k,
+            'min_similarity': min_similarity,
+            'candidates': max(candidates, top_k),
+            'rrf_k': rrf_k
+        }
+        vector_ranking = None
+        if vector_ids is not None:
+            vector_ranking = (
+                "SELECT v.id, v.rank FROM unnest(CAST(:vector_ids AS integer[])) WITH ORDINALITY AS v(id, rank) "
+                f"WHERE {_filter_sql('v.id', filters)[0]}"
+            )
+            params['vector_ids'] = [int(content_id) for content_id in vector_ids]
+
+        rows = await self.session.execute(
+            _with_embeddings(text(_hybrid_sql(
+                "CAST(:vector AS vector)", ":question", vector_ranking, condition, with_embeddings
+            )), with_embeddings),
+            params
         )
+        return [_document(*row) for row in rows.all()]
 
-        results = query.all()
-
-        return [{
-            'id': content.id,
-            'content': content.content,
-            'similarity': float(similarity),  # Convert distance to similarity
-            'source_id': content.source_id
-        } for content, similarity, _distance in results]
-
-    def bulk_insert(self, contents: List[Dict], source_id: int) -> int:
-        # Massive Insert
-        contents = [
-            ContentORM(
-                content=c['text'],
-                embedding=c['embedding'],
-                source_id=source_id
-            ) for c in contents
-        ]
-        self.session.bulk_save_objects(contents)
+    async def find_hybrid_contents_batch(
+            self,
+            questions: List[str],
+            query_vectors: np.ndarray,
+            top_k: int = 5,
+            min_similarity: float = 0.5,
+            candidates: int = HYBRID_CANDIDATES,
+            rrf_k: int = HYBRID_RRF_K,
+            filters: Optional[RetrievalFilters] = None,
+            with_embeddings: bool = False
+    ) -> List[List[dict]]:
+        # Fused top-k of every question in one round trip, LATERAL as find_similar_contents_batch
+        if not len(questions):
+            return []
+        condition, params = _filter_sql("contents.id", filters)
+
+        hybrid = _hybrid_sql('q.embedding', 'q.question', condition=condition, with_embeddings=with_embeddings)
+        rows = await self.session.execute(
+            _with_embeddings(text(
+                "SELECT q.ord, r.id, r.content, r.source_id, r.similarity, r.score"
+                f"{', r.embedding' if with_embeddings else ''} "
+                "FROM unnest(CAST(:vectors AS vector[]), CAST(:questions AS text[])) "
+                "     WITH ORDINALITY AS q(embedding, question, ord) "
+                f"CROSS JOIN LATERAL ({hybrid}) r "
+                "ORDER BY q.ord, r.score DESC"
+            ), with_embeddings),
+            {
+                'vectors': [json.dumps(vector) for vector in np.asarray(query_vectors, dtype=np.float32).tolist()],
+                'questions': list(questions),
+                'top_k': top_k,
+                'min_similarity': min_similarity,
+                'candidates': max(candidates, top_k),
+                'rrf_k': rrf_k,
+                **params
+            }
+        )
+
+        results = [[] for _ in range(len(questions))]
+        for ord_, *document in rows.all():
+            results[ord_ - 1].append(_document(*document))
+        return results
+
+    async def get_contents(self, content_ids: List[int], filters: Optional[RetrievalFilters] = None,
+                           with_embeddings: bool = False) -> Dict[int, dict]:
+        # Primary key lookup of the rows found by an in process search, those not passing the filters left out
+        if not len(content_ids):
+            return {}
+        stmt = select(ContentORM.id, ContentORM.content, ContentORM.source_id).where(
+            ContentORM.id == any_(cast([int(i) for i in content_ids], ARRAY(Integer)))
+        )
+        if with_embeddings:
+            stmt = stmt.add_columns(cast(ContentORM.embedding, Vector).label("embedding"))
+        if filters is not None:
+            condition, params = _filter_sql("contents.id", filters)
+            stmt = stmt.where(text(condition).bindparams(**params))
+        contents = {}
+        for row in (await self.session.execute(stmt)).all():
+            contents[row.id] = {'id': row.id, 'content': row.content, 'source_id': row.source_id}
+            if with_embeddings:
+                contents[row.id]['embedding'] = np.asarray(row.embedding, dtype=np.float32)
+        return contents
+
+    async def count_up_to(self, max_id: int) -> int:
+        stmt = select(func.count()).select_from(ContentORM).where(ContentORM.id <= max_id)
+        return (await self.session.execute(stmt)).scalar()
+
+    async def iter_ids(self, up_to: int, batch_rows: int = 100_000) -> AsyncIterator[np.ndarray]:
+        # Ids <= up_to in order, index only scan of the primary key
+        stmt = (
+            select(ContentORM.id)
+            .where(ContentORM.id <= up_to)
+            .order_by(ContentORM.id)
+            .execution_options(yield_per=batch_rows)
+        )
+        result = await self.session.stream_scalars(stmt)
+        async for partition in result.partitions(batch_rows):
+            yield np.array(partition, dtype=np.int64)
+
+    async def iter_embeddings(self, dim: int, after_id: int = 0,
+                              batch_rows: int = 10_000) -> AsyncIterator[Tuple[np.ndarray, np.ndarray]]:
+        # (ids, embeddings) batches in id order, streamed with a server side cursor
+        stmt = (
+            select(ContentORM.id, cast(ContentORM.embedding, Vector(dim)))
+            .where(ContentORM.id > after_id)
+            .order_by(ContentORM.id)
+            .execution_options(yield_per=batch_rows)
+        )
+        result = await self.session.stream(stmt)
+        async for partition in result.partitions(batch_rows):
+            ids, embeddings = zip(*partition)
+            yield np.array(ids, dtype=np.int64), np.vstack(embeddings).astype(np.float32)
+
+    async def copy_insert(self, contents: List[str], embeddings: np.ndarray, source_ids: np.ndarray,
+                          content_hashes: List[str]) -> List[InsertedContent]:
+        # Fastest path: binary COPY, embeddings sent in pgvector binary format
+        return await copy_contents(self.session, contents, embeddings, source_ids, content_hashes)
+
+    async def bulk_insert(self, contents: List[Dict], source_id: int) -> int:
+        # Massive Insert: single executemany (one parameter set per row), see copy_insert for large loads
+        if not contents:
+            return 0
+
+        await self.session.execute(
+            insert(ContentORM),
+            [
+                {
+                    'content': c['text'],
+                    'embedding': c['embedding'],
+                    'content_hash': c.get('hash') or compute_text_hash(c['text']),
+                    'source_id': source_id
+                } for c in contents
+            ]
+        )
         return len(contents)
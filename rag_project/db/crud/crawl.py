@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select, update, func
+from sqlalchemy.dialects.postgresql import insert
+
+from rag_project.db.models.crawl import CrawlORM, CrawlUrlORM
+from rag_project.db.crud.base_crud import BaseCRUD
+from rag_project.domain.models import SourceTypeEnum, JobStatusEnum, CrawlUrlStatusEnum
+from rag_project.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+INSERT_CHUNK_ROWS = 5000  # 4 parameters per row, below the 65535 parameters of a statement
+
+
+class FrontierUrl(NamedTuple):
+    id: int
+    url: str
+    depth: int
+
+
+class CrawlCRUD(BaseCRUD):
+
+    async def create_crawl(self, seeds: List[str], sitemaps: List[str], allowed_domains: List[str],
+                           max_depth: int, max_pages: int,
+                           source_type: SourceTypeEnum = SourceTypeEnum.WEB) -> CrawlORM:
+        crawl = CrawlORM(
+            seeds=seeds,
+            sitemaps=sitemaps,
+            allowed_domains=allowed_domains,
+            max_depth=max_depth,
+            max_pages=max_pages,
+            source_type=source_type,
+            status=JobStatusEnum.PENDING
+        )
+        self.session.add(crawl)
+        await self.session.flush()
+        await self.session.refresh(crawl)  # Load server defaults (created_at)
+        return crawl
+
+    async def get_crawl(self, crawl_id: int) -> Optional[CrawlORM]:
+        return await self.session.get(CrawlORM, crawl_id)
+
+    async def claim_next_crawl(self, worker_id: str) -> Optional[CrawlORM]:
+        # Same queue semantics as JobCRUD.claim_next_job
+        stmt = (
+            select(CrawlORM)
+            .where(CrawlORM.status == JobStatusEnum.PENDING)
+            .order_by(CrawlORM.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        crawl = (await self.session.execute(stmt)).scalar_one_or_none()
+
+        if crawl:
+            crawl.status = JobStatusEnum.RUNNING
+            crawl.worker_id = worker_id
+            crawl.started_at = func.now()
+            crawl.error = None
+            await self.session.flush()
+            await self.session.refresh(crawl)
+
+        return crawl
+
+    async def touch(self, crawl_id: int):
+        # Heartbeat of a running crawl, see requeue_stale_crawls
+        await self.session.execute(
+            update(CrawlORM).where(CrawlORM.id == crawl_id).values(updated_at=func.now())
+        )
+
+    async def finish_crawl(self, crawl_id: int, status: JobStatusEnum, error: str = None):
+        await self.session.execute(
+            update(
+                CrawlORM
+            ).where(
+                CrawlORM.id == crawl_id
+            ).values(
+                status=status, error=error,
+                finished_at=None if status == JobStatusEnum.PENDING else func.now()
+            )
+        )
+
+    async def requeue_stale_crawls(self, stale_after: timedelta) -> int:
+        # Crawls left RUNNING by a dead worker resume from their frontier
+        result = await self.session.execute(
+            update(
+                CrawlORM
+            ).where(
+                CrawlORM.status == JobStatusEnum.RUNNING,
+                CrawlORM.updated_at < func.now() - stale_after
+            ).values(
+                status=JobStatusEnum.PENDING
+            )
+        )
+        return result.rowcount
+
+    async def add_urls(self, crawl_id: int, urls: List[Tuple[str, int]]) -> int:
+        # (normalized url, depth), already known urls are ignored. Returns the number of new ones.
+        lowest: Dict[str, int] = {}
+        for url, depth in urls:
+            lowest[url] = min(depth, lowest.get(url, depth))  # One row per url, lowest depth kept
+        urls = list(lowest.items())
+        added = 0
+        for start in range(0, len(urls), INSERT_CHUNK_ROWS):
+            stmt = insert(CrawlUrlORM).values([
+                {'crawl_id': crawl_id, 'url': url, 'depth': depth, 'status': CrawlUrlStatusEnum.PENDING}
+                for url, depth in urls[start:start + INSERT_CHUNK_ROWS]
+            ]).on_conflict_do_nothing(index_elements=['crawl_id', 'url'])
+            added += (await self.session.execute(stmt)).rowcount
+        return added
+
+    async def claim_urls(self, crawl_id: int, limit: int) -> List[FrontierUrl]:
+        # Breadth first: the shallowest pending urls, oldest first
+        stmt = (
+            select(CrawlUrlORM)
+            .where(CrawlUrlORM.crawl_id == crawl_id, CrawlUrlORM.status == CrawlUrlStatusEnum.PENDING)
+            .order_by(CrawlUrlORM.depth, CrawlUrlORM.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        rows = list((await self.session.execute(stmt)).scalars())
+        for row in rows:
+            row.status = CrawlUrlStatusEnum.RUNNING
+        await self.session.flush()
+        return [FrontierUrl(row.id, row.url, row.depth) for row in rows]
+
+    async def set_url_statuses(self, statuses: List[Tuple[int, CrawlUrlStatusEnum, Optional[str]]]):
+        # (crawl_url id, status, error), one executemany
+        if not statuses:
+            return
+        fetched_at = datetime.now(timezone.utc)
+        await self.session.execute(
+            update(CrawlUrlORM),
+            [
+                {'id': url_id, 'status': status, 'error': error, 'fetched_at': fetched_at}
+                for url_id, status, error in statuses
+            ]
+        )
+
+    async def requeue_running_urls(self, crawl_id: int) -> int:
+        # Claimed by an interrupted run, fetched again
+        result = await self.session.execute(
+            update(
+                CrawlUrlORM
+            ).where(
+                CrawlUrlORM.crawl_id == crawl_id, CrawlUrlORM.status == CrawlUrlStatusEnum.RUNNING
+            ).values(
+                status=CrawlUrlStatusEnum.PENDING
+            )
+        )
+        return result.rowcount
+
+    async def count_urls(self, crawl_id: int) -> Dict[CrawlUrlStatusEnum, int]:
+        stmt = (
+            select(CrawlUrlORM.status, func.count())
+            .where(CrawlUrlORM.crawl_id == crawl_id)
+            .group_by(CrawlUrlORM.status)
+        )
+        return {status: count for status, count in (await self.session.execute(stmt)).all()}
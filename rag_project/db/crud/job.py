@@ -0,0 +1,141 @@
+from datetime import timedelta
+from typing import List, Optional
+from sqlalchemy import select, update, func
+
+from rag_project.db.models.job import IngestionJobORM
+from rag_project.db.crud.base_crud import BaseCRUD
+from rag_project.domain.models import SourceTypeEnum, JobStatusEnum
+from rag_project.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class JobCRUD(BaseCRUD):
+
+    async def create_job(self, path_to_content: str,
+                         source_type: SourceTypeEnum = SourceTypeEnum.DEFAULT) -> IngestionJobORM:
+        job = IngestionJobORM(
+            path_to_content=path_to_content,
+            source_type=source_type,
+            status=JobStatusEnum.PENDING,
+            progress=0.0,
+            attempts=0
+        )
+        self.session.add(job)
+        await self.session.flush()
+        await self.session.refresh(job)  # Load server defaults (created_at)
+        return job
+
+    async def get_job(self, job_id: int) -> Optional[IngestionJobORM]:
+        return await self.session.get(IngestionJobORM, job_id)
+
+    async def list_jobs(self, *, status: JobStatusEnum = None, limit: int = 100) -> List[IngestionJobORM]:
+        query = select(IngestionJobORM)
+
+        if status is not None:
+            query = query.where(IngestionJobORM.status == status)
+
+        query = query.order_by(IngestionJobORM.id.desc()).limit(limit)
+
+        return list((await self.session.execute(query)).scalars())
+
+    async def claim_next_job(self, worker_id: str) -> Optional[IngestionJobORM]:
+        # SKIP LOCKED: concurrent workers never block on, nor claim, the same row
+        stmt = (
+            select(IngestionJobORM)
+            .where(IngestionJobORM.status == JobStatusEnum.PENDING)
+            .order_by(IngestionJobORM.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = (await self.session.execute(stmt)).scalar_one_or_none()
+
+        if job:
+            job.status = JobStatusEnum.RUNNING
+            job.worker_id = worker_id
+            job.attempts += 1
+            job.started_at = func.now()
+            job.error = None
+            await self.session.flush()
+            await self.session.refresh(job)
+
+        return job
+
+    async def update_progress(self, job_id: int, stage: str, progress: float):
+        await self.session.execute(
+            update(
+                IngestionJobORM
+            ).where(
+                IngestionJobORM.id == job_id
+            ).values(
+                stage=stage, progress=progress
+            )
+        )
+
+    async def heartbeat(self, job_id: int, worker_id: str) -> bool:
+        # Keeps a long job from looking stale, False once the job is no longer this worker's (requeued)
+        result = await self.session.execute(
+            update(
+                IngestionJobORM
+            ).where(
+                IngestionJobORM.id == job_id,
+                IngestionJobORM.worker_id == worker_id,
+                IngestionJobORM.status == JobStatusEnum.RUNNING
+            ).values(
+                updated_at=func.now()
+            )
+        )
+        return result.rowcount == 1
+
+    async def finish_job(self, job_id: int, chunks_count: int):
+        await self.session.execute(
+            update(
+                IngestionJobORM
+            ).where(
+                IngestionJobORM.id == job_id
+            ).values(
+                status=JobStatusEnum.SUCCEEDED, stage='done', progress=1.0,
+                chunks_count=chunks_count, finished_at=func.now()
+            )
+        )
+
+    async def fail_job(self, job_id: int, error: str, retry: bool = False):
+        await self.session.execute(
+            update(
+                IngestionJobORM
+            ).where(
+                IngestionJobORM.id == job_id
+            ).values(
+                status=JobStatusEnum.PENDING if retry else JobStatusEnum.FAILED,
+                error=error,
+                finished_at=None if retry else func.now()
+            )
+        )
+
+    async def requeue_stale_jobs(self, stale_after: timedelta, max_attempts: int) -> int:
+        # Jobs left RUNNING by a dead worker (no heartbeat for stale_after) go back to the queue,
+        # or fail once out of attempts
+        is_stale = (
+            IngestionJobORM.status == JobStatusEnum.RUNNING,
+            IngestionJobORM.updated_at < func.now() - stale_after
+        )
+        await self.session.execute(
+            update(
+                IngestionJobORM
+            ).where(
+                *is_stale, IngestionJobORM.attempts >= max_attempts
+            ).values(
+                status=JobStatusEnum.FAILED, error='Worker lost', finished_at=func.now()
+            )
+        )
+        result = await self.session.execute(
+            update(
+                IngestionJobORM
+            ).where(
+                *is_stale, IngestionJobORM.attempts < max_attempts
+            ).values(
+                status=JobStatusEnum.PENDING, stage=None, progress=0.0
+            )
+        )
+        return result.rowcount
@@ -0,0 +1,128 @@
+"""
+Bulk load of contents with COPY ... FROM STDIN (FORMAT BINARY).
+
+Rows are serialized straight from NumPy: the fixed-width part of each row
+(embedding in pgvector binary representation, source_id, content_hash) is built
+for the whole batch in one vectorized assignment, only the texts are encoded one by one.
+"""
+from typing import Iterator, List, NamedTuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00" + (0).to_bytes(4, "big") + (0).to_bytes(4, "big")  # flags, extension
+COPY_TRAILER = (-1).to_bytes(2, "big", signed=True)
+COPY_BATCH_ROWS = 10_000
+
+
+class InsertedContent(NamedTuple):
+    id: int
+    source_id: int
+    content_hash: str
+
+
+_HEAD_DTYPE = np.dtype([("n_fields", ">i2"), ("content_len", ">i4")])
+
+
+def _tail_dtype(dim: int) -> np.dtype:
+    # pgvector binary format: uint16 dim, uint16 unused, dim x float4, all network order
+    return np.dtype([
+        ("embedding_len", ">i4"),
+        ("dim", ">u2"),
+        ("unused", ">u2"),
+        ("values", ">f4", (dim,)),
+        ("source_id_len", ">i4"),
+        ("source_id", ">i4"),
+        ("content_hash_len", ">i4"),
+        ("content_hash", "S64"),  # SHA-256 hex digest
+    ])
+
+
+def encode_rows(contents: List[bytes], embeddings: np.ndarray, source_ids: np.ndarray,
+                content_hashes: np.ndarray) -> bytes:
+    """Tuples (content, embedding, source_id, content_hash) in COPY binary format, without signature / trailer."""
+    n_rows, dim = embeddings.shape
+
+    heads = np.empty(n_rows, dtype=_HEAD_DTYPE)
+    heads["n_fields"] = 4
+    heads["content_len"] = [len(content) for content in contents]
+
+    tails = np.empty(n_rows, dtype=_tail_dtype(dim))
+    tails["embedding_len"] = 4 + 4 * dim
+    tails["dim"] = dim
+    tails["unused"] = 0
+    tails["values"] = embeddings  # float32 -> big endian float4 in one pass
+    tails["source_id_len"] = 4
+    tails["source_id"] = source_ids
+    tails["content_hash_len"] = 64
+    tails["content_hash"] = content_hashes
+
+    head_bytes = memoryview(heads.tobytes())
+    tail_bytes = memoryview(tails.tobytes())
+    head_size, tail_size = _HEAD_DTYPE.itemsize, tails.dtype.itemsize
+
+    parts = []
+    for i, content in enumerate(contents):
+        parts.append(head_bytes[i * head_size:(i + 1) * head_size])
+        parts.append(content)
+        parts.append(tail_bytes[i * tail_size:(i + 1) * tail_size])
+    return b"".join(parts)
+
+
+def iter_copy_stream(contents: List[str], embeddings: np.ndarray, source_ids: np.ndarray,
+                     content_hashes: np.ndarray, batch_rows: int = COPY_BATCH_ROWS) -> Iterator[bytes]:
+    yield COPY_SIGNATURE
+    for start in range(0, len(contents), batch_rows):
+        end = start + batch_rows
+        yield encode_rows(
+            [content.encode("utf-8") for content in contents[start:end]],
+            embeddings[start:end],
+            source_ids[start:end],
+            content_hashes[start:end]
+        )
+    yield COPY_TRAILER
+
+
+async def copy_contents(session: AsyncSession, contents: List[str], embeddings: np.ndarray,
+                        source_ids: np.ndarray, content_hashes: List[str]) -> List[InsertedContent]:
+    """
+    COPY rows into contents within the session transaction.
+    Rows go through a temporary staging table so that chunks inserted meanwhile
+    by another worker (same content_hash) are skipped instead of failing the COPY.
+    Returns the rows actually inserted.
+    """
+    if not contents:
+        return []
+    if not len(contents) == len(embeddings) == len(source_ids) == len(content_hashes):
+        raise ValueError("contents, embeddings, source_ids and content_hashes must have the same length")
+
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    source_ids = np.asarray(source_ids, dtype=np.int32)
+    content_hashes = np.asarray(content_hashes, dtype="S64")
+
+    await session.execute(text(
+        "CREATE TEMPORARY TABLE IF NOT EXISTS contents_staging ("
+        f"content text, embedding vector({embeddings.shape[1]}), source_id integer, content_hash varchar(64)"
+        ") ON COMMIT DROP"
+    ))
+    await session.execute(text("TRUNCATE contents_staging"))
+
+    # Same connection (and transaction) as the ORM session
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+
+    async with raw_connection.driver_connection.cursor() as cursor:
+        async with cursor.copy(
+                "COPY contents_staging (content, embedding, source_id, content_hash) FROM STDIN (FORMAT BINARY)"
+        ) as copy:
+            for block in iter_copy_stream(contents, embeddings, source_ids, content_hashes):
+                await copy.write(block)
+
+    inserted = await session.execute(text(
+        "INSERT INTO contents (content, embedding, source_id, content_hash) "
+        "SELECT DISTINCT ON (content_hash) content, embedding, source_id, content_hash FROM contents_staging "
+        "ON CONFLICT (content_hash) DO NOTHING "
+        "RETURNING id, source_id, content_hash"
+    ))
+    return [InsertedContent(*row) for row in inserted.all()]
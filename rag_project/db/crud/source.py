@@ -1,8 +1,9 @@
-from typing import Optional
-from sqlalchemy import select
+from typing import Dict, List, Optional
+from sqlalchemy import select, update
 
 from rag_project.db.models.source import SourceORM, RejectReasonORM
 from rag_project.db.crud.base_crud import BaseCRUD
+from rag_project.db.notifications import notify_content_changed
 from rag_project.domain.models import SourceTypeEnum
 from rag_project.logger import get_logger
 
@@ -17,53 +18,86 @@ class SourceCRUD(BaseCRUD):
         self.session.add(source)
         return source
 
-    def get_or_create_source(self, path_to_content: str, source_type: SourceTypeEnum = SourceTypeEnum.DEFAULT) -> SourceORM:
-        source = self.get_source_by_path_to_content(path=path_to_content)
+    async def get_or_create_source(self, path_to_content: str,
+                                   source_type: SourceTypeEnum = SourceTypeEnum.DEFAULT) -> SourceORM:
+        source = await self.get_source_by_path_to_content(path=path_to_content)
 
         if not source:
             source = self.create_source(
                 path_to_content=path_to_content,
                 source_type=source_type
             )
-            self.session.flush()
+            await self.session.flush()
 
         return source
 
-    def get_source_by_path_to_content(self, path: str) -> Optional[SourceORM]:
+    async def get_or_create_sources(self, paths_to_content: List[str],
+                                    source_type: SourceTypeEnum = SourceTypeEnum.DEFAULT) -> Dict[str, SourceORM]:
+        # One SELECT for the whole batch, one flush for the missing ones
+        sources = await self.get_sources_by_paths(paths_to_content)
+
+        missing = [path for path in dict.fromkeys(paths_to_content) if path not in sources]
+        for path in missing:
+            sources[path] = self.create_source(path_to_content=path, source_type=source_type)
+        if missing:
+            await self.session.flush()
+
+        return sources
+
+    async def get_sources_by_paths(self, paths_to_content: List[str]) -> Dict[str, SourceORM]:
+        stmt = select(SourceORM).where(SourceORM.path_to_content.in_(paths_to_content))
+        return {source.path_to_content: source for source in (await self.session.execute(stmt)).scalars()}
+
+    @staticmethod
+    def remember_fetch(source: SourceORM, etag: Optional[str], last_modified: Optional[str],
+                       text_hash: Optional[str] = None):
+        # Validators of the last fetch, text_hash only when the text was ingested
+        source.etag = etag
+        source.last_modified = last_modified
+        if text_hash is not None:
+            source.text_hash = text_hash
+
+    async def get_source_by_path_to_content(self, path: str) -> Optional[SourceORM]:
         stmt = select(SourceORM).where(path == SourceORM.path_to_content)
-        return self.session.execute(stmt).scalar_one_or_none()
-
-    def get_source_by_id(self, source_id: int) -> Optional[SourceORM]:
-        return self.session.get(SourceORM, source_id)
-
-    def approve_source(self, source_id: int):
-        self.session.query(
-            SourceORM
-        ).filter(
-            SourceORM.id == source_id
-        ).update(
-            {'is_accepted': True}
+        return (await self.session.execute(stmt)).scalar_one_or_none()
+
+    async def get_source_by_id(self, source_id: int) -> Optional[SourceORM]:
+        return await self.session.get(SourceORM, source_id)
+
+    async def approve_source(self, source_id: int):
+        await self.session.execute(
+            update(
+                SourceORM
+            ).where(
+                SourceORM.id == source_id
+            ).values(
+                is_accepted=True
+            )
         )
+        await notify_content_changed(self.session, [source_id])  # Retrieval filters on acceptance
 
-    def reject_source(self, source_id: int, reason: int):
+    async def reject_source(self, source_id: int, reason: int):
         stmt = select(RejectReasonORM).where(RejectReasonORM.reason == reason)
-        reason_obj = self.session.execute(stmt).scalar_one_or_none()
+        reason_obj = (await self.session.execute(stmt)).scalar_one_or_none()
 
         if not reason_obj:
             raise ValueError(f"Invalid reason: {reason}")
 
-        self.session.query(
-            SourceORM
-        ).filter(
-            SourceORM.id == source_id
-        ).update(
-            {'is_accepted': False, 'rejection_reason_id': reason_obj.id}
+        await self.session.execute(
+            update(
+                SourceORM
+            ).where(
+                SourceORM.id == source_id
+            ).values(
+                is_accepted=False, rejection_reason=reason_obj.reason
+            )
         )
+        await notify_content_changed(self.session, [source_id])  # Cached answers built on it are dropped
 
-    def list_sources(self, *,
-                     only_accepted: bool = None,
-                     source_type: SourceTypeEnum = None,
-                     limit: int = 100) -> list[SourceORM]:
+    async def list_sources(self, *,
+                           only_accepted: bool = None,
+                           source_type: SourceTypeEnum = None,
+                           limit: int = 100) -> list[SourceORM]:
 
         query = select(SourceORM)
 
@@ -75,4 +109,4 @@ class SourceCRUD(BaseCRUD):
 
         query = query.limit(limit)
 
-        return list(self.session.execute(query).scalars())
+        return list((await self.session.execute(query)).scalars())
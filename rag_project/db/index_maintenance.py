@@ -0,0 +1,106 @@
+"""
+Keeps the contents.embedding index in line with the table size, without blocking reads or writes.
+
+    python -m rag_project.db.index_maintenance                  # rebuild if needed
+    python -m rag_project.db.index_maintenance --check          # exit code 1 if a rebuild is needed
+    python -m rag_project.db.index_maintenance --index-type hnsw
+    python -m rag_project.db.index_maintenance --storage bit    # binary quantized index, see VECTOR_STORAGE
+
+Meant to be run periodically (cron) or after large ingestions. The new index is built
+with CREATE INDEX CONCURRENTLY under a temporary name and swapped in, then the default
+search parameters of the database (ivfflat.probes / hnsw.ef_search) are set to match it.
+"""
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from rag_project.config import VECTOR_INDEX_TYPE, VECTOR_STORAGE, INDEX_MAINTENANCE_WORK_MEM
+from rag_project.db.session import engine
+from rag_project.db.vector_index import (
+    INDEX_NAME, INDEX_METHODS, STORAGES, IndexSpec, get_index_state, count_rows, rebuild_reason
+)
+from rag_project.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+async def rebuild_index(conn: AsyncConnection, spec: IndexSpec):
+    # conn must be in autocommit: CONCURRENTLY statements cannot run inside a transaction
+    new_name, old_name = f"{INDEX_NAME}_new", f"{INDEX_NAME}_old"
+
+    await conn.execute(text(f"SET maintenance_work_mem = '{INDEX_MAINTENANCE_WORK_MEM}'"))
+    await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {new_name}"))  # Left by an interrupted run
+    logger.info(f"Building {spec.create_sql(new_name, concurrently=True)}")
+    await conn.execute(text(spec.create_sql(new_name, concurrently=True)))
+    await conn.execute(text(spec.comment_sql(new_name)))
+
+    # Swap in one short transaction, queries never run without an index
+    async with engine.begin() as swap:
+        await swap.execute(text(f"ALTER INDEX IF EXISTS {INDEX_NAME} RENAME TO {old_name}"))
+        await swap.execute(text(f"ALTER INDEX {new_name} RENAME TO {INDEX_NAME}"))
+    await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {old_name}"))
+
+
+async def apply_search_settings(conn: AsyncConnection, spec: IndexSpec):
+    # Database level defaults, picked up by new connections; queries can still override them
+    database = (await conn.execute(text("SELECT current_database()"))).scalar()
+    quoted = conn.dialect.identifier_preparer.quote(database)
+    for name, value in spec.search_settings().items():
+        await conn.execute(text(f"ALTER DATABASE {quoted} SET {name} = {int(value)}"))
+        logger.info(f"Default {name} = {value}")
+
+
+async def ensure_vector_index(index_type: str = VECTOR_INDEX_TYPE, force: bool = False,
+                              check_only: bool = False, storage: str = VECTOR_STORAGE) -> bool:
+    """
+    Rebuilds the vector index if it does not match index_type, storage and the table size.
+    Returns whether it was needed. Searches use the form of VECTOR_STORAGE: change both together.
+    """
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+
+        state = await get_index_state(conn)
+        rows = state.rows if state else await count_rows(conn)
+        spec = IndexSpec.for_rows(rows, index_type, storage)
+        reason = "forced" if force else rebuild_reason(state, spec)
+
+        logger.info(f"{rows} rows, current index {state}, target {spec}")
+        if reason is None:
+            logger.info("Vector index up to date")
+            return False
+        logger.info(f"Vector index rebuild needed: {reason}")
+        if check_only:
+            return True
+
+        await rebuild_index(conn, spec)
+        await apply_search_settings(conn, spec)
+        logger.info("Vector index rebuilt")
+        return True
+
+
+async def run(args):
+    try:
+        return await ensure_vector_index(args.index_type, force=args.force, check_only=args.check, storage=args.storage)
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector index maintenance")
+    parser.add_argument("--index-type", choices=INDEX_METHODS, default=VECTOR_INDEX_TYPE)
+    parser.add_argument("--storage", choices=tuple(STORAGES), default=VECTOR_STORAGE,
+                        help="Indexed form of the embeddings")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the index is up to date")
+    parser.add_argument("--check", action="store_true", help="Only report, exit code 1 if a rebuild is needed")
+    args = parser.parse_args()
+
+    needed = asyncio.run(run(args))
+    if args.check and needed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Memory-mapped copy of contents.embedding, searched in process with NumPy.
+
+Two append-only files in a directory shared by the API and the workers of a host:
+    vectors.f32   n x dim float32 (normalized embeddings, row major)
+    ids.i64       n content ids
+Readers map them read-only (pages shared through the OS cache) and remap when the files
+grow or are replaced. Writers append under an exclusive flock, vectors before ids, so a
+reader never sees an id without its vector. Rows are appended once their transaction is
+committed. Postgres stays the source of truth: ids deleted since are dropped when contents
+are fetched.
+"""
+import asyncio
+import fcntl
+import json
+import os
+import threading
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from rag_project.config import SEARCH_BACKEND, VECTOR_STORE_DIR
+from rag_project.logger import get_logger
+
+logger = get_logger(__name__)
+
+VECTORS_FILE = "vectors.f32"
+IDS_FILE = "ids.i64"
+META_FILE = "meta.json"
+LOCK_FILE = ".lock"
+
+
+class MmapVectorIndex:
+    def __init__(self, directory: str, dim: int):
+        self.directory = directory
+        self.dim = dim
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()  # Remaps of this process
+        self._signature = None  # (inode, size) of the mapped ids file
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def file_lock(self):
+        # Serializes writers across processes (and containers sharing the volume)
+        with open(self._path(LOCK_FILE), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @asynccontextmanager
+    async def file_lock_async(self):
+        # file_lock for coroutines: the wait for another process happens in a thread, not on the event loop
+        with open(self._path(LOCK_FILE), "a") as lock:
+            await asyncio.to_thread(fcntl.flock, lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def is_compatible(self) -> bool:
+        try:
+            with open(self._path(META_FILE)) as meta:
+                return json.load(meta)["dim"] == self.dim
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def refresh(self):
+        """Maps the files again if another process appended to / rebuilt them."""
+        try:
+            stat = os.stat(self._path(IDS_FILE))
+        except FileNotFoundError:
+            return
+        signature = (stat.st_ino, stat.st_size)
+        if signature == self._signature:
+            return
+
+        with self._lock:
+            vectors_size = os.path.getsize(self._path(VECTORS_FILE))
+            n_rows = min(stat.st_size // 8, vectors_size // (4 * self.dim))  # Complete rows only
+            if n_rows:
+                self._ids = np.memmap(self._path(IDS_FILE), dtype=np.int64, mode="r", shape=(n_rows,))
+                self._vectors = np.memmap(
+                    self._path(VECTORS_FILE), dtype=np.float32, mode="r", shape=(n_rows, self.dim)
+                )
+            else:  # np.memmap cannot map an empty file
+                self._ids = np.empty(0, dtype=np.int64)
+                self._vectors = np.empty((0, self.dim), dtype=np.float32)
+            self._signature = signature
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._ids)
+
+    def max_id(self) -> int:
+        self.refresh()
+        return int(self._ids.max()) if len(self._ids) else 0
+
+    def ids(self) -> np.ndarray:
+        self.refresh()
+        return self._ids
+
+    def drop_partial_rows(self) -> bool:
+        """Truncates what an interrupted append left past the last complete row. Caller holds file_lock."""
+        try:
+            ids_size = os.path.getsize(self._path(IDS_FILE))
+            vectors_size = os.path.getsize(self._path(VECTORS_FILE))
+        except FileNotFoundError:
+            return False
+        n_rows = min(ids_size // 8, vectors_size // (4 * self.dim))
+        if (ids_size, vectors_size) == (8 * n_rows, 4 * self.dim * n_rows):
+            return False
+        # Readers never map past n_rows: the bytes cut are not in their mappings
+        os.truncate(self._path(VECTORS_FILE), 4 * self.dim * n_rows)
+        os.truncate(self._path(IDS_FILE), 8 * n_rows)
+        logger.warning(f"Vector index: partial rows past row {n_rows} dropped")
+        return True
+
+    def append(self, ids: np.ndarray, vectors: np.ndarray, lock: bool = True):
+        """Appends rows, lock=False when the caller already holds file_lock. Blocks while another process writes."""
+        if not len(ids):
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        ids = np.ascontiguousarray(ids, dtype=np.int64)
+        with self.file_lock() if lock else nullcontext():
+            if lock:
+                # Committed rows are appended after their commit: the startup sync of another process
+                # may have copied them in between
+                self.refresh()
+                if len(self._ids) and ids.min() <= self._ids.max():
+                    new = ~np.isin(ids, self._ids)
+                    ids, vectors = ids[new], vectors[new]
+                    if not len(ids):
+                        return
+            with open(self._path(VECTORS_FILE), "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._path(IDS_FILE), "ab") as f:
+                f.write(ids.tobytes())
+
+    @contextmanager
+    def rebuilding(self, keep: int = 0, batch_rows: int = 65_536):
+        """
+        Yields write(ids, vectors), the written rows replace the files on exit. Caller holds file_lock.
+        The first keep rows of the current copy are copied over first, the writes follow them.
+        """
+        self.refresh()
+        tmp_vectors, tmp_ids = self._path(VECTORS_FILE + ".tmp"), self._path(IDS_FILE + ".tmp")
+        count = 0
+        with open(tmp_vectors, "wb") as vectors_file, open(tmp_ids, "wb") as ids_file:
+            def write(ids: np.ndarray, vectors: np.ndarray):
+                nonlocal count
+                vectors_file.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+                ids_file.write(np.ascontiguousarray(ids, dtype=np.int64).tobytes())
+                count += len(ids)
+
+            # Files replaced, not truncated: readers may still map the current ones
+            for start in range(0, min(keep, len(self._ids)), batch_rows):
+                end = min(start + batch_rows, keep)
+                write(self._ids[start:end], self._vectors[start:end])
+            yield write
+
+        with open(self._path(META_FILE), "w") as meta:
+            json.dump({"dim": self.dim}, meta)
+        # Readers keep their old mapping until their next refresh
+        os.replace(tmp_vectors, self._path(VECTORS_FILE))
+        os.replace(tmp_ids, self._path(IDS_FILE))
+        logger.info(f"Vector index rebuilt with {count} rows")
+
+    def search(self, query: np.ndarray, top_k: int, min_similarity: float = -1.0) -> Tuple[np.ndarray, np.ndarray]:
+        """(content ids, cosine similarities) of the top_k closest rows, best first."""
+        self.refresh()
+        vectors, ids = self._vectors, self._ids
+        if not len(ids) or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        scores = vectors @ query  # Stored embeddings are normalized: dot product = cosine similarity
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = top[scores[top] >= min_similarity]
+        return np.asarray(ids[top]), np.asarray(scores[top])
+
+    def search_many(self, queries: np.ndarray, top_k: int, min_similarity: float = -1.0,
+                    block_size: int = 64) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """search for each row of queries, one matrix product per block of queries."""
+        self.refresh()
+        vectors, ids = self._vectors, self._ids
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if not len(ids) or top_k <= 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        k = min(top_k, len(ids))
+        results = []
+        for start in range(0, len(queries), block_size):
+            scores = queries[start:start + block_size] @ vectors.T  # block x n
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top, top_scores = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+            for row, row_scores in zip(top, top_scores):
+                keep = row_scores >= min_similarity
+                results.append((np.asarray(ids[row[keep]]), row_scores[keep]))
+        return results
+
+
+def build_vector_index(dim: int) -> Optional[MmapVectorIndex]:
+    # Only maintained when it is used for search, see SEARCH_BACKEND
+    if SEARCH_BACKEND != "mmap":
+        return None
+    return MmapVectorIndex(VECTOR_STORE_DIR, dim)
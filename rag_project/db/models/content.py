@@ -1,9 +1,16 @@
 import json
-from sqlalchemy import Column, Integer, DateTime, Text, ForeignKey, Index, Float
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, DateTime, Text, ForeignKey, Index, Float, String, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.types import UserDefinedType
 from sqlalchemy.sql import func
 from rag_project.db.base import Base
+from rag_project.db.vector_index import INDEX_NAME, STORAGES, EMBEDDING_DIM, default_spec
+
+
+# Created by migration d1787f14dd8f: 'simple' (no stemming: exact product names, error codes, acronyms)
+# without the French and English stop words, so that questions can be matched term by term
+TEXT_SEARCH_CONFIG = 'rag_text'
 
 
 class Vector(UserDefinedType):
@@ -20,17 +27,26 @@ class ContentORM(Base):
     __tablename__ = 'contents'
     id = Column(Integer, primary_key=True)
     content = Column(Text)
-    embedding = Column(Vector(384))
-    source_id = Column(Integer, ForeignKey('sources.id'))
+    embedding = Column(Vector(EMBEDDING_DIM))  # Full precision, compact forms only indexed (VECTOR_STORAGE)
+    content_hash = Column(String(64), nullable=False)  # SHA-256 hex of content, see compute_text_hash
+    source_id = Column(Integer, ForeignKey('sources.id'))  # First source, all of them in source_contents
     created_at = Column(DateTime, server_default=func.now())
     last_accessed = Column(DateTime)
+    # Full-text side of the hybrid retrieval (ContentCRUD.find_hybrid_contents), maintained by Postgres
+    content_tsv = deferred(Column(
+        TSVECTOR, Computed(f"to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(content, ''))", persisted=True)
+    ))
 
     def cosine_distance(self, other):
         return func.cosine_distance(self.embedding, other)
 
     __table_args__ = (
-        Index('ix_embedding_cosine', embedding,
-              postgresql_using='ivfflat',
-              postgresql_with={'lists': 10},  # Increase according to the table size
-              postgresql_ops={'embedding': 'vector_cosine_ops'}),  # Optimized for all-MiniLM-L6-v2
+        # Form created by the migrations (empty table parameters). Managed outside the ORM: resized and switched
+        # (VECTOR_INDEX_TYPE, VECTOR_STORAGE) by rag_project.db.index_maintenance, ignored by alembic autogenerate
+        Index(INDEX_NAME, embedding,
+              postgresql_using=default_spec().method,
+              postgresql_with=default_spec().options,
+              postgresql_ops={'embedding': STORAGES[default_spec().storage][0]}),  # Optimized for all-MiniLM-L6-v2
+        Index('ux_content_hash', content_hash, unique=True),
+        Index('idx_content_tsv', 'content_tsv', postgresql_using='gin'),
     )
@@ -0,0 +1,46 @@
+from sqlalchemy import Column, Integer, String, DateTime, Enum, Index, Text, ForeignKey
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.sql import func
+from rag_project.db.base import Base
+from rag_project.domain.models import SourceTypeEnum, JobStatusEnum, CrawlUrlStatusEnum
+
+
+class CrawlORM(Base):
+    # Crawls processed by rag_project.workers.crawl_worker, one worker at a time per crawl
+    __tablename__ = 'crawls'
+    id = Column(Integer, primary_key=True)
+    seeds = Column(ARRAY(Text), nullable=False)
+    sitemaps = Column(ARRAY(Text), nullable=False)
+    allowed_domains = Column(ARRAY(String(255)), nullable=False)
+    max_depth = Column(Integer, nullable=False)
+    max_pages = Column(Integer, nullable=False)
+    source_type = Column(Enum(SourceTypeEnum), nullable=False)
+    status = Column(Enum(JobStatusEnum), default=JobStatusEnum.PENDING, nullable=False)
+    error = Column(Text)
+    worker_id = Column(String(100))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())  # Heartbeat
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index('idx_crawl_status_id', status, id),
+    )
+
+
+class CrawlUrlORM(Base):
+    # Frontier and registry of the processed URLs of a crawl, url normalized (rag_project.utils.urls)
+    __tablename__ = 'crawl_urls'
+    id = Column(Integer, primary_key=True)
+    crawl_id = Column(Integer, ForeignKey('crawls.id', ondelete="CASCADE"), nullable=False)
+    url = Column(String(2000), nullable=False)
+    depth = Column(Integer, nullable=False)
+    status = Column(Enum(CrawlUrlStatusEnum), default=CrawlUrlStatusEnum.PENDING, nullable=False)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    fetched_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index('ux_crawl_url', crawl_id, url, unique=True),  # Dedup of the discovered links
+        Index('idx_crawl_url_frontier', crawl_id, status, depth, id),  # Breadth first claim
+    )
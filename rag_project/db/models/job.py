@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, DateTime, Enum, Index, Float, Text
+from sqlalchemy.sql import func
+from rag_project.db.base import Base
+from rag_project.domain.models import SourceTypeEnum, JobStatusEnum
+
+
+class IngestionJobORM(Base):
+    # Queue of ingestions processed by the worker pool (rag_project/workers)
+    __tablename__ = 'ingestion_jobs'
+    id = Column(Integer, primary_key=True)
+    path_to_content = Column(String(500), nullable=False)
+    source_type = Column(Enum(SourceTypeEnum), nullable=False)
+    status = Column(Enum(JobStatusEnum), default=JobStatusEnum.PENDING, nullable=False)
+    stage = Column(String(50))
+    progress = Column(Float, default=0.0, nullable=False)
+    chunks_count = Column(Integer)
+    error = Column(Text)
+    attempts = Column(Integer, default=0, nullable=False)
+    worker_id = Column(String(100))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index('idx_job_status_id', status, id),  # Workers poll the oldest pending job
+    )
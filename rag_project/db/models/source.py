@@ -40,6 +40,10 @@ class SourceORM(Base):
     rejection_reason = Column(Enum(RejectReasonEnum), ForeignKey('reject_reasons.reason'), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Validators sent back on re-ingestion (If-None-Match / If-Modified-Since), and fingerprint of the extracted text
+    etag = Column(String(255), nullable=True)
+    last_modified = Column(String(64), nullable=True)
+    text_hash = Column(String(64), nullable=True)  # compute_text_hash of the last ingested text
 
     # Relations
     rejection_reason_obj = relationship(
@@ -68,3 +72,15 @@ class SourceCategoryORM(Base):
     __tablename__ = 'source_categories'
     source_id = Column(Integer, ForeignKey('sources.id', ondelete="CASCADE"), primary_key=True)
     category_id = Column(Integer, ForeignKey('categories.id', ondelete="CASCADE"), primary_key=True)
+
+
+class SourceContentORM(Base):
+    # A content (deduplicated on content_hash) can be produced by several sources
+    __tablename__ = 'source_contents'
+    source_id = Column(Integer, ForeignKey('sources.id', ondelete="CASCADE"), primary_key=True)
+    content_id = Column(Integer, ForeignKey('contents.id', ondelete="CASCADE"), primary_key=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index('idx_source_contents_content', content_id),
+    )
@@ -0,0 +1,62 @@
+"""
+Cross-process events over PostgreSQL LISTEN / NOTIFY.
+
+content_changed: sent in the ingestion transaction (delivered on commit only), payload is
+the comma separated ids of the sources whose contents changed, '*' when too many to list.
+"""
+import asyncio
+from typing import Awaitable, Callable, Iterable, Optional, Set
+
+import psycopg
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from rag_project.config import DATABASE_URL
+from rag_project.logger import get_logger
+
+logger = get_logger(__name__)
+
+CONTENT_CHANGED_CHANNEL = "content_changed"
+ALL_SOURCES = "*"
+MAX_PAYLOAD_BYTES = 7900  # NOTIFY payloads are limited to 8000 bytes
+
+
+async def notify_content_changed(session: AsyncSession, source_ids: Iterable[int]):
+    payload = ",".join(str(source_id) for source_id in sorted(set(source_ids)))
+    if not payload:
+        return
+    if len(payload) > MAX_PAYLOAD_BYTES:
+        payload = ALL_SOURCES
+    await session.execute(select(func.pg_notify(CONTENT_CHANGED_CHANNEL, payload)))
+
+
+def parse_source_ids(payload: str) -> Optional[Set[int]]:
+    # None means every source
+    if payload == ALL_SOURCES:
+        return None
+    return {int(source_id) for source_id in payload.split(",") if source_id}
+
+
+async def listen(channel: str, on_payload: Callable[[str], Awaitable[None]],
+                 reconnect_payload: Optional[str] = None, retry_seconds: float = 5):
+    """
+    Calls on_payload for every notification, reconnecting until cancelled.
+    Notifications sent while disconnected are lost: reconnect_payload is delivered after each reconnection instead.
+    """
+    conninfo = DATABASE_URL.replace("postgresql+psycopg://", "postgresql://", 1)
+    connected_before = False
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(conninfo, autocommit=True) as conn:
+                await conn.execute(f"LISTEN {channel}")
+                logger.info(f"Listening to {channel}")
+                if connected_before and reconnect_payload is not None:
+                    await on_payload(reconnect_payload)
+                connected_before = True
+                async for notify in conn.notifies():
+                    await on_payload(notify.payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"LISTEN {channel} interrupted: {str(e)}, retrying in {retry_seconds}s")
+            await asyncio.sleep(retry_seconds)
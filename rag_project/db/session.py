@@ -1,32 +1,41 @@
-import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from contextlib import contextmanager
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
+from rag_project.config import (
+    POSTGRES_HOST, DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, VECTOR_ITERATIVE_SCAN, HNSW_MAX_SCAN_TUPLES,
+    IVFFLAT_MAX_PROBES
+)
 from rag_project.logger import get_logger
+from rag_project.metrics import track_db_pool
 
 
 logger = get_logger(__name__)
 
 logger.info("START: session")
+logger.info(f"Current host : {POSTGRES_HOST}")
+
+
+def _search_options() -> str:
+    # Session settings sent at connection startup (libpq options): no round trip per query.
+    # Iterative index scans keep filtered searches (see ContentCRUD filters) from returning fewer than top_k rows.
+    settings = {
+        "hnsw.iterative_scan": VECTOR_ITERATIVE_SCAN,
+        "ivfflat.iterative_scan": VECTOR_ITERATIVE_SCAN,
+        "hnsw.max_scan_tuples": HNSW_MAX_SCAN_TUPLES,
+    }
+    if IVFFLAT_MAX_PROBES:
+        settings["ivfflat.max_probes"] = IVFFLAT_MAX_PROBES
+    return " ".join(f"-c {name}={value}" for name, value in settings.items())
+
+
+# psycopg 3 async driver: queries no longer block the event loop
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+    connect_args={"options": _search_options()}
+)
+AsyncSessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+track_db_pool(lambda: engine.sync_engine.pool)
 
-host = os.environ.get("POSTGRES_HOST", "localhost")
-user = os.environ.get("POSTGRES_USER")
-password = os.environ.get("POSTGRES_PASSWORD")
-
-logger.info(f"Current host : {host}")
-
-engine = create_engine(f"postgresql+psycopg://{user}:{password}@{host}:5432/db")
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-
-def get_session():
-    session = SessionLocal()
-    try:
-        yield session
-        session.commit()
-    except Exception:
-        session.rollback()
-        raise
-    finally:
-        session.close()
@@ -1,5 +1,8 @@
+import functools
+from typing import Tuple
+
+from httpx import TimeoutException
 from sqlalchemy.exc import SQLAlchemyError
-from requests.exceptions import Timeout
 
 from rag_project.exceptions import DataBaseError, IngestionError, TimeOutError, UnexpectedError, RagError
 from rag_project.logger import get_logger
@@ -7,7 +10,34 @@ from rag_project.logger import get_logger
 logger = get_logger(__name__)
 
 
+def _translate_error(e: Exception) -> Tuple[Exception, str, bool]:
+    # Map any error raised inside a transaction to the app exceptions: (exception, log, exc_info)
+    if isinstance(e, SQLAlchemyError):
+        error_log = f"SQLAlchemy Error during transaction: {str(e)}"
+        return DataBaseError(message=error_log, code=500), error_log, True
+
+    if isinstance(e, IngestionError):
+        error_log = f"Ingestion Error during transaction: {str(e)}"
+        return IngestionError(message=error_log, code=500), error_log, e.exc_info
+
+    if isinstance(e, RagError):
+        error_log = f"Rag Error during transaction: {str(e)}"
+        return RagError(message=error_log, code=500), error_log, e.exc_info
+
+    if isinstance(e, TimeoutException):
+        error_log = f"TimeOut Error during transaction: {str(e)}"
+        return TimeOutError(message=error_log, code=500), error_log, True
+
+    if isinstance(e, TypeError):
+        error_log = f"TypeError Error during transaction: {str(e)}"
+        return DataBaseError(message=error_log, code=500), error_log, True
+
+    error_log = f"Unexpected Error during transaction: {str(e)}"
+    return UnexpectedError(message=error_log, code=500), error_log, True
+
+
 def db_session_manager(fn):
+    @functools.wraps(fn)
     def wrapper(self, *args, **kwargs):
         logger.info("session created")
         session = self.session_factory()
@@ -18,41 +48,46 @@ def db_session_manager(fn):
             session.commit()
             return result
 
-        except SQLAlchemyError as e:
-            error_log = f"SQLAlchemy Error during transaction: {str(e)}"
-            raise DataBaseError(message=error_log, code=500) from e
+        except Exception as e:
+            error, error_log, exc_info = _translate_error(e)
+            raise error from e
 
-        except IngestionError as e:
-            error_log = f"Ingestion Error during transaction: {str(e)}"
-            exc_info = e.exc_info
-            raise IngestionError(message=error_log, code=500) from e
+        finally:
+            if error_log:
+                logger.info("session rollback")
+                session.rollback()
+                logger.error(error_log, exc_info=exc_info)
 
-        except RagError as e:
-            error_log = f"Rag Error during transaction: {str(e)}"
-            exc_info = e.exc_info
-            raise IngestionError(message=error_log, code=500) from e
+            logger.info("session closed")
+            session.close()
 
-        except Timeout as e:
-            error_log = f"TimeOut Error during transaction: {str(e)}"
-            raise TimeOutError(message=error_log, code=500) from e
+    return wrapper
 
-        except TypeError as e:
-            error_log = f"TypeError Error during transaction: {str(e)}"
-            raise DataBaseError(message=error_log, code=500) from e
+
+def async_db_session_manager(fn):
+    # Same contract as db_session_manager for coroutines: the session lives until the coroutine is done
+    @functools.wraps(fn)
+    async def wrapper(self, *args, **kwargs):
+        logger.info("session created")
+        session = self.session_factory()
+        error_log = None
+        exc_info = True
+        try:
+            result = await fn(self, session, *args, **kwargs)
+            await session.commit()
+            return result
 
         except Exception as e:
-            error_log = f"Unexpected Error during transaction: {str(e)}"
-            raise UnexpectedError(message=error_log, code=500) from e
+            error, error_log, exc_info = _translate_error(e)
+            raise error from e
 
         finally:
             if error_log:
                 logger.info("session rollback")
-                session.rollback()
+                await session.rollback()
                 logger.error(error_log, exc_info=exc_info)
 
-            self.reset_state()
-
             logger.info("session closed")
-            session.close()
+            await session.close()
 
     return wrapper
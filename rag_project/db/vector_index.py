@@ -0,0 +1,206 @@
+"""
+Vector index of contents.embedding: sizing rules, DDL and current state.
+
+ivfflat: lists = rows / 1000 up to 1M rows, sqrt(rows) above, searched with probes = sqrt(lists).
+Its clusters are computed when the index is built, so it is rebuilt once the table has grown
+IVFFLAT_REBUILD_GROWTH times since (the row count at build time is kept in the index comment).
+hnsw: quality does not depend on the rows present at build time, rebuilt only when m / ef_construction change.
+
+storage: indexed form of the embeddings (VECTOR_STORAGE). halfvec / bit indexes are expression indexes over the
+float32 column: 2x / 32x smaller, searched for more candidates then re-scored at full precision (nearest_sql).
+"""
+import json
+import math
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from sqlalchemy import text
+
+from rag_project.config import (
+    VECTOR_INDEX_TYPE, HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, IVFFLAT_REBUILD_GROWTH, VECTOR_STORAGE,
+    VECTOR_RESCORE_FACTOR
+)
+
+INDEX_NAME = "ix_embedding_cosine"
+INDEX_METHODS = ("ivfflat", "hnsw")
+DEFAULT_STORAGE = "vector"
+EMBEDDING_DIM = 384  # contents.embedding, all-MiniLM-L6-v2
+
+# storage: (operator class, default rescore factor). Binary codes rank coarsely, they need a longer short list
+STORAGES = {
+    "vector": ("vector_cosine_ops", 1),
+    "halfvec": ("halfvec_cosine_ops", 2),
+    "bit": ("bit_hamming_ops", 8),
+}
+IVFFLAT_MIN_LISTS = 10
+IVFFLAT_MIN_REBUILD_ROWS = 1000  # Below that a rebuild is pointless, whatever the growth
+EXACT_COUNT_MAX_ROWS = 1_000_000  # Above, the planner estimate is good enough
+
+# pgvector defaults, used when an index was created without options
+_DEFAULT_OPTIONS = {"ivfflat": {"lists": 100}, "hnsw": {"m": 16, "ef_construction": 64}}
+
+
+def ivfflat_lists(rows: int) -> int:
+    if rows <= 1_000_000:
+        return max(IVFFLAT_MIN_LISTS, rows // 1000)
+    return int(math.sqrt(rows))
+
+
+def ivfflat_probes(lists: int) -> int:
+    return max(1, round(math.sqrt(lists)))
+
+
+def check_storage(storage: str) -> str:
+    if storage not in STORAGES:
+        raise ValueError(f"Unknown vector storage {storage}, expected one of {tuple(STORAGES)}")
+    return storage
+
+
+def indexed_expression(storage: str, column: str = "embedding") -> str:
+    # Must be written the same way in the index and in the queries for the planner to use the index
+    if check_storage(storage) == "halfvec":
+        return f"({column}::halfvec({EMBEDDING_DIM}))"
+    if storage == "bit":
+        return f"(binary_quantize({column})::bit({EMBEDDING_DIM}))"
+    return column
+
+
+def index_distance_sql(storage: str, column: str, vector: str) -> str:
+    """Distance of column to the vector SQL expression, in the form served by the index of that storage."""
+    if check_storage(storage) == "halfvec":
+        return f"{indexed_expression(storage, column)} <=> CAST({vector} AS halfvec({EMBEDDING_DIM}))"
+    if storage == "bit":
+        return f"{indexed_expression(storage, column)} <~> binary_quantize({vector})"  # Hamming distance
+    return f"{column} <=> {vector}"
+
+
+def rescore_factor(storage: str) -> int:
+    return VECTOR_RESCORE_FACTOR or STORAGES[check_storage(storage)][1]
+
+
+def nearest_sql(vector: str, columns: str = "contents.id", condition: str = "TRUE", limit: str = ":top_k",
+                storage: str = VECTOR_STORAGE, factor: Optional[int] = None) -> str:
+    """
+    SELECT of columns and distance (full precision cosine distance to the vector SQL expression) of the limit
+    rows of contents passing condition closest to vector. Compact storages: limit x factor candidates from
+    their index, the short list re-ranked on contents.embedding (heap rows already fetched by the index scan).
+    """
+    distance = f"contents.embedding <=> {vector}"
+    if check_storage(storage) == "vector":
+        return (
+            f"SELECT {columns}, {distance} AS distance FROM contents "
+            f"WHERE {condition} ORDER BY {distance} LIMIT {limit}"
+        )
+    return (
+        "SELECT * FROM ("
+        f"  SELECT {columns}, {distance} AS distance FROM contents "
+        f"  WHERE {condition} ORDER BY {index_distance_sql(storage, 'contents.embedding', vector)} "
+        f"  LIMIT {limit} * {int(factor or rescore_factor(storage))}"
+        f") candidates ORDER BY distance LIMIT {limit}"
+    )
+
+
+@dataclass
+class IndexSpec:
+    method: str
+    options: Dict[str, int]
+    rows: int = 0  # Row count the index is sized for
+    storage: str = "vector"
+
+    @classmethod
+    def for_rows(cls, rows: int, method: str = VECTOR_INDEX_TYPE, storage: str = DEFAULT_STORAGE) -> "IndexSpec":
+        check_storage(storage)
+        if method == "ivfflat":
+            return cls(method, {"lists": ivfflat_lists(rows)}, rows, storage)
+        if method == "hnsw":
+            return cls(method, {"m": HNSW_M, "ef_construction": HNSW_EF_CONSTRUCTION}, rows, storage)
+        raise ValueError(f"Unknown vector index type {method}, expected one of {INDEX_METHODS}")
+
+    def create_sql(self, name: str = INDEX_NAME, concurrently: bool = False) -> str:
+        options = ", ".join(f"{key} = {value}" for key, value in self.options.items())
+        return (
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}{name} ON contents "
+            f"USING {self.method} ({indexed_expression(self.storage)} {STORAGES[self.storage][0]}) WITH ({options})"
+        )
+
+    def comment_sql(self, name: str = INDEX_NAME) -> str:
+        return f"COMMENT ON INDEX {name} IS '{json.dumps({'rows': self.rows})}'"
+
+    def search_settings(self) -> Dict[str, int]:
+        # Default search parameters going with this index
+        if self.method == "ivfflat":
+            return {"ivfflat.probes": ivfflat_probes(self.options["lists"])}
+        return {"hnsw.ef_search": HNSW_EF_SEARCH}
+
+
+def default_spec(rows: int = 0, method: str = "ivfflat") -> IndexSpec:
+    # Index declared on ContentORM and created by the migrations, whatever the settings: VECTOR_INDEX_TYPE and
+    # VECTOR_STORAGE are applied by index_maintenance, the only one to change it afterwards
+    return IndexSpec.for_rows(rows, method, DEFAULT_STORAGE)
+
+
+@dataclass
+class IndexState:
+    method: str
+    options: Dict[str, int]
+    valid: bool  # False when a concurrent build was interrupted
+    built_rows: Optional[int]  # None for indexes not built by index_maintenance
+    rows: int
+    storage: Optional[str] = DEFAULT_STORAGE  # None for an operator class not in STORAGES
+
+    def option(self, key: str) -> int:
+        return self.options.get(key, _DEFAULT_OPTIONS[self.method][key])
+
+
+async def count_rows(conn) -> int:
+    estimate = (await conn.execute(text(
+        "SELECT reltuples::bigint FROM pg_class WHERE oid = 'contents'::regclass"
+    ))).scalar()
+    if estimate is None or estimate < EXACT_COUNT_MAX_ROWS:  # -1 / 0 when never analyzed
+        return (await conn.execute(text("SELECT count(*) FROM contents"))).scalar()
+    return estimate
+
+
+async def get_index_state(conn, name: str = INDEX_NAME) -> Optional[IndexState]:
+    row = (await conn.execute(text(
+        "SELECT am.amname, c.reloptions, i.indisvalid, obj_description(c.oid, 'pg_class'), opc.opcname "
+        "FROM pg_class c "
+        "JOIN pg_am am ON am.oid = c.relam "
+        "JOIN pg_index i ON i.indexrelid = c.oid "
+        "JOIN pg_opclass opc ON opc.oid = i.indclass[0] "
+        "WHERE c.relname = :name AND c.relkind = 'i'"
+    ), {"name": name})).first()
+    if row is None:
+        return None
+
+    method, reloptions, valid, comment, opclass = row
+    storage = next((storage for storage, (ops, _) in STORAGES.items() if ops == opclass), None)
+    options = {key: int(value) for key, value in (option.split("=", 1) for option in reloptions or [])}
+    try:
+        built_rows = json.loads(comment)["rows"]
+    except (TypeError, ValueError, KeyError):
+        built_rows = None
+
+    return IndexState(method, options, valid, built_rows, await count_rows(conn), storage)
+
+
+def rebuild_reason(state: Optional[IndexState], spec: IndexSpec) -> Optional[str]:
+    """Why the index must be rebuilt to match spec, None when it is up to date."""
+    if state is None:
+        return "missing"
+    if not state.valid:
+        return "invalid"
+    if state.method != spec.method:
+        return f"{state.method} -> {spec.method}"
+    if state.storage != spec.storage:
+        return f"{state.storage} -> {spec.storage} storage"
+
+    changed = {key: value for key, value in spec.options.items() if state.option(key) != value}
+    if spec.method == "hnsw":
+        return f"options changed {changed}" if changed else None
+
+    if state.built_rows is None:
+        return f"options changed {changed}" if changed else None
+    if state.rows >= IVFFLAT_REBUILD_GROWTH * max(state.built_rows, IVFFLAT_MIN_REBUILD_ROWS):
+        return f"table grew from {state.built_rows} to {state.rows} rows"
+    return None
@@ -1,13 +1,18 @@
-from pydantic import BaseModel
-from typing import Optional
+from datetime import datetime
+from pydantic import BaseModel, conlist, conint, root_validator, validator
+from typing import Dict, List, Optional
 from enum import Enum
 
+from rag_project.config import INGEST_URLS_MAX, ASK_BATCH_MAX, CRAWL_MAX_DEPTH, CRAWL_MAX_PAGES, RETRIEVAL_MODE
+from rag_project.utils.urls import normalize_url
+
 
 class DocumentDomain(BaseModel):
     id: int
     content: str
     similarity: float
     source_id: Optional[int] = None
+    score: Optional[float] = None  # Fusion (hybrid) or cross-encoder score, the list is already in its order
 
     class Config:
         exclude_none = True
@@ -32,3 +37,146 @@ class RejectReasonEnum(str, Enum):
 class LanguageEnum(str, Enum):
     FR = "fr"
     EN = "en"
+
+
+class RetrievalModeEnum(str, Enum):
+    VECTOR = "vector"  # Embedding similarity only
+    HYBRID = "hybrid"  # Full-text and embedding rankings fused, finds exact names, codes and acronyms
+
+
+DEFAULT_RETRIEVAL_MODE = RetrievalModeEnum(RETRIEVAL_MODE)
+
+
+class IngestionStatusEnum(str, Enum):
+    SUCCESS = "success"
+    UNCHANGED = "unchanged"  # Not modified since the last ingestion, nothing stored
+    FAILED = "failed"
+
+
+class RetrievalFilters(BaseModel):
+    # Applied in SQL, before the top-k: a content passes when one of its sources does
+    only_accepted: bool = True  # Rejected sources never reach the answers
+    source_types: Optional[List[SourceTypeEnum]] = None
+    categories: Optional[List[str]] = None  # Category names, any of them
+
+
+class IngestUrlsRequest(BaseModel):
+    urls: conlist(str, min_items=1, max_items=INGEST_URLS_MAX)
+    source_type: SourceTypeEnum = SourceTypeEnum.WEB
+
+
+class UrlIngestionResult(BaseModel):
+    url: str
+    status: IngestionStatusEnum
+    chunks: int = 0
+    new_chunks: int = 0  # Chunks embedded and stored, the others were already known
+    error: Optional[str] = None
+
+
+class IngestUrlsReport(BaseModel):
+    ingested: int
+    unchanged: int
+    failed: int
+    chunks: int
+    results: List[UrlIngestionResult]
+
+
+class AskBatchRequest(BaseModel):
+    questions: conlist(str, min_items=1, max_items=ASK_BATCH_MAX)
+    top_k: conint(ge=1, le=50) = 6
+    mode: Optional[RetrievalModeEnum] = None  # RETRIEVAL_MODE by default
+    filters: RetrievalFilters = RetrievalFilters()
+
+
+class BatchAnswer(BaseModel):
+    question: str
+    answer: Optional[str] = None
+    documents: List[int] = []  # Ids of the retrieved contents
+    error: Optional[str] = None
+
+
+class AskBatchReport(BaseModel):
+    answered: int
+    failed: int
+    results: List[BatchAnswer]  # In the order of the questions
+
+
+class JobStatusEnum(str, Enum):
+    # HACK: Domain class used in Data layer
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class IngestionJobDomain(BaseModel):
+    id: int
+    path_to_content: str
+    source_type: SourceTypeEnum
+    status: JobStatusEnum
+    stage: Optional[str] = None
+    progress: float
+    chunks_count: Optional[int] = None
+    error: Optional[str] = None
+    attempts: int
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+
+class CrawlUrlStatusEnum(str, Enum):
+    # HACK: Domain class used in Data layer
+    PENDING = "pending"
+    RUNNING = "running"
+    INGESTED = "ingested"
+    UNCHANGED = "unchanged"
+    SKIPPED = "skipped"  # robots.txt
+    FAILED = "failed"
+
+
+class CrawlRequest(BaseModel):
+    seeds: List[str] = []
+    sitemaps: List[str] = []  # Sitemaps or sitemap indexes, their pages are crawled at depth 0
+    allowed_domains: Optional[List[str]] = None  # Hosts of the seeds and sitemaps by default, subdomains included
+    max_depth: conint(ge=0) = CRAWL_MAX_DEPTH
+    max_pages: conint(ge=1) = CRAWL_MAX_PAGES
+    source_type: SourceTypeEnum = SourceTypeEnum.WEB
+
+    @validator("seeds", "sitemaps", each_item=True)
+    def normalize(cls, url):
+        normalized = normalize_url(url)
+        if normalized is None:
+            raise ValueError(f"Not a crawlable http(s) url: {url}")
+        return normalized
+
+    @validator("allowed_domains", each_item=True)
+    def lower_domain(cls, domain):
+        return domain.strip().lower()
+
+    @root_validator(skip_on_failure=True)
+    def check_start(cls, values):
+        if not values.get("seeds") and not values.get("sitemaps"):
+            raise ValueError("At least one seed or sitemap is required")
+        return values
+
+
+class CrawlDomain(BaseModel):
+    id: int
+    seeds: List[str]
+    sitemaps: List[str]
+    allowed_domains: List[str]
+    max_depth: int
+    max_pages: int
+    source_type: SourceTypeEnum
+    status: JobStatusEnum
+    error: Optional[str] = None
+    urls: Dict[CrawlUrlStatusEnum, int] = {}  # Frontier size per status
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
@@ -1,5 +1,17 @@
 import logging
 import sys
+from contextvars import ContextVar
+
+NO_REQUEST_ID = "-"
+
+# Id of the HTTP request (or ingestion job) being served, set by the API middleware / the workers
+request_id_var: ContextVar[str] = ContextVar("request_id", default=NO_REQUEST_ID)
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
 
 
 def get_logger(name: str = "ragProject") -> logging.Logger:
@@ -10,12 +22,13 @@ def get_logger(name: str = "ragProject") -> logging.Logger:
     logger.setLevel(logging.DEBUG)
 
     formatter = logging.Formatter(
-        "[%(asctime)s] [%(levelname)s] %(name)s - %(message)s",
+        "[%(asctime)s] [%(levelname)s] [%(request_id)s] %(name)s - %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S"
     )
 
     handler = logging.StreamHandler(sys.stdout)
     handler.setFormatter(formatter)
+    handler.addFilter(RequestIdFilter())
 
     logger.addHandler(handler)
     return logger
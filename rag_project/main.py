@@ -1,20 +1,114 @@
-from fastapi import FastAPI, Query, Depends, HTTPException
-from sentence_transformers import SentenceTransformer
+import asyncio
+import time
+import uuid
+from typing import List, Optional
+
+from fastapi import FastAPI, Query, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from contextlib import asynccontextmanager
+from prometheus_client import REGISTRY
+from prometheus_client.exposition import choose_encoder
 
-from rag_project.api.dependencies import get_embedding_model, get_ingestion_service, get_rag_service
-from rag_project.domain.models import SourceTypeEnum
+from rag_project.api.dependencies import (
+    get_ingestion_service, get_rag_service, get_model_registry, get_embedding_batcher, get_job_service,
+    get_embedding_cache, get_crawl_service, get_retrieval_filters
+)
+from rag_project.api.sse import sse_event, until_disconnected, SSE_HEADERS
+from rag_project.config import (
+    EMBEDDING_MODELS, ANSWER_CACHE_ENABLED, QUERY_EMBEDDING_CACHE_SIZE, RERANK_MODEL, RERANK_MAX_LENGTH
+)
+from rag_project.db.mmap_index import build_vector_index
+from rag_project.db.notifications import listen, CONTENT_CHANGED_CHANNEL, ALL_SOURCES
+from rag_project.db.session import engine
+from rag_project.domain.models import (
+    SourceTypeEnum, IngestUrlsRequest, IngestUrlsReport, IngestionStatusEnum, IngestionJobDomain, JobStatusEnum,
+    AskBatchRequest, AskBatchReport, CrawlRequest, CrawlDomain, RetrievalModeEnum, RetrievalFilters
+)
 from rag_project.exceptions import IngestionError, DataBaseError, TimeOutError, RagError
+from rag_project.logger import get_logger, request_id_var
+from rag_project.metrics import HTTP_REQUEST_SECONDS
+from rag_project.services.answer_cache import SemanticAnswerCache
+from rag_project.services.crawl_service import CrawlService
+from rag_project.services.embedding_batcher import EmbeddingBatcher
+from rag_project.services.embedding_cache import QueryEmbeddingCache
 from rag_project.services.ingestion_service import IngestionService
-from rag_project.services.rag_service import RagService
+from rag_project.services.job_service import JobService
+from rag_project.services.model_registry import ModelRegistry, model_registry
+from rag_project.services.rag_service import RagService, build_llm_client
+from rag_project.services.reranker import CrossEncoderReranker
+from rag_project.services.scraping_service import WebScraper, build_http_client
+from rag_project.services.search_backend import build_search_backend, sync_vector_index
+
+
+logger = get_logger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(fast_api_app: FastAPI):
-    # Initialize SentenceTransformer
-    fast_api_app.state.model = SentenceTransformer("all-MiniLM-L6-v2")  # type: ignore
+    # Load and warm up embedding models once per process
+    model_registry.load_all(EMBEDDING_MODELS)
+    fast_api_app.state.model_registry = model_registry  # type: ignore
+
+    # Query embeddings of concurrent /ask requests are encoded together
+    embedding_batcher = EmbeddingBatcher(model_registry.get())
+    await embedding_batcher.start()
+    fast_api_app.state.embedding_batcher = embedding_batcher  # type: ignore
+
+    # In process copy of the embeddings when SEARCH_BACKEND=mmap, resynced from Postgres
+    vector_index = build_vector_index(model_registry.get().get_sentence_embedding_dimension())
+    if vector_index is not None:
+        await sync_vector_index(vector_index)
+
+    # Repeated questions skip the forward pass
+    embedding_cache = QueryEmbeddingCache(model_registry.default_name) if QUERY_EMBEDDING_CACHE_SIZE else None
+    fast_api_app.state.embedding_cache = embedding_cache  # type: ignore
+
+    # Answers reused for near-identical questions, dropped when ingestion (any process) changes their sources
+    answer_cache = SemanticAnswerCache() if ANSWER_CACHE_ENABLED else None
+    invalidation_listener = None
+    if answer_cache is not None:
+        invalidation_listener = asyncio.create_task(
+            listen(CONTENT_CHANGED_CHANNEL, answer_cache.on_content_changed, reconnect_payload=ALL_SOURCES),
+            name="answer-cache-invalidation"
+        )
+
+    # Retrieved chunks re-ordered by a cross-encoder, loaded and warmed up once
+    reranker = CrossEncoderReranker(
+        model_registry.load_cross_encoder(RERANK_MODEL, max_length=RERANK_MAX_LENGTH)
+    ) if RERANK_MODEL else None
+
+    # App-lifetime services owning pooled HTTP / LLM clients
+    scraper = WebScraper(build_http_client())
+    llm_client = build_llm_client()
+    fast_api_app.state.ingestion_service = IngestionService(  # type: ignore
+        model=model_registry.get(),
+        scraper=scraper,
+        vector_index=vector_index
+    )
+    fast_api_app.state.rag_service = RagService(  # type: ignore
+        batcher=embedding_batcher,
+        llm_client=llm_client,
+        search_backend=build_search_backend(vector_index),
+        answer_cache=answer_cache,
+        embedding_cache=embedding_cache,
+        reranker=reranker
+    )
+    fast_api_app.state.job_service = JobService()  # type: ignore
+    fast_api_app.state.crawl_service = CrawlService()  # type: ignore
+
     yield
 
+    if invalidation_listener is not None:
+        invalidation_listener.cancel()
+    await embedding_batcher.stop()
+    if reranker is not None:
+        reranker.close()
+    if embedding_cache is not None:
+        embedding_cache.close()
+    await scraper.aclose()
+    await llm_client.close()
+    await engine.dispose()
+
 app = FastAPI(
     lifespan=lifespan,
     title="rag-project",
@@ -23,19 +117,130 @@ app = FastAPI(
 )
 
 
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    # The request id is attached to every log line and stage span of the request, and echoed back
+    request_id = request.headers.get("X-Request-ID", "")[:64] or uuid.uuid4().hex  # Exemplar labels are capped
+    token = request_id_var.set(request_id)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        # Route template, not the raw path: /jobs/{job_id} is a single series
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUEST_SECONDS.labels(request.method, route, status).observe(
+            time.perf_counter() - start, exemplar={"request_id": request_id}
+        )
+        request_id_var.reset(token)
+
+
 @app.post("/ingest-url")
 async def ingest_url(
         url: str,
-        model: SentenceTransformer = Depends(get_embedding_model),
-        service: IngestionService = Depends(get_ingestion_service)
+        service: JobService = Depends(get_job_service)
 ):
+    # Processed in the background by the ingestion workers, follow it on /jobs/{job_id}
     try:
-        count = service.ingest_content(
-            model=model,
-            url=url,
+        job = await service.enqueue(
+            path_to_content=url,
             source_type=SourceTypeEnum.WEB
         )
-        return {"status": "success", "ingested": count}
+        return {"status": job.status, "job_id": job.id}
+
+    except IngestionError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    except DataBaseError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    except TimeOutError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/jobs/{job_id}", response_model=IngestionJobDomain)
+async def get_job(
+        job_id: int,
+        service: JobService = Depends(get_job_service)
+):
+    try:
+        job = await service.get_job(job_id=job_id)
+    except DataBaseError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+@app.get("/jobs", response_model=List[IngestionJobDomain])
+async def list_jobs(
+        status: JobStatusEnum = None,
+        limit: int = Query(100, le=1000),
+        service: JobService = Depends(get_job_service)
+):
+    try:
+        return await service.list_jobs(status=status, limit=limit)
+    except DataBaseError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/crawls", response_model=CrawlDomain)
+async def create_crawl(
+        request: CrawlRequest,
+        service: CrawlService = Depends(get_crawl_service)
+):
+    # Crawled in the background by the crawl worker, follow it on /crawls/{crawl_id}
+    try:
+        return await service.create_crawl(request=request)
+
+    except DataBaseError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/crawls/{crawl_id}", response_model=CrawlDomain)
+async def get_crawl(
+        crawl_id: int,
+        service: CrawlService = Depends(get_crawl_service)
+):
+    try:
+        crawl = await service.get_crawl(crawl_id=crawl_id)
+    except DataBaseError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if crawl is None:
+        raise HTTPException(status_code=404, detail=f"Crawl {crawl_id} not found")
+    return crawl
+
+
+@app.post("/ingest-urls", response_model=IngestUrlsReport)
+async def ingest_urls(
+        request: IngestUrlsRequest,
+        service: IngestionService = Depends(get_ingestion_service)
+):
+    try:
+        results = await service.ingest_urls(
+            urls=request.urls,
+            source_type=request.source_type
+        )
+        succeeded = [result for result in results if result.status == IngestionStatusEnum.SUCCESS]
+        unchanged = sum(1 for result in results if result.status == IngestionStatusEnum.UNCHANGED)
+        return IngestUrlsReport(
+            ingested=len(succeeded),
+            unchanged=unchanged,
+            failed=len(results) - len(succeeded) - unchanged,
+            chunks=sum(result.chunks for result in succeeded),
+            results=results
+        )
 
     except IngestionError as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -53,13 +258,15 @@ async def ingest_url(
 @app.post("/ask")
 async def ask_question(
         question: str = Query(...),
-        model: SentenceTransformer = Depends(get_embedding_model),
+        mode: Optional[RetrievalModeEnum] = None,
+        filters: RetrievalFilters = Depends(get_retrieval_filters),
         service: RagService = Depends(get_rag_service)
 ):
     try:
         answer = await service.answer_question(
-            model=model,
-            question=question
+            question=question,
+            mode=mode,
+            filters=filters
         )
         return {"answer": answer}
 
@@ -74,3 +281,105 @@ async def ask_question(
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/ask-batch", response_model=AskBatchReport)
+async def ask_questions(
+        request: AskBatchRequest,
+        service: RagService = Depends(get_rag_service)
+):
+    try:
+        results = await service.answer_questions(
+            questions=request.questions,
+            top_k=request.top_k,
+            mode=request.mode,
+            filters=request.filters
+        )
+        answered = sum(1 for result in results if result.error is None)
+        return AskBatchReport(
+            answered=answered,
+            failed=len(results) - answered,
+            results=results
+        )
+
+    except RagError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    except DataBaseError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    except TimeOutError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/ask-stream")
+async def ask_question_stream(
+        request: Request,
+        question: str = Query(...),
+        mode: Optional[RetrievalModeEnum] = None,
+        filters: RetrievalFilters = Depends(get_retrieval_filters),
+        service: RagService = Depends(get_rag_service)
+):
+    # Server-Sent Events: 'sources' once retrieved, then 'token' events as the LLM generates, then 'done'
+    try:
+        ctx = await service.retrieve(question=question, mode=mode, filters=filters)
+
+    except RagError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    except DataBaseError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    except TimeOutError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        yield sse_event("sources", {
+            "documents": [
+                {"id": doc.id, "source_id": doc.source_id, "similarity": doc.similarity} for doc in ctx.docs
+            ]
+        })
+        tokens = service.stream_answer(ctx)
+        try:
+            async for text in until_disconnected(tokens, request.is_disconnected):
+                yield sse_event("token", {"text": text})
+            if await request.is_disconnected():
+                logger.info("Client disconnected, LLM stream closed")
+            else:
+                yield sse_event("done", {})
+        except Exception as e:
+            logger.error(f"ask_stream : {str(e)}")
+            yield sse_event("error", {"detail": str(e)})
+        finally:
+            await tokens.aclose()  # Also reached when the response task is cancelled on disconnect
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@app.get("/models")
+async def list_models(registry: ModelRegistry = Depends(get_model_registry)):
+    return registry.stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    # Prometheus text format, or OpenMetrics (with request id exemplars) when the scraper asks for it
+    encoder, content_type = choose_encoder(request.headers.get("accept"))
+    return Response(content=encoder(REGISTRY), media_type=content_type)
+
+
+@app.get("/stats")
+async def get_stats(
+        batcher: EmbeddingBatcher = Depends(get_embedding_batcher),
+        embedding_cache: Optional[QueryEmbeddingCache] = Depends(get_embedding_cache)
+):
+    return {
+        "embedding_batcher": batcher.stats.as_dict(),
+        "query_embedding_cache": embedding_cache.stats() if embedding_cache is not None else None
+    }
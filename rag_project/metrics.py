@@ -0,0 +1,118 @@
+"""
+Prometheus metrics of the API and the ingestion workers.
+
+Stage spans (stage_timer) are exported as histograms, and also logged with the
+request id so that a slow request in the logs can be matched with its stages.
+"""
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from rag_project.logger import get_logger, request_id_var, NO_REQUEST_ID
+
+logger = get_logger(__name__)
+
+# Up to the LLM timeout
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "rag_http_request_seconds", "HTTP request latency",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds", "Latency of each stage of the ask / ingestion pipelines",
+    ["pipeline", "stage", "outcome"], buckets=LATENCY_BUCKETS
+)
+
+CHUNKS = Counter(
+    "rag_chunks", "Ingested chunks: chunked from the sources, new (not stored yet), inserted",
+    ["kind"]
+)
+
+PAGES_FETCHED = Counter(
+    "rag_pages_fetched", "Ingested pages: not_modified (304), unchanged (same extracted text), changed",
+    ["outcome"]
+)
+
+EMBED_BATCH_SIZE = Histogram(
+    "rag_embed_batch_size", "Texts per model.encode call",
+    ["source"], buckets=SIZE_BUCKETS
+)
+
+EMBED_QUEUE_WAIT_SECONDS = Histogram(
+    "rag_embed_queue_wait_seconds", "Time a question waits in the embedding batcher",
+    buckets=LATENCY_BUCKETS
+)
+
+PROMPT_TOKENS = Histogram(
+    "rag_prompt_tokens", "Tokens of the packed prompts",
+    buckets=(250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 16000)
+)
+
+LLM_TOKENS = Counter(
+    "rag_llm_tokens", "Tokens billed by the LLM",
+    ["model", "kind"]
+)
+
+ANSWER_CACHE_LOOKUPS = Counter("rag_answer_cache_lookups", "Semantic answer cache lookups", ["result"])
+ANSWER_CACHE_SAVED_LLM_SECONDS = Counter(
+    "rag_answer_cache_saved_llm_seconds", "LLM latency saved by answer cache hits (latency of the cached calls)"
+)
+ANSWER_CACHE_ENTRIES = Gauge("rag_answer_cache_entries", "Answers in the semantic cache")
+ANSWER_CACHE_INVALIDATIONS = Counter(
+    "rag_answer_cache_invalidations", "Cached answers dropped because their sources changed"
+)
+
+RERANK_OUTCOMES = Counter(
+    "rag_rerank", "Cross-encoder re-rankings (reranked, cached, timeout, skipped, error)", ["outcome"]
+)
+RERANK_PAIRS = Histogram(
+    "rag_rerank_pairs", "(question, chunk) pairs scored per cross-encoder call", buckets=SIZE_BUCKETS
+)
+
+QUERY_EMBEDDING_CACHE_LOOKUPS = Counter(
+    "rag_query_embedding_cache_lookups", "Question embedding cache lookups (hit, disk_hit, miss)", ["result"]
+)
+
+DB_POOL_SIZE = Gauge("rag_db_pool_size", "Connections kept by the DB pool")
+DB_POOL_CHECKED_OUT = Gauge("rag_db_pool_checked_out", "DB connections currently in use")
+DB_POOL_OVERFLOW = Gauge("rag_db_pool_overflow", "DB connections opened beyond the pool size")
+
+
+@contextmanager
+def stage_timer(pipeline: str, stage: str):
+    outcome = "error"
+    start = time.perf_counter()
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        seconds = time.perf_counter() - start
+        request_id = request_id_var.get()
+        exemplar = {"request_id": request_id} if request_id != NO_REQUEST_ID else None
+        STAGE_SECONDS.labels(pipeline, stage, outcome).observe(seconds, exemplar=exemplar)
+        logger.debug(f"{pipeline}.{stage} {outcome} in {1000 * seconds:.1f} ms")
+
+
+def record_chunks(chunked: int, new: int, inserted: int):
+    CHUNKS.labels("chunked").inc(chunked)
+    CHUNKS.labels("new").inc(new)
+    CHUNKS.labels("inserted").inc(inserted)
+
+
+def record_llm_usage(model: str, usage):
+    if usage is None:  # Not every OpenAI compatible server reports it
+        return
+    LLM_TOKENS.labels(model, "prompt").inc(usage.prompt_tokens)
+    LLM_TOKENS.labels(model, "completion").inc(usage.completion_tokens)
+
+
+def track_db_pool(get_pool: Callable):
+    # Read at scrape time; get_pool because engine.dispose() replaces the pool
+    DB_POOL_SIZE.set_function(lambda: get_pool().size())
+    DB_POOL_CHECKED_OUT.set_function(lambda: get_pool().checkedout())
+    DB_POOL_OVERFLOW.set_function(lambda: max(get_pool().overflow(), 0))
@@ -0,0 +1,127 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import FrozenSet, Iterable, List, Optional
+
+import numpy as np
+
+from rag_project.config import ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_MIN_SIMILARITY
+from rag_project.db.notifications import parse_source_ids
+from rag_project.logger import get_logger
+from rag_project.metrics import (
+    ANSWER_CACHE_LOOKUPS, ANSWER_CACHE_SAVED_LLM_SECONDS, ANSWER_CACHE_ENTRIES, ANSWER_CACHE_INVALIDATIONS
+)
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    vector: np.ndarray  # Normalized question embedding
+    doc_ids: FrozenSet[int]  # Documents the answer was generated from
+    source_ids: FrozenSet[int]
+    answer: str
+    llm_seconds: float  # What a hit saves
+    expires_at: float
+
+
+class SemanticAnswerCache:
+    """
+    LLM answers of previous questions, reused for a new question when both embeddings
+    are above min_similarity and the retrieval returns the same documents.
+    Bounded LRU with a TTL, entries of a source are dropped when its contents change.
+    Single event loop: no locking.
+    """
+
+    def __init__(
+            self,
+            max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+            ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+            min_similarity: float = ANSWER_CACHE_MIN_SIMILARITY
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.min_similarity = min_similarity
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()  # Least recently used first
+        self._next_key = 0
+        # Stacked vectors of the entries, rebuilt on the first lookup after a change
+        self._keys: List[int] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _changed(self):
+        self._matrix = None
+        ANSWER_CACHE_ENTRIES.set(len(self._entries))
+
+    def _remove(self, keys: Iterable[int]) -> int:
+        removed = 0
+        for key in list(keys):
+            if self._entries.pop(key, None) is not None:
+                removed += 1
+        if removed:
+            self._changed()
+        return removed
+
+    def lookup(self, vector: List[float], doc_ids: Iterable[int]) -> Optional[CachedAnswer]:
+        doc_ids = frozenset(doc_ids)
+        if self._entries:
+            if self._matrix is None:
+                self._keys = list(self._entries)
+                self._matrix = np.vstack([entry.vector for entry in self._entries.values()])
+
+            now = time.monotonic()
+            scores = self._matrix @ np.asarray(vector, dtype=np.float32)
+            expired = []
+            for i in np.argsort(-scores):
+                if scores[i] < self.min_similarity:
+                    break
+                key = self._keys[i]
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry.expires_at <= now:
+                    expired.append(key)
+                elif entry.doc_ids == doc_ids:
+                    self._entries.move_to_end(key)
+                    self._remove(expired)
+                    ANSWER_CACHE_LOOKUPS.labels("hit").inc()
+                    ANSWER_CACHE_SAVED_LLM_SECONDS.inc(entry.llm_seconds)
+                    return entry
+            self._remove(expired)
+
+        ANSWER_CACHE_LOOKUPS.labels("miss").inc()
+        return None
+
+    def store(self, vector: List[float], doc_ids: Iterable[int], source_ids: Iterable[int],
+              answer: str, llm_seconds: float):
+        vector = np.asarray(vector, dtype=np.float32)
+        self._entries[self._next_key] = CachedAnswer(
+            vector=vector / (np.linalg.norm(vector) or 1.0),
+            doc_ids=frozenset(doc_ids),
+            source_ids=frozenset(source_id for source_id in source_ids if source_id is not None),
+            answer=answer,
+            llm_seconds=llm_seconds,
+            expires_at=time.monotonic() + self.ttl_seconds
+        )
+        self._next_key += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._changed()
+
+    def invalidate_sources(self, source_ids: Optional[Iterable[int]]) -> int:
+        """Drops the answers built on these sources, every answer when source_ids is None."""
+        if source_ids is None:
+            removed = self._remove(list(self._entries))
+        else:
+            source_ids = set(source_ids)
+            removed = self._remove([key for key, entry in self._entries.items() if entry.source_ids & source_ids])
+        if removed:
+            ANSWER_CACHE_INVALIDATIONS.inc(removed)
+            logger.info(f"{removed} cached answers invalidated")
+        return removed
+
+    async def on_content_changed(self, payload: str):
+        # Listener of the content_changed notifications
+        self.invalidate_sources(parse_source_ids(payload))
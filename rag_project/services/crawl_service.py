@@ -0,0 +1,45 @@
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from rag_project.db.crud.crawl import CrawlCRUD
+from rag_project.db.session import AsyncSessionLocal
+from rag_project.db.session_manager import async_db_session_manager
+from rag_project.domain.models import CrawlRequest, CrawlDomain
+from rag_project.logger import get_logger
+from rag_project.utils.urls import url_host
+
+
+logger = get_logger(__name__)
+
+
+class CrawlService:
+    # API side of the crawls, processed by rag_project.workers.crawl_worker
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self.session_factory = session_factory
+
+    @async_db_session_manager
+    async def create_crawl(self, session: AsyncSession, request: CrawlRequest) -> CrawlDomain:
+        # Urls normalized by CrawlRequest, scope defaults to their hosts
+        allowed_domains = request.allowed_domains or sorted({url_host(url) for url in request.seeds + request.sitemaps})
+        crawl_crud = CrawlCRUD(session)
+        crawl = await crawl_crud.create_crawl(
+            seeds=request.seeds,
+            sitemaps=request.sitemaps,
+            allowed_domains=allowed_domains,
+            max_depth=request.max_depth,
+            max_pages=request.max_pages,
+            source_type=request.source_type
+        )
+        logger.info(f"Crawl {crawl.id} queued for {allowed_domains}")
+        return CrawlDomain.from_orm(crawl)
+
+    @async_db_session_manager
+    async def get_crawl(self, session: AsyncSession, crawl_id: int) -> Optional[CrawlDomain]:
+        crawl_crud = CrawlCRUD(session)
+        crawl = await crawl_crud.get_crawl(crawl_id)
+        if crawl is None:
+            return None
+        domain = CrawlDomain.from_orm(crawl)
+        domain.urls = await crawl_crud.count_urls(crawl_id)
+        return domain
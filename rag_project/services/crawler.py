@@ -0,0 +1,311 @@
+"""
+Site crawler: breadth first from seed URLs and sitemaps, over the persisted frontier of a crawl (crawl_urls).
+
+Politeness: robots.txt (RFC 9309) and its Crawl-delay, at least CRAWL_HOST_DELAY seconds between two
+requests to a host, at most SCRAPER_MAX_PER_HOST requests in flight per host (WebScraper).
+Fetched pages are ingested by batches of CRAWL_INGEST_BATCH while the crawl goes on, their in scope
+links added to the frontier. An interrupted crawl resumes where it stopped.
+"""
+import asyncio
+import gzip
+import io
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from rag_project.config import (
+    CRAWL_CONCURRENCY, CRAWL_HOST_DELAY, CRAWL_INGEST_BATCH, CRAWL_MAX_SITEMAPS, CHUNK_MAX_TOKENS,
+    HTTP_USER_AGENT, SCRAPER_MAX_BYTES
+)
+from rag_project.db.crud.crawl import CrawlCRUD, FrontierUrl
+from rag_project.db.crud.source import SourceCRUD
+from rag_project.db.models.source import SourceORM
+from rag_project.db.session import AsyncSessionLocal
+from rag_project.db.session_manager import async_db_session_manager
+from rag_project.domain.models import CrawlDomain, CrawlUrlStatusEnum, IngestionStatusEnum
+from rag_project.exceptions import ScraperError
+from rag_project.logger import get_logger
+from rag_project.services.ingestion_service import IngestionService, IngestionContext
+from rag_project.services.scraping_service import WebScraper
+from rag_project.utils.html_extraction import extract_links
+from rag_project.utils.urls import normalize_url, in_scope, looks_like_page, url_host
+
+logger = get_logger(__name__)
+
+MAX_URL_LENGTH = SourceORM.path_to_content.type.length  # Crawled pages become sources
+
+INGESTION_STATUSES = {
+    IngestionStatusEnum.SUCCESS: CrawlUrlStatusEnum.INGESTED,
+    IngestionStatusEnum.UNCHANGED: CrawlUrlStatusEnum.UNCHANGED,
+    IngestionStatusEnum.FAILED: CrawlUrlStatusEnum.FAILED,
+}
+
+
+class HostRateLimiter:
+    """Spaces the requests to a host by at least delay seconds. Slots are reserved, the lock is not held while waiting."""
+
+    def __init__(self, delay: float = CRAWL_HOST_DELAY):
+        self.delay = delay
+        self._next: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def wait(self, host: str, delay: Optional[float] = None):
+        loop = asyncio.get_running_loop()
+        async with self._locks[host]:
+            now = loop.time()
+            start = max(now, self._next.get(host, now))
+            self._next[host] = start + max(self.delay, delay or 0.0)
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+def parse_sitemap(content: bytes, max_bytes: int = SCRAPER_MAX_BYTES) -> Tuple[List[str], List[str]]:
+    """(page urls, nested sitemap urls) of a sitemap or a sitemap index, gzipped or not."""
+    from lxml import etree
+
+    if content[:2] == b"\x1f\x8b":
+        with gzip.GzipFile(fileobj=io.BytesIO(content)) as f:
+            content = f.read(max_bytes + 1)
+        if len(content) > max_bytes:
+            raise ScraperError(f"Sitemap larger than {max_bytes} bytes")
+
+    parser = etree.XMLParser(resolve_entities=False, no_network=True, recover=True)
+    root = etree.fromstring(content, parser=parser)
+    if root is None:
+        return [], []
+    locs = [loc.text.strip() for loc in root.iter("{*}loc") if loc.text and loc.text.strip()]
+    if etree.QName(root).localname == "sitemapindex":
+        return [], locs
+    return locs, []
+
+
+@dataclass
+class CrawledPage:
+    url: FrontierUrl
+    ctx: Optional[IngestionContext] = None  # Fetched (and chunked unless unchanged), to ingest
+    links: List[str] = field(default_factory=list)  # Raw absolute links, normalized when added
+    status: Optional[CrawlUrlStatusEnum] = None  # Final status of a page not to ingest
+    error: Optional[str] = None
+
+
+class Crawler:
+    def __init__(
+            self,
+            service: IngestionService,
+            scraper: WebScraper,
+            session_factory=AsyncSessionLocal,
+            concurrency: int = CRAWL_CONCURRENCY,
+            host_delay: float = CRAWL_HOST_DELAY,
+            ingest_batch: int = CRAWL_INGEST_BATCH,
+            respect_robots: bool = True,
+            user_agent: str = HTTP_USER_AGENT
+    ):
+        self.service = service
+        self.scraper = scraper  # Its per-host semaphores bound the requests in flight per host
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self.ingest_batch = ingest_batch
+        self.respect_robots = respect_robots
+        self.user_agent = user_agent
+        self.rate_limiter = HostRateLimiter(host_delay)
+        self._robots: Dict[str, RobotFileParser] = {}
+        self._robots_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        # Pages in flight are finished and ingested, the pending ones stay in the frontier
+        self._stopping.set()
+
+    @property
+    def stopping(self) -> bool:
+        return self._stopping.is_set()
+
+    # Frontier steps, each its own short transaction
+
+    @staticmethod
+    def frontier_url(crawl: CrawlDomain, url: str) -> Optional[str]:
+        # Normalized url when in scope of the crawl, None otherwise
+        url = normalize_url(url)
+        if url and len(url) <= MAX_URL_LENGTH and in_scope(url, crawl.allowed_domains) and looks_like_page(url):
+            return url
+        return None
+
+    @async_db_session_manager
+    async def add_urls(self, session: AsyncSession, crawl: CrawlDomain, urls: List[Tuple[str, int]]) -> int:
+        # (raw url, depth), urls beyond max_depth or out of scope ignored, known ones too
+        candidates = []
+        for url, depth in urls:
+            url = self.frontier_url(crawl, url)
+            if url and depth <= crawl.max_depth:
+                candidates.append((url, depth))
+        if not candidates:
+            return 0
+        return await CrawlCRUD(session).add_urls(crawl.id, candidates)
+
+    @async_db_session_manager
+    async def claim_urls(self, session: AsyncSession, crawl_id: int,
+                         limit: int) -> List[Tuple[FrontierUrl, Optional[SourceORM]]]:
+        # With the already ingested source of each url (validators, fingerprint)
+        urls = await CrawlCRUD(session).claim_urls(crawl_id, limit)
+        sources = await SourceCRUD(session).get_sources_by_paths([url.url for url in urls]) if urls else {}
+        return [(url, sources.get(url.url)) for url in urls]
+
+    @async_db_session_manager
+    async def record_pages(self, session: AsyncSession, crawl_id: int,
+                           statuses: List[Tuple[int, CrawlUrlStatusEnum, Optional[str]]]):
+        crawl_crud = CrawlCRUD(session)
+        await crawl_crud.set_url_statuses(statuses)
+        await crawl_crud.touch(crawl_id)
+
+    @async_db_session_manager
+    async def touch_crawl(self, session: AsyncSession, crawl_id: int):
+        await CrawlCRUD(session).touch(crawl_id)
+
+    @async_db_session_manager
+    async def prepare(self, session: AsyncSession, crawl_id: int) -> int:
+        # Resume: urls claimed by an interrupted run go back to the frontier. Returns the urls already processed.
+        crawl_crud = CrawlCRUD(session)
+        requeued = await crawl_crud.requeue_running_urls(crawl_id)
+        if requeued:
+            logger.info(f"Crawl {crawl_id} : {requeued} interrupted urls requeued")
+        counts = await crawl_crud.count_urls(crawl_id)
+        return sum(count for status, count in counts.items() if status != CrawlUrlStatusEnum.PENDING)
+
+    # Fetching
+
+    async def robots(self, url: str) -> RobotFileParser:
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        async with self._robots_locks[origin]:  # Fetched once per origin and run
+            if origin not in self._robots:
+                self._robots[origin] = await self._fetch_robots(origin)
+        return self._robots[origin]
+
+    async def _fetch_robots(self, origin: str) -> RobotFileParser:
+        robots = RobotFileParser(f"{origin}/robots.txt")
+        try:
+            await self.rate_limiter.wait(url_host(origin))
+            page = await self.scraper.fetch(f"{origin}/robots.txt", content_types=None)
+            robots.parse(page.content.decode("utf-8", errors="replace").splitlines())
+        except httpx.HTTPStatusError as e:
+            # RFC 9309: unavailable (4xx) allows everything, unreachable (5xx) nothing
+            if e.response.status_code < 500:
+                robots.allow_all = True
+            else:
+                robots.disallow_all = True
+        except Exception as e:
+            logger.warning(f"{origin}/robots.txt unreachable, host skipped : {str(e)}")
+            robots.disallow_all = True
+        return robots
+
+    async def expand_sitemaps(self, crawl: CrawlDomain) -> int:
+        # Sitemap pages enter the frontier at depth 0, indexes are followed up to CRAWL_MAX_SITEMAPS sitemaps
+        queue, seen, urls = list(crawl.sitemaps), set(), []
+        while queue and len(seen) < CRAWL_MAX_SITEMAPS:
+            sitemap = queue.pop(0)
+            if sitemap in seen:
+                continue
+            seen.add(sitemap)
+            # Many sitemaps at the host delay can outlast WORKER_STALE_JOB_SECONDS: keep the crawl alive
+            await self.touch_crawl(crawl.id)
+            try:
+                await self.rate_limiter.wait(url_host(sitemap))
+                page = await self.scraper.fetch(sitemap, content_types=None)
+                pages, nested = await asyncio.to_thread(parse_sitemap, page.content)
+            except Exception as e:
+                logger.warning(f"Sitemap {sitemap} skipped : {str(e)}")
+                continue
+            urls.extend(pages)
+            queue.extend(nested)
+        return await self.add_urls(crawl, [(url, 0) for url in urls])
+
+    async def crawl_url(self, crawl: CrawlDomain, url: FrontierUrl, source: Optional[SourceORM]) -> CrawledPage:
+        # Never raises: failures are recorded on the url
+        page = CrawledPage(url=url)
+        try:
+            delay = None
+            if self.respect_robots:
+                robots = await self.robots(url.url)
+                if not robots.can_fetch(self.user_agent, url.url):
+                    page.status, page.error = CrawlUrlStatusEnum.SKIPPED, "Disallowed by robots.txt"
+                    return page
+                delay = robots.crawl_delay(self.user_agent)
+            await self.rate_limiter.wait(url_host(url.url), float(delay) if delay else None)
+
+            # Links are needed below max_depth: conditional requests (304 has no body) for the last level only
+            leaf = url.depth >= crawl.max_depth
+            conditional = leaf and source is not None
+            fetched = await self.scraper.fetch(
+                url.url,
+                etag=source.etag if conditional else None,
+                last_modified=source.last_modified if conditional else None
+            )
+
+            ctx = IngestionContext()
+            await self.service.content_from_page(ctx, url.url, fetched, source)
+            if not leaf and not fetched.not_modified:
+                page.links = await asyncio.to_thread(
+                    extract_links, fetched.content, fetched.encoding, fetched.url or url.url
+                )
+            if not ctx.unchanged:
+                await self.service.chunk_in_thread(ctx, CHUNK_MAX_TOKENS)
+            page.ctx = ctx
+
+        except Exception as e:
+            page.status, page.error = CrawlUrlStatusEnum.FAILED, f"{type(e).__name__}: {str(e)}"
+        return page
+
+    async def ingest(self, crawl: CrawlDomain, pages: List[CrawledPage]):
+        # One ingestion transaction for the batch, then the status of every url
+        statuses = [(page.url.id, page.status, page.error) for page in pages if page.ctx is None]
+        contexts = [page.ctx for page in pages if page.ctx is not None]
+        if contexts:
+            try:
+                results = await self.service.ingest_contexts(contexts=contexts, source_type=crawl.source_type)
+                for ctx, page in zip(contexts, [page for page in pages if page.ctx is not None]):
+                    result = results[ctx.source_url]
+                    statuses.append((page.url.id, INGESTION_STATUSES[result.status], result.error))
+            except Exception as e:
+                statuses.extend(
+                    (page.url.id, CrawlUrlStatusEnum.FAILED, f"{type(e).__name__}: {str(e)}")
+                    for page in pages if page.ctx is not None
+                )
+        await self.record_pages(crawl.id, statuses)
+
+    async def run(self, crawl: CrawlDomain) -> bool:
+        """Crawls until the frontier is empty or max_pages urls are processed. False when stopped before."""
+        processed = await self.prepare(crawl.id)
+        await self.add_urls(crawl, [(url, 0) for url in crawl.seeds])  # Known seeds are ignored, as every known url
+        if crawl.sitemaps:
+            added = await self.expand_sitemaps(crawl)
+            logger.info(f"Crawl {crawl.id} : {added} urls from the sitemaps")
+
+        in_flight: Set[asyncio.Task] = set()
+        fetched: List[CrawledPage] = []
+        while True:
+            free = min(self.concurrency - len(in_flight), crawl.max_pages - processed)
+            if free > 0 and not self.stopping:
+                for url, source in await self.claim_urls(crawl.id, free):
+                    processed += 1
+                    in_flight.add(asyncio.create_task(self.crawl_url(crawl, url, source)))
+            if not in_flight:
+                break
+
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            pages = [task.result() for task in done]
+            # Before the next claim: the frontier must see the links of the pages done
+            await self.add_urls(crawl, [(link, page.url.depth + 1) for page in pages for link in page.links])
+            fetched.extend(pages)
+            if len(fetched) >= self.ingest_batch or not in_flight:
+                await self.ingest(crawl, fetched)
+                fetched = []
+
+        if fetched:
+            await self.ingest(crawl, fetched)
+        logger.info(f"Crawl {crawl.id} : {processed} urls processed{', stopped' if self.stopping else ''}")
+        return not self.stopping
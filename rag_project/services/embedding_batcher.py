@@ -0,0 +1,140 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, List, Optional
+
+from rag_project.config import EMBED_BATCH_MAX_SIZE, EMBED_BATCH_WINDOW_MS
+from rag_project.logger import get_logger
+from rag_project.metrics import EMBED_BATCH_SIZE, EMBED_QUEUE_WAIT_SECONDS
+from rag_project.utils.executor import run_cpu_bound
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class _PendingText:
+    text: str
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class BatcherStats:
+    def __init__(self):
+        self.batches = 0
+        self.items = 0
+        self.max_batch_size = 0
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.total_encode_seconds = 0.0
+
+    def record(self, batch_size: int, queue_waits: List[float], encode_seconds: float):
+        self.batches += 1
+        self.items += batch_size
+        self.max_batch_size = max(self.max_batch_size, batch_size)
+        self.total_queue_wait += sum(queue_waits)
+        self.max_queue_wait = max(self.max_queue_wait, *queue_waits)
+        self.total_encode_seconds += encode_seconds
+        EMBED_BATCH_SIZE.labels("query").observe(batch_size)
+        for queue_wait in queue_waits:
+            EMBED_QUEUE_WAIT_SECONDS.observe(queue_wait)
+
+    def as_dict(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0,
+            "max_batch_size": self.max_batch_size,
+            "avg_queue_wait_ms": round(1000 * self.total_queue_wait / self.items, 3) if self.items else 0,
+            "max_queue_wait_ms": round(1000 * self.max_queue_wait, 3),
+            "avg_encode_ms": round(1000 * self.total_encode_seconds / self.batches, 3) if self.batches else 0,
+        }
+
+
+class EmbeddingBatcher:
+    """
+    Groups texts submitted concurrently into a single model.encode call.
+    A batch is flushed when it reaches max_batch_size or when max_wait_ms
+    elapsed since its first text arrived.
+    """
+
+    def __init__(
+            self,
+            model: "SentenceTransformer",
+            max_batch_size: int = EMBED_BATCH_MAX_SIZE,
+            max_wait_ms: float = EMBED_BATCH_WINDOW_MS
+    ):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.stats = BatcherStats()
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run(), name="embedding-batcher")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def embed(self, text: str) -> List[float]:
+        if self._task is None:
+            raise RuntimeError("EmbeddingBatcher is not started")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingText(text=text, future=future))
+        return await future
+
+    async def _collect_batch(self) -> List[_PendingText]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # Callers that gave up (client disconnected) do not need an embedding
+        return [pending for pending in batch if not pending.future.done()]
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            try:
+                vectors = await run_cpu_bound(
+                    self.model.encode,
+                    [pending.text for pending in batch],
+                    batch_size=len(batch),
+                    normalize_embeddings=True
+                )
+            except Exception as e:
+                logger.error(f"Embedding batch of {len(batch)} failed: {str(e)}")
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+                continue
+
+            encode_seconds = time.perf_counter() - started
+            self.stats.record(len(batch), [started - pending.enqueued_at for pending in batch], encode_seconds)
+
+            for pending, vector in zip(batch, vectors):
+                if not pending.future.done():
+                    pending.future.set_result(vector.tolist())
@@ -0,0 +1,134 @@
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from rag_project.config import QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_PATH
+from rag_project.logger import get_logger
+from rag_project.metrics import QUERY_EMBEDDING_CACHE_LOOKUPS
+
+logger = get_logger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    # Same key for questions differing only by case, unicode form or spacing
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text).casefold()).strip()
+
+
+class QueryEmbeddingCache:
+    """
+    LRU of question embeddings (float32) keyed on the normalized question, shared by the requests of a process.
+    With disk_path, entries are also kept in a SQLite file (survives restarts, shared by the processes of a host).
+    The LRU is read and written inline, the SQLite file from a thread: disk I/O never blocks the event loop.
+    """
+
+    def __init__(self, model_name: str, max_entries: int = QUERY_EMBEDDING_CACHE_SIZE,
+                 disk_path: Optional[str] = QUERY_EMBEDDING_CACHE_PATH):
+        self.model_name = model_name  # Part of the disk key: vectors of another model are never returned
+        self.max_entries = max_entries
+        self.disk_max_entries = 10 * max_entries
+        self._puts = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()  # One connection used from the threads of asyncio.to_thread
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self._db = sqlite3.connect(disk_path, timeout=5, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=OFF")  # A lost write is only a cache miss
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings "
+                "(model TEXT, question TEXT, vector BLOB, PRIMARY KEY (model, question))"
+            )
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_get(self, key: str) -> Optional[np.ndarray]:
+        with self._db_lock:
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT vector FROM query_embeddings WHERE model = ? AND question = ?", (self.model_name, key)
+            ).fetchone()
+        return np.frombuffer(row[0], dtype=np.float32) if row is not None else None
+
+    def _disk_put(self, key: str, vector: np.ndarray):
+        with self._db_lock:
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (model, question, vector) VALUES (?, ?, ?)",
+                    (self.model_name, key, vector.tobytes())
+                )
+                self._puts += 1
+                if self._puts % 1000 == 0:
+                    # REPLACE gives a new rowid: the oldest written rows go first
+                    self._db.execute(
+                        "DELETE FROM query_embeddings WHERE rowid <= "
+                        "(SELECT max(rowid) FROM query_embeddings) - ?", (self.disk_max_entries,)
+                    )
+            except sqlite3.Error as e:
+                logger.warning(f"Query embedding not persisted: {str(e)}")
+
+    async def get(self, question: str) -> Optional[np.ndarray]:
+        key = normalize_question(question)
+        vector = self._entries.get(key)
+        if vector is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            QUERY_EMBEDDING_CACHE_LOOKUPS.labels("hit").inc()
+            return vector
+
+        if self._db is not None:
+            vector = await asyncio.to_thread(self._disk_get, key)
+            if vector is not None:
+                self._remember(key, vector)
+                self.disk_hits += 1
+                QUERY_EMBEDDING_CACHE_LOOKUPS.labels("disk_hit").inc()
+                return vector
+
+        self.misses += 1
+        QUERY_EMBEDDING_CACHE_LOOKUPS.labels("miss").inc()
+        return None
+
+    async def put(self, question: str, vector) -> np.ndarray:
+        key = normalize_question(question)
+        vector = np.asarray(vector, dtype=np.float32)
+        self._remember(key, vector)
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_put, key, vector)
+        return vector
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0,
+            "disk": self._db is not None,
+        }
@@ -1,90 +1,162 @@
-from sentence_transformers import SentenceTransformer
+import asyncio
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional, Tuple
 
-from rag_project.db.crud.content import ContentCRUD
-from rag_project.db.session import SessionLocal
-from rag_project.db.session_manager import db_session_manager
-from rag_project.domain.models import SourceTypeEnum
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from rag_project.config import ENCODE_BATCH_SIZE, ENCODE_CALL_SIZE, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+from rag_project.db.crud.content import ContentCRUD, SourceChunks
+from rag_project.db.crud.source import SourceCRUD
+from rag_project.db.models.source import SourceORM
+from rag_project.db.mmap_index import MmapVectorIndex
+from rag_project.db.session import AsyncSessionLocal
+from rag_project.db.session_manager import async_db_session_manager
+from rag_project.domain.models import SourceTypeEnum, IngestionStatusEnum, UrlIngestionResult
 from rag_project.exceptions import IngestionError
 from rag_project.logger import get_logger
-from rag_project.services.scraping_service import default_scraper
-from rag_project.utils.text_processing import default_chunker
+from rag_project.metrics import stage_timer, record_chunks, EMBED_BATCH_SIZE, PAGES_FETCHED
+from rag_project.services.scraping_service import WebScraper, FetchedPage
+from rag_project.utils.executor import run_cpu_bound
+from rag_project.utils.text_processing import TokenChunker, compute_text_hash
 
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
 
 logger = get_logger(__name__)
 
+# on_progress(stage, progress) callback, progress in [0, 1]
+ProgressCallback = Callable[[str, float], Awaitable[None]]
+
+
+@dataclass
+class IngestionContext:
+    # Per-call state, the service itself is shared by concurrent requests
+    source_url: str = ''
+    texts: str = ''
+    chunks: List[str] = field(default_factory=list)
+    hashes: List[str] = field(default_factory=list)
+    new_chunks: List[str] = field(default_factory=list)  # Chunks whose hash is not stored yet
+    new_hashes: List[str] = field(default_factory=list)
+    embeddings: np.ndarray = field(default_factory=lambda: np.empty((0, 0), dtype=np.float32))  # Of new_chunks
+    etag: Optional[str] = None  # HTTP validators and fingerprint of the fetched page
+    last_modified: Optional[str] = None
+    text_hash: Optional[str] = None
+    unchanged: bool = False  # 304 or same text as the last ingestion of the source: nothing to store
+
+    def source_chunks(self) -> SourceChunks:
+        return SourceChunks(
+            source_url=self.source_url,
+            chunk_hashes=self.hashes,
+            new_chunks=self.new_chunks,
+            new_hashes=self.new_hashes,
+            new_embeddings=self.embeddings,
+            etag=self.etag,
+            last_modified=self.last_modified,
+            text_hash=self.text_hash
+        )
+
 
 class IngestionService:
     def __init__(
             self,
-            session_factory=SessionLocal,
+            model: "SentenceTransformer",
+            session_factory=AsyncSessionLocal,
             scraper=None,
-            chunker=None
+            chunker=None,
+            vector_index: Optional[MmapVectorIndex] = None
     ):
+        self.model = model
         self.session_factory = session_factory
-        self.scraper = scraper or default_scraper
-        self.chunker = chunker or default_chunker
-        self.texts = ''
-        self.chunks = []
-        self.embeddings = []
-        self.source_url = ''
-
-    def reset_state(self):
-        # Reset processes states
-        self.texts = ''
-        self.chunks = []
-        self.embeddings = []
-        self.source_url = ''
-
-    def content_from_url(self, url: str):
+        self.scraper = scraper or WebScraper()
+        self.vector_index = vector_index  # In process search copy, appended with the new chunks once committed
+        # Chunk sizes measured with the tokenizer of the model that embeds them
+        self.chunker = chunker or TokenChunker.from_model(model, overlap_tokens=CHUNK_OVERLAP_TOKENS)
+
+    async def content_from_url(self, ctx: IngestionContext, url: str, source: Optional[SourceORM] = None):
+        # Known source: conditional request, then fingerprint of the text, either one can end the pipeline
         try:
-            self.source_url = url
-            self.texts = self.scraper(url)
+            page = await self.scraper.fetch(
+                url,
+                etag=source.etag if source is not None else None,
+                last_modified=source.last_modified if source is not None else None
+            )
+            await self.content_from_page(ctx, url, page, source)
 
         except Exception:
             raise
 
-    def content_from_youtube(self, youtube_url: str):
-        raise NotImplementedError("YouTube ingestion not implemented yet")
+    async def content_from_page(self, ctx: IngestionContext, url: str, page: FetchedPage,
+                                source: Optional[SourceORM] = None):
+        # Page fetched by the caller (e.g. the crawler, which also reads its links)
+        try:
+            ctx.source_url = url
+            ctx.etag, ctx.last_modified = page.etag, page.last_modified
+            if page.not_modified:
+                ctx.unchanged = True
+                PAGES_FETCHED.labels("not_modified").inc()
+                return
 
-    def content_from_local(self, path: str):
-        raise NotImplementedError("Local ingestion not implemented yet")
+            ctx.texts = await self.scraper.extract_text(page)
+            ctx.text_hash = compute_text_hash(ctx.texts)
+            ctx.unchanged = source is not None and source.text_hash == ctx.text_hash
+            PAGES_FETCHED.labels("unchanged" if ctx.unchanged else "changed").inc()
 
-    def chunk_text(self, max_tokens: int):
-        if not self.texts:
-            raise IngestionError(f"No texts to chunk")
-        self.chunks = self.chunker(self.texts, max_tokens)
+        except Exception:
+            raise
 
-    def embed_chunks(self, model: SentenceTransformer):
-        if not self.chunks:
-            raise IngestionError(f"No chunks to embed")
-        self.embeddings = model.encode(self.chunks, normalize_embeddings=True).tolist()
+    async def content_from_youtube(self, ctx: IngestionContext, youtube_url: str):
+        raise NotImplementedError("YouTube ingestion not implemented yet")
 
-    def ingest_chunks(self, session: SessionLocal, source_type: SourceTypeEnum) -> int:
-        try:
-            if len(self.chunks) != len(self.embeddings):
-                raise ValueError("nb chunks <> nb embeddings")
+    async def content_from_local(self, ctx: IngestionContext, path: str):
+        raise NotImplementedError("Local ingestion not implemented yet")
 
-            content_crud = ContentCRUD(session)
-            count = content_crud.store_chunks(self.chunks, self.embeddings, self.source_url, source_type)
+    async def embed_texts(self, texts: List[str]) -> np.ndarray:
+        # Large encode calls amortize the per-call overhead, bounded so the executor is not monopolized
+        parts = []
+        for start in range(0, len(texts), ENCODE_CALL_SIZE):
+            call_texts = texts[start:start + ENCODE_CALL_SIZE]
+            EMBED_BATCH_SIZE.labels("ingestion").observe(len(call_texts))
+            parts.append(await run_cpu_bound(
+                self.model.encode,
+                call_texts,
+                batch_size=ENCODE_BATCH_SIZE,
+                normalize_embeddings=True
+            ))
+        if not parts:
+            return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        return np.vstack(parts)
 
-            if count != len(self.chunks):
-                raise ValueError("Unexpected chunks count")
+    @staticmethod
+    async def filter_known_chunks(session: AsyncSession, contexts: List[IngestionContext]):
+        # One lookup for all the chunk hashes of the batch, known chunks are only linked to their new source
+        for ctx in contexts:
+            ctx.hashes = [compute_text_hash(chunk) for chunk in ctx.chunks]
 
-            return count
+        seen = set(await ContentCRUD(session).find_existing_hashes(h for ctx in contexts for h in ctx.hashes))
+        known_count = len(seen)
+        for ctx in contexts:
+            ctx.new_chunks, ctx.new_hashes = [], []
+            for chunk, chunk_hash in zip(ctx.chunks, ctx.hashes):
+                if chunk_hash not in seen:  # Also drops duplicates inside the batch
+                    seen.add(chunk_hash)
+                    ctx.new_chunks.append(chunk)
+                    ctx.new_hashes.append(chunk_hash)
 
-        except Exception as e:
-            self.reset_state()
-            message = f"ingest_chunks : {str(e)}"
-            logger.error(message)
-            raise
+        logger.info(f"{len(seen) - known_count} new chunks, {known_count} already stored")
+
+    async def ingest_content(self, source_type: SourceTypeEnum,
+                             url: str = None, youtube_url: str = None, path: str = None,
+                             on_progress: Optional[ProgressCallback] = None) -> int:
+        # Same shape as ingest_urls: no session is open while the page is fetched and chunked,
+        # the source lookup and the write are two short transactions
 
-    @db_session_manager
-    def ingest_content(self,
-                       session: SessionLocal, model: SentenceTransformer, source_type: SourceTypeEnum,
-                       url: str = None, youtube_url: str = None, path: str = None) -> int:
+        async def report(stage: str, progress: float):
+            if on_progress is not None:
+                await on_progress(stage, progress)
 
         try:
-            self.reset_state()
+            ctx = IngestionContext()
 
             # Source handling
             if source_type is None:
@@ -93,20 +165,130 @@ class IngestionService:
             if sum(x is not None for x in [url, youtube_url, path]) != 1:
                 raise IngestionError("Exactly one source must be provided", exc_info=False)
 
-            if url:
-                self.content_from_url(url)
-            elif youtube_url:
-                self.content_from_youtube(youtube_url)
-            elif path:
-                self.content_from_local(path)
+            await report('fetching', 0.0)
+            with stage_timer("ingest", "fetching"):
+                if url:
+                    source = (await self.known_sources(urls=[url])).get(url)
+                    await self.content_from_url(ctx, url, source)
+                elif youtube_url:
+                    await self.content_from_youtube(ctx, youtube_url)
+                elif path:
+                    await self.content_from_local(ctx, path)
+
+            if not ctx.unchanged:
+                await report('chunking', 0.25)
+                with stage_timer("ingest", "chunking"):
+                    await self.chunk_in_thread(ctx, max_tokens=CHUNK_MAX_TOKENS)
 
-            self.chunk_text(max_tokens=300)
-            self.embed_chunks(model)
-            chunks_count = self.ingest_chunks(session, source_type)
+            await report('storing', 0.5)  # Dedup, embedding of the new chunks and write
+            result = (await self.ingest_contexts(contexts=[ctx], source_type=source_type))[ctx.source_url]
+            if ctx.unchanged:
+                logger.info(f"{ctx.source_url} : unchanged since the last ingestion")
+                return 0
 
-            return chunks_count
+            return result.chunks
 
         except Exception as e:
             message = f"ingest_content : {str(e)}"
             logger.error(message)
             raise
+
+    async def chunk_in_thread(self, ctx: IngestionContext, max_tokens: int):
+        # Concurrent pages: tokenization off the event loop
+        if not ctx.texts:
+            raise IngestionError(f"No texts to chunk")
+        ctx.chunks = await asyncio.to_thread(lambda: list(self.chunker(ctx.texts, max_tokens)))
+
+    async def fetch_and_chunk(self, url: str, max_tokens: int, source: Optional[SourceORM] = None) -> IngestionContext:
+        ctx = IngestionContext()
+        with stage_timer("ingest_urls", "fetching"):
+            await self.content_from_url(ctx, url, source)
+        if ctx.unchanged:
+            return ctx
+        with stage_timer("ingest_urls", "chunking"):
+            await self.chunk_in_thread(ctx, max_tokens)
+        return ctx
+
+    @async_db_session_manager
+    async def known_sources(self, session: AsyncSession, urls: List[str]) -> Dict[str, SourceORM]:
+        # Short read-only session: the sources are used after it is closed (validators of conditional requests)
+        return await SourceCRUD(session).get_sources_by_paths(urls)
+
+    async def ingest_urls(self, urls: List[str],
+                          source_type: SourceTypeEnum = SourceTypeEnum.WEB) -> List[UrlIngestionResult]:
+        # Fetch concurrently (limits enforced by the scraper), embed every chunk together, write once.
+        # No session is open while the pages are fetched: the slowest site does not pin a connection
+        urls = list(dict.fromkeys(urls))
+        known = await self.known_sources(urls=urls)
+        outcomes = await asyncio.gather(
+            *(self.fetch_and_chunk(url, max_tokens=CHUNK_MAX_TOKENS, source=known.get(url)) for url in urls),
+            return_exceptions=True
+        )
+
+        results = {}
+        contexts: List[IngestionContext] = []
+        for url, outcome in zip(urls, outcomes):
+            if isinstance(outcome, Exception):
+                logger.warning(f"ingest_urls : {url} failed : {str(outcome)}")
+                results[url] = UrlIngestionResult(
+                    url=url,
+                    status=IngestionStatusEnum.FAILED,
+                    error=f"{type(outcome).__name__}: {str(outcome)}"
+                )
+            else:
+                contexts.append(outcome)
+
+        results.update(await self.ingest_contexts(contexts=contexts, source_type=source_type))
+        return [results[url] for url in urls]
+
+    async def ingest_contexts(self, contexts: List[IngestionContext],
+                              source_type: SourceTypeEnum = SourceTypeEnum.WEB) -> Dict[str, UrlIngestionResult]:
+        # Pages fetched and chunked by the caller, stored in one transaction. The local vector index only gets
+        # committed rows: a resync in another process never drops a row whose transaction is still running
+        results, inserted_rows = await self.commit_contexts(contexts=contexts, source_type=source_type)
+        if self.vector_index is not None:
+            for ids, vectors in inserted_rows:
+                await asyncio.to_thread(self.vector_index.append, ids, vectors)
+        return results
+
+    @async_db_session_manager
+    async def commit_contexts(self, session: AsyncSession, contexts: List[IngestionContext],
+                              source_type: SourceTypeEnum) -> Tuple[Dict[str, UrlIngestionResult], List[Tuple]]:
+        content_crud = ContentCRUD(session)
+        results = await self.store_contexts(session, content_crud, contexts, source_type)
+        return results, content_crud.inserted_rows
+
+    async def store_contexts(self, session: AsyncSession, content_crud: ContentCRUD, contexts: List[IngestionContext],
+                             source_type: SourceTypeEnum) -> Dict[str, UrlIngestionResult]:
+        # Unchanged pages only refresh their validators, the others are embedded together and written once
+        results = {}
+        unchanged = [ctx for ctx in contexts if ctx.unchanged]
+        if unchanged:
+            sources = await SourceCRUD(session).get_sources_by_paths([ctx.source_url for ctx in unchanged])
+            for ctx in unchanged:
+                SourceCRUD.remember_fetch(sources[ctx.source_url], ctx.etag, ctx.last_modified)
+                results[ctx.source_url] = UrlIngestionResult(url=ctx.source_url, status=IngestionStatusEnum.UNCHANGED)
+        contexts = [ctx for ctx in contexts if not ctx.unchanged]
+
+        with stage_timer("ingest_urls", "dedup"):
+            await self.filter_known_chunks(session, contexts)
+
+        with stage_timer("ingest_urls", "embedding"):
+            embeddings = await self.embed_texts([chunk for ctx in contexts for chunk in ctx.new_chunks])
+        offset = 0
+        for ctx in contexts:
+            ctx.embeddings = embeddings[offset:offset + len(ctx.new_chunks)]
+            offset += len(ctx.new_chunks)
+
+        with stage_timer("ingest_urls", "storing"):
+            inserted = await content_crud.store_sources_chunks([ctx.source_chunks() for ctx in contexts], source_type)
+        for ctx in contexts:
+            record_chunks(len(ctx.chunks), len(ctx.new_chunks), inserted[ctx.source_url])
+            results[ctx.source_url] = UrlIngestionResult(
+                url=ctx.source_url,
+                status=IngestionStatusEnum.SUCCESS,
+                chunks=len(ctx.chunks),
+                new_chunks=inserted[ctx.source_url]
+            )
+
+        return results
@@ -0,0 +1,36 @@
+from typing import List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from rag_project.db.crud.job import JobCRUD
+from rag_project.db.session import AsyncSessionLocal
+from rag_project.db.session_manager import async_db_session_manager
+from rag_project.domain.models import SourceTypeEnum, JobStatusEnum, IngestionJobDomain
+from rag_project.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class JobService:
+    # API side of the ingestion queue, jobs are processed by rag_project.workers.ingestion_worker
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self.session_factory = session_factory
+
+    @async_db_session_manager
+    async def enqueue(self, session: AsyncSession, path_to_content: str,
+                      source_type: SourceTypeEnum) -> IngestionJobDomain:
+        job = await JobCRUD(session).create_job(path_to_content, source_type)
+        logger.info(f"Job {job.id} queued for {path_to_content}")
+        return IngestionJobDomain.from_orm(job)
+
+    @async_db_session_manager
+    async def get_job(self, session: AsyncSession, job_id: int) -> Optional[IngestionJobDomain]:
+        job = await JobCRUD(session).get_job(job_id)
+        return IngestionJobDomain.from_orm(job) if job else None
+
+    @async_db_session_manager
+    async def list_jobs(self, session: AsyncSession, status: JobStatusEnum = None,
+                        limit: int = 100) -> List[IngestionJobDomain]:
+        jobs = await JobCRUD(session).list_jobs(status=status, limit=limit)
+        return [IngestionJobDomain.from_orm(job) for job in jobs]
@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sentence_transformers import CrossEncoder, SentenceTransformer
+
+from rag_project.config import EMBEDDING_DEVICE, EMBEDDING_MODEL_NAME
+from rag_project.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def current_rss_bytes() -> int:
+    # Resident memory of the current process (Linux only, 0 elsewhere)
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+@dataclass
+class LoadedModel:
+    name: str
+    model: SentenceTransformer
+    load_seconds: float
+    warmup_seconds: float
+    rss_delta_bytes: int
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "device": str(self.model.device),
+            "dimension": self.model.get_sentence_embedding_dimension(),
+            "max_seq_length": self.model.max_seq_length,
+            "load_seconds": round(self.load_seconds, 3),
+            "warmup_seconds": round(self.warmup_seconds, 3),
+            "rss_delta_mb": round(self.rss_delta_bytes / 1024 ** 2, 1),
+        }
+
+
+class ModelRegistry:
+    """Process-wide registry of embedding models (and re-ranking cross-encoders), each one loaded only once."""
+
+    def __init__(self, default_name: str = EMBEDDING_MODEL_NAME, device: Optional[str] = EMBEDDING_DEVICE):
+        self.default_name = default_name
+        self.device = device
+        self._models: Dict[str, LoadedModel] = {}
+        self._cross_encoders: Dict[str, CrossEncoder] = {}
+        self._lock = threading.Lock()
+
+    def load(self, name: str, warmup: bool = True) -> LoadedModel:
+        with self._lock:
+            if name in self._models:
+                return self._models[name]
+
+            rss_before = current_rss_bytes()
+            start = time.perf_counter()
+            model = SentenceTransformer(name, device=self.device)
+            load_seconds = time.perf_counter() - start
+
+            warmup_seconds = 0.0
+            if warmup:
+                # First forward pass allocates buffers / kernels: pay it at startup, not on a request
+                start = time.perf_counter()
+                model.encode(["warmup"], normalize_embeddings=True)
+                warmup_seconds = time.perf_counter() - start
+
+            loaded = LoadedModel(
+                name=name,
+                model=model,
+                load_seconds=load_seconds,
+                warmup_seconds=warmup_seconds,
+                rss_delta_bytes=current_rss_bytes() - rss_before
+            )
+            self._models[name] = loaded
+            logger.info(
+                f"Model {name} loaded in {load_seconds:.2f}s (warmup {warmup_seconds:.2f}s, "
+                f"rss +{loaded.rss_delta_bytes / 1024 ** 2:.0f} MB)"
+            )
+            return loaded
+
+    def load_all(self, names: List[str], warmup: bool = True):
+        for name in dict.fromkeys([self.default_name, *names]):
+            self.load(name, warmup=warmup)
+
+    def get(self, name: Optional[str] = None) -> SentenceTransformer:
+        name = name or self.default_name
+        loaded = self._models.get(name)
+        if loaded is None:
+            # Lazy loading for models not declared at startup, still once per process
+            loaded = self.load(name)
+        return loaded.model
+
+    def load_cross_encoder(self, name: str, max_length: Optional[int] = None, warmup: bool = True) -> CrossEncoder:
+        with self._lock:
+            if name in self._cross_encoders:
+                return self._cross_encoders[name]
+
+            start = time.perf_counter()
+            model = CrossEncoder(name, max_length=max_length, device=self.device)
+            if warmup:
+                model.predict([("warmup", "warmup")], show_progress_bar=False)
+            self._cross_encoders[name] = model
+            logger.info(f"Cross-encoder {name} loaded in {time.perf_counter() - start:.2f}s")
+            return model
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._models
+
+    def stats(self) -> dict:
+        return {
+            "default": self.default_name,
+            "rss_mb": round(current_rss_bytes() / 1024 ** 2, 1),
+            "models": [loaded.stats() for loaded in self._models.values()],
+            "cross_encoders": list(self._cross_encoders),
+        }
+
+
+model_registry = ModelRegistry()
@@ -1,108 +1,433 @@
-# TODO: set optimum token_limite
+import asyncio
+import contextlib
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional
 
-import os
-from typing import List
+import httpx
+import numpy as np
 from openai import AsyncOpenAI
 from tenacity import retry, stop_after_attempt
 
-from sentence_transformers import SentenceTransformer
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from rag_project.db.crud.content import ContentCRUD
-from rag_project.db.session import SessionLocal
-from rag_project.db.session_manager import db_session_manager
-from rag_project.domain.models import DocumentDomain, LanguageEnum
+from rag_project.config import (
+    OPENAI_API_KEY, LLM_MODEL, LLM_TIMEOUT, LLM_MAX_CONNECTIONS, ENCODE_BATCH_SIZE, ASK_BATCH_LLM_CONCURRENCY,
+    MMR_LAMBDA, MMR_CANDIDATES
+)
+from rag_project.db.session import AsyncSessionLocal
+from rag_project.db.session_manager import async_db_session_manager
+from rag_project.domain.models import (
+    DocumentDomain, LanguageEnum, BatchAnswer, RetrievalModeEnum, DEFAULT_RETRIEVAL_MODE, RetrievalFilters
+)
 from rag_project.exceptions import RagError
 from rag_project.logger import get_logger
+from rag_project.metrics import stage_timer, record_llm_usage, STAGE_SECONDS, PROMPT_TOKENS, EMBED_BATCH_SIZE
+from rag_project.services.answer_cache import SemanticAnswerCache
+from rag_project.services.embedding_batcher import EmbeddingBatcher
+from rag_project.services.embedding_cache import QueryEmbeddingCache
+from rag_project.services.reranker import CrossEncoderReranker
+from rag_project.services.search_backend import PostgresSearchBackend
 
+from rag_project.utils.executor import run_cpu_bound
+from rag_project.utils.mmr import mmr_select
+from rag_project.utils.prompt_packing import PromptPacker, PackedDocument, CONTEXT_SEPARATOR
 from rag_project.utils.rag_prompts import rag_prompt_fr, rag_prompt_en
 
 logger = get_logger(__name__)
 
 
+def build_llm_client() -> AsyncOpenAI:
+    # One client per process: its httpx pool keeps connections / TLS sessions alive
+    return AsyncOpenAI(
+        api_key=OPENAI_API_KEY,
+        timeout=LLM_TIMEOUT,
+        http_client=httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS
+            ),
+            timeout=LLM_TIMEOUT
+        )
+    )
+
+
+@dataclass
+class RagContext:
+    # State of a single question, never stored on the service
+    question: str
+    query_vector: List[float] = field(default_factory=list)
+    docs: List[DocumentDomain] = field(default_factory=list)
+    packed: List[PackedDocument] = field(default_factory=list)  # Documents of the prompt, with their token count
+    prompt: str = ''
+    prompt_tokens: int = 0
+    answer: str = ''
+
+
 class RagService:
     def __init__(
             self,
-            session_factory=SessionLocal,
-            llm_model="gpt-4-turbo"
+            batcher: EmbeddingBatcher,
+            session_factory=AsyncSessionLocal,
+            llm_client: Optional[AsyncOpenAI] = None,
+            llm_model=LLM_MODEL,
+            search_backend=None,
+            answer_cache: Optional[SemanticAnswerCache] = None,
+            embedding_cache: Optional[QueryEmbeddingCache] = None,
+            retrieval_mode: RetrievalModeEnum = DEFAULT_RETRIEVAL_MODE,
+            reranker: Optional[CrossEncoderReranker] = None,
+            mmr_lambda: float = MMR_LAMBDA,
+            mmr_candidates: int = MMR_CANDIDATES
     ):
+        self.batcher = batcher
         self.session_factory = session_factory
-        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.search_backend = search_backend or PostgresSearchBackend()
+        self.answer_cache = answer_cache
+        self.embedding_cache = embedding_cache
+        self.retrieval_mode = retrieval_mode  # Default of the requests that do not choose
+        self.reranker = reranker
+        self.mmr_lambda = mmr_lambda
+        self.mmr_candidates = mmr_candidates
+        self.packer = PromptPacker(model=llm_model)
+        self.client = llm_client or build_llm_client()
         self.llm_model = llm_model
-        self.min_confidence = 0.7
-        self.query_vector = []
-        self.docs = []
-        self.prompt = []
-        self.answer = ''
-
-    def reset_state(self):
-        # Reset processes states
-        self.query_vector = []
-        self.docs: List[DocumentDomain] = []
-        self.prompt = ''
-        self.answer = ''
-
-    def embed_question(self, model: SentenceTransformer, question: str):
-        try:
-            if len(question) < 5:
-                raise RagError(f'Question {question} not valid')
-            self.query_vector = model.encode(question, normalize_embeddings=True).tolist()
-        except Exception:
-            raise
 
-    def search_similar_documents(self, session: SessionLocal, top_k: int, min_k: int):
+    async def embed_question(self, ctx: RagContext):
         try:
-            content_crud = ContentCRUD(session)
-            documents_data = content_crud.find_similar_contents(self.query_vector, top_k)
-            if len(documents_data) < min_k:
-                raise RagError('Not enough information to answer')
-            self.docs = [DocumentDomain(**doc_data) for doc_data in documents_data]
-            logger.info(f'Found {len(self.docs)} documents')
+            if len(ctx.question) < 5:
+                raise RagError(f'Question {ctx.question} not valid')
+            if self.embedding_cache is not None:
+                cached = await self.embedding_cache.get(ctx.question)
+                if cached is not None:
+                    ctx.query_vector = cached.tolist()
+                    return
+            # Encoded together with the questions of concurrent requests
+            ctx.query_vector = await self.batcher.embed(ctx.question)
+            if self.embedding_cache is not None:
+                await self.embedding_cache.put(ctx.question, ctx.query_vector)
         except Exception:
             raise
 
-    def build_prompt(self, question: str, language: LanguageEnum = LanguageEnum.FR, token_limite: int = 1600):
+    async def embed_questions(self, questions: List[str]) -> np.ndarray:
+        # A single model.encode call for the questions missing from the embedding cache
+        vectors: Dict[str, np.ndarray] = {}
+        missing = []
+        for question in questions:
+            cached = await self.embedding_cache.get(question) if self.embedding_cache is not None else None
+            if cached is not None:
+                vectors[question] = cached
+            else:
+                missing.append(question)
+
+        if missing:
+            EMBED_BATCH_SIZE.labels("ask_batch").observe(len(missing))
+            encoded = await run_cpu_bound(
+                self.batcher.model.encode,
+                missing,
+                batch_size=ENCODE_BATCH_SIZE,
+                normalize_embeddings=True
+            )
+            for question, vector in zip(missing, encoded):
+                vectors[question] = vector
+                if self.embedding_cache is not None:
+                    await self.embedding_cache.put(question, vector)
+
+        return np.vstack([vectors[question] for question in questions]).astype(np.float32)
+
+    @property
+    def diversify(self) -> bool:
+        return self.mmr_lambda < 1.0
+
+    def _candidates(self, top_k: int) -> int:
+        # MMR and re-ranking pick their documents among a wider set of bi-encoder hits
+        candidates = top_k
+        if self.diversify:
+            candidates = max(candidates, self.mmr_candidates)
+        if self.reranker is not None:
+            candidates = max(candidates, self.reranker.candidates)
+        return candidates
+
+    def _kept(self, top_k: int) -> int:
+        return min(top_k, self.reranker.top_n) if self.reranker is not None else top_k
+
+    def _reranked(self, docs_lists: List[List[DocumentDomain]], top_k: int) -> int:
+        # With MMR after it, the re-ranker orders the whole candidate set and MMR keeps the final documents
+        if self.diversify:
+            return max(len(docs) for docs in docs_lists)
+        return self._kept(top_k)
+
+    def _select(self, query_vector, documents_data: List[dict], docs: List[DocumentDomain],
+                top_k: int) -> List[DocumentDomain]:
+        # MMR over the candidate vectors: _kept(top_k) relevant and mutually distinct documents.
+        # Relevance is the re-ranker (or fusion) score when every document has one, the bi-encoder similarity otherwise
+        kept = self._kept(top_k)
+        if not self.diversify or len(docs) <= kept:
+            return docs[:kept]
+        embeddings = {doc_data['id']: doc_data['embedding'] for doc_data in documents_data}
+        relevance = None
+        if all(doc.score is not None for doc in docs):
+            scores = np.array([doc.score for doc in docs], dtype=np.float32)
+            relevance = (scores - scores.min()) / (np.ptp(scores) or 1.0)
+        selected = mmr_select(
+            np.asarray(query_vector), np.vstack([embeddings[doc.id] for doc in docs]), kept, self.mmr_lambda,
+            relevance=relevance
+        )
+        return [docs[i] for i in selected]
+
+    async def search_similar_documents(self, session: AsyncSession, ctx: RagContext, top_k: int, min_k: int,
+                                       mode: Optional[RetrievalModeEnum] = None,
+                                       filters: Optional[RetrievalFilters] = None):
+        # Only accepted sources by default
+        filters = filters or RetrievalFilters()
+        candidates = self._candidates(top_k)
+        if (mode or self.retrieval_mode) == RetrievalModeEnum.HYBRID:
+            documents_data = await self.search_backend.search_hybrid(
+                session, ctx.question, ctx.query_vector, candidates, filters=filters, with_embeddings=self.diversify
+            )
+        else:
+            documents_data = await self.search_backend.search(
+                session, ctx.query_vector, candidates, filters=filters, with_embeddings=self.diversify
+            )
+        if len(documents_data) < min_k:
+            raise RagError('Not enough information to answer')
+        ctx.docs = [DocumentDomain(**doc_data) for doc_data in documents_data]
+        if self.reranker is not None and ctx.docs:
+            with stage_timer("ask", "rerank"):
+                ctx.docs = await self.reranker.rerank(ctx.question, ctx.docs, self._reranked([ctx.docs], top_k))
+        with stage_timer("ask", "mmr"):
+            ctx.docs = self._select(ctx.query_vector, documents_data, ctx.docs, top_k)
+        logger.info(f'Found {len(ctx.docs)} documents')
+
+    def build_prompt(self, ctx: RagContext, language: LanguageEnum = LanguageEnum.FR, token_limite: int = None):
+        # token_limite: whole prompt, in LLM tokens. Documents beyond it are dropped / truncated, not rejected
         try:
-            context = "\n\n".join([doc.content for doc in self.docs])
+            token_limite = token_limite or self.packer.max_tokens
             if language == LanguageEnum.EN:
-                self.prompt = rag_prompt_en
+                prompt = rag_prompt_en
             elif language == LanguageEnum.FR:
-                self.prompt = rag_prompt_fr
+                prompt = rag_prompt_fr
             else:
                 raise RagError(f'Language {language} not supported')
 
-            self.prompt = self.prompt.format(question=question, context=context)
-
-            if len(self.prompt) > token_limite:
+            budget = token_limite - self.packer.count(prompt.format(question=ctx.question, context=""))
+            ctx.packed = self.packer.pack(ctx.docs, budget)
+            if not ctx.packed:
                 raise RagError("Prompt too long for LLM context")
 
+            context = CONTEXT_SEPARATOR.join(packed.content for packed in ctx.packed)
+            ctx.prompt = prompt.format(question=ctx.question, context=context)
+            ctx.prompt_tokens = self.packer.count(ctx.prompt)
+
+            PROMPT_TOKENS.observe(ctx.prompt_tokens)
+            logger.info(
+                f'Prompt {ctx.prompt_tokens} tokens, {len(ctx.packed)}/{len(ctx.docs)} documents, tokens per document '
+                f'{ {packed.doc.id: packed.tokens for packed in ctx.packed} }'
+                f'{", last one truncated" if ctx.packed[-1].truncated else ""}'
+            )
+
         except Exception:
             raise
 
     @retry(stop=stop_after_attempt(3), reraise=True)
-    async def query_llm_async(self):
+    async def query_llm_async(self, ctx: RagContext):
         try:
             response = await self.client.chat.completions.create(
                 model=self.llm_model,
-                messages=[{"role": "user", "content": self.prompt}]
+                messages=[{"role": "user", "content": ctx.prompt}]
             )
+            record_llm_usage(self.llm_model, response.usage)
             return response.choices[0].message.content
         except Exception as e:
             raise
 
-    @db_session_manager
-    async def answer_question(self, session: SessionLocal, model: SentenceTransformer, question: str,
-                              top_k: int = 6, min_k: int = 1) -> str:
+    async def stream_llm(self, ctx: RagContext) -> AsyncIterator[str]:
+        # Completion forwarded as it is generated. Closing the stream (client gone, task cancelled)
+        # closes the HTTP response, which stops the generation and its billing.
+        stream = await self.client.chat.completions.create(
+            model=self.llm_model,
+            messages=[{"role": "user", "content": ctx.prompt}],
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        try:
+            async for chunk in stream:
+                if chunk.usage is not None:  # Last chunk, without choices
+                    record_llm_usage(self.llm_model, chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+
+    async def _retrieve(self, session: AsyncSession, ctx: RagContext, top_k: int, min_k: int,
+                        mode: Optional[RetrievalModeEnum] = None, filters: Optional[RetrievalFilters] = None):
+        with stage_timer("ask", "embed_question"):
+            await self.embed_question(ctx)
+        with stage_timer("ask", "search_similar_documents"):
+            await self.search_similar_documents(session, ctx, top_k=top_k, min_k=min_k, mode=mode, filters=filters)
+
+    def _cached_answer(self, ctx: RagContext) -> Optional[str]:
+        # Near-identical question answered from the same documents: no LLM call
+        if self.answer_cache is None:
+            return None
+        cached = self.answer_cache.lookup(ctx.query_vector, [doc.id for doc in ctx.docs])
+        if cached is None:
+            return None
+        logger.info(f'Answer cache hit, {cached.llm_seconds:.2f}s of LLM saved')
+        return cached.answer
+
+    def _cache_answer(self, ctx: RagContext, llm_seconds: float):
+        if self.answer_cache is not None:
+            self.answer_cache.store(
+                ctx.query_vector, [doc.id for doc in ctx.docs], [doc.source_id for doc in ctx.docs],
+                ctx.answer, llm_seconds
+            )
+
+    async def answer_question(self, question: str, top_k: int = 6, min_k: int = 1,
+                              mode: Optional[RetrievalModeEnum] = None,
+                              filters: Optional[RetrievalFilters] = None) -> str:
         try:
-            self.reset_state()
+            # The DB session is released once the documents are retrieved, none is held during the LLM call
+            ctx = await self.retrieve(question=question, top_k=top_k, min_k=min_k, mode=mode, filters=filters)
+
+            cached = self._cached_answer(ctx)
+            if cached is not None:
+                return cached
 
-            self.embed_question(model, question)
-            self.search_similar_documents(session, top_k=top_k, min_k=min_k)
-            self.build_prompt(question, language=LanguageEnum.FR)
-            self.answer = await self.query_llm_async()
+            with stage_timer("ask", "build_prompt"):
+                self.build_prompt(ctx, language=LanguageEnum.FR)
+            with stage_timer("ask", "query_llm"):  # Retries included
+                llm_started = time.perf_counter()
+                ctx.answer = await self.query_llm_async(ctx)
+            self._cache_answer(ctx, time.perf_counter() - llm_started)
 
-            return self.answer
+            return ctx.answer
 
         except Exception as e:
             message = f"answer_question : {str(e)}"
             logger.error(message)
             raise
+
+    @async_db_session_manager
+    async def retrieve(self, session: AsyncSession, question: str, top_k: int = 6, min_k: int = 1,
+                       mode: Optional[RetrievalModeEnum] = None,
+                       filters: Optional[RetrievalFilters] = None) -> RagContext:
+        # First half of an answer (/ask, /ask-stream): the DB session is released before the LLM starts
+        try:
+            ctx = RagContext(question=question)
+            await self._retrieve(session, ctx, top_k, min_k, mode, filters)
+            return ctx
+
+        except Exception as e:
+            message = f"retrieve : {str(e)}"
+            logger.error(message)
+            raise
+
+    @async_db_session_manager
+    async def retrieve_batch(self, session: AsyncSession, questions: List[str], top_k: int = 6,
+                             mode: Optional[RetrievalModeEnum] = None,
+                             filters: Optional[RetrievalFilters] = None) -> List[RagContext]:
+        # One encode call and one search round trip for all the questions
+        try:
+            contexts = [RagContext(question=question) for question in questions]
+            with stage_timer("ask_batch", "embed_questions"):
+                vectors = await self.embed_questions(questions)
+            with stage_timer("ask_batch", "search_similar_documents"):
+                filters = filters or RetrievalFilters()
+                candidates = self._candidates(top_k)
+                if (mode or self.retrieval_mode) == RetrievalModeEnum.HYBRID:
+                    found = await self.search_backend.search_hybrid_batch(
+                        session, questions, vectors, candidates, filters=filters, with_embeddings=self.diversify
+                    )
+                else:
+                    found = await self.search_backend.search_batch(
+                        session, vectors, candidates, filters=filters, with_embeddings=self.diversify
+                    )
+
+            for ctx, vector, documents_data in zip(contexts, vectors, found):
+                ctx.query_vector = vector.tolist()
+                ctx.docs = [DocumentDomain(**doc_data) for doc_data in documents_data]
+            if self.reranker is not None and contexts:
+                # The pairs of all the questions in one cross-encoder call
+                with stage_timer("ask_batch", "rerank"):
+                    docs_lists = [ctx.docs for ctx in contexts]
+                    reranked = await self.reranker.rerank_many(questions, docs_lists, self._reranked(docs_lists, top_k))
+                for ctx, docs in zip(contexts, reranked):
+                    ctx.docs = docs
+            for ctx, documents_data in zip(contexts, found):
+                ctx.docs = self._select(ctx.query_vector, documents_data, ctx.docs, top_k)
+            logger.info(f'Found {sum(len(ctx.docs) for ctx in contexts)} documents for {len(contexts)} questions')
+            return contexts
+
+        except Exception as e:
+            message = f"retrieve_batch : {str(e)}"
+            logger.error(message)
+            raise
+
+    async def answer_questions(self, questions: List[str], top_k: int = 6, min_k: int = 1,
+                               max_concurrency: int = ASK_BATCH_LLM_CONCURRENCY,
+                               mode: Optional[RetrievalModeEnum] = None,
+                               filters: Optional[RetrievalFilters] = None) -> List[BatchAnswer]:
+        """Answers in the order of the questions, a failed question does not fail the others."""
+        unique = list(dict.fromkeys(questions))  # Repeated questions are answered once
+        valid = [question for question in unique if len(question) >= 5]
+        contexts = {ctx.question: ctx for ctx in await self.retrieve_batch(
+            questions=valid, top_k=top_k, mode=mode, filters=filters
+        )} if valid else {}
+        # The DB session is released here, only the LLM calls remain
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def answer(question: str) -> BatchAnswer:
+            try:
+                ctx = contexts.get(question)
+                if ctx is None:
+                    raise RagError(f'Question {question} not valid')
+                if len(ctx.docs) < min_k:
+                    raise RagError('Not enough information to answer')
+
+                documents = [doc.id for doc in ctx.docs]
+                cached = self._cached_answer(ctx)
+                if cached is not None:
+                    return BatchAnswer(question=question, answer=cached, documents=documents)
+
+                async with semaphore:
+                    self.build_prompt(ctx, language=LanguageEnum.FR)
+                    llm_started = time.perf_counter()
+                    ctx.answer = await self.query_llm_async(ctx)
+                self._cache_answer(ctx, time.perf_counter() - llm_started)
+                return BatchAnswer(question=question, answer=ctx.answer, documents=documents)
+
+            except Exception as e:
+                logger.warning(f"answer_questions : {question!r} failed: {str(e)}")
+                return BatchAnswer(question=question, error=str(e))
+
+        with stage_timer("ask_batch", "query_llm"):
+            answers = await asyncio.gather(*(answer(question) for question in unique))
+        by_question = dict(zip(unique, answers))
+        return [by_question[question] for question in questions]
+
+    async def stream_answer(self, ctx: RagContext) -> AsyncIterator[str]:
+        """Answer of a retrieved context, yielded piece by piece (in one piece from the answer cache)."""
+        cached = self._cached_answer(ctx)
+        if cached is not None:
+            yield cached
+            return
+
+        with stage_timer("ask_stream", "build_prompt"):
+            self.build_prompt(ctx, language=LanguageEnum.FR)
+
+        llm_started = time.perf_counter()
+        parts = []
+        # aclosing: the LLM stream is closed as soon as this generator is, not when it is garbage collected
+        with stage_timer("ask_stream", "query_llm"):
+            async with contextlib.aclosing(self.stream_llm(ctx)) as tokens:
+                async for text in tokens:
+                    if not parts:
+                        STAGE_SECONDS.labels("ask_stream", "first_token", "ok").observe(
+                            time.perf_counter() - llm_started
+                        )
+                    parts.append(text)
+                    yield text
+
+        # Only complete answers are cached, a disconnected client never gets here
+        ctx.answer = "".join(parts)
+        self._cache_answer(ctx, time.perf_counter() - llm_started)
@@ -0,0 +1,134 @@
+import asyncio
+import functools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from rag_project.config import (
+    RERANK_CANDIDATES, RERANK_TOP_N, RERANK_BATCH_SIZE, RERANK_BUDGET_MS, RERANK_CACHE_SIZE, RERANK_MAX_WORKERS
+)
+from rag_project.domain.models import DocumentDomain
+from rag_project.logger import get_logger
+from rag_project.metrics import RERANK_OUTCOMES, RERANK_PAIRS
+from rag_project.services.embedding_cache import normalize_question
+
+if TYPE_CHECKING:
+    from sentence_transformers import CrossEncoder  # Loaded by model_registry, torch not imported here
+
+logger = get_logger(__name__)
+
+
+class CrossEncoderReranker:
+    """
+    Orders retrieved chunks by cross-encoder relevance to the question and keeps the best top_n.
+    All the (question, chunk) pairs of a call are scored in one batched predict, in its own thread pool.
+    Past budget_ms the bi-encoder order is kept; the scores are still cached when the predict ends,
+    and until then the calls that need a predict keep the bi-encoder order without queueing another one.
+    """
+
+    def __init__(
+            self,
+            model: "CrossEncoder",
+            candidates: int = RERANK_CANDIDATES,
+            top_n: int = RERANK_TOP_N,
+            batch_size: int = RERANK_BATCH_SIZE,
+            budget_ms: float = RERANK_BUDGET_MS,
+            cache_size: int = RERANK_CACHE_SIZE,
+            max_workers: int = RERANK_MAX_WORKERS
+    ):
+        self.model = model
+        self.candidates = candidates  # Chunks to retrieve for top_n of them
+        self.top_n = top_n
+        self.batch_size = batch_size
+        self.budget_seconds = budget_ms / 1000
+        self.cache_size = cache_size
+        # (normalized question, content id) -> score. Contents are immutable (deduplicated on their hash)
+        self._scores: "OrderedDict[Tuple[str, int], float]" = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rerank")
+        self._overdue: Optional[asyncio.Future] = None  # Predict still running past its budget
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def busy(self) -> bool:
+        return self._overdue is not None and not self._overdue.done()
+
+    def _keep_order(self, outcome: str, docs_lists: List[List[DocumentDomain]],
+                    top_n: int) -> List[List[DocumentDomain]]:
+        RERANK_OUTCOMES.labels(outcome).inc()
+        return [docs[:top_n] for docs in docs_lists]
+
+    def _cached(self, key: Tuple[str, int]) -> Optional[float]:
+        score = self._scores.get(key)
+        if score is not None:
+            self._scores.move_to_end(key)
+        return score
+
+    def _store(self, keys: List[Tuple[str, int]], scores):
+        for key, score in zip(keys, scores):
+            self._scores[key] = float(score)
+            self._scores.move_to_end(key)
+        while len(self._scores) > self.cache_size:
+            self._scores.popitem(last=False)
+
+    def _store_late(self, keys: List[Tuple[str, int]], future: asyncio.Future):
+        # Predict finished after the budget: next time these pairs are free
+        if not future.cancelled() and future.exception() is None:
+            self._store(keys, future.result())
+
+    async def rerank(self, question: str, docs: List[DocumentDomain],
+                     top_n: Optional[int] = None) -> List[DocumentDomain]:
+        return (await self.rerank_many([question], [docs], top_n))[0]
+
+    async def rerank_many(self, questions: List[str], docs_lists: List[List[DocumentDomain]],
+                          top_n: Optional[int] = None) -> List[List[DocumentDomain]]:
+        """Best top_n documents of each question, scores in DocumentDomain.score. One predict for all the questions."""
+        top_n = top_n or self.top_n
+        scores: Dict[Tuple[str, int], float] = {}
+        missing_keys, missing_pairs = [], []
+        for question, docs in zip(questions, docs_lists):
+            normalized = normalize_question(question)
+            for doc in docs:
+                key = (normalized, doc.id)
+                score = self._cached(key)
+                if score is not None:
+                    scores[key] = score
+                elif key not in scores:
+                    scores[key] = None
+                    missing_keys.append(key)
+                    missing_pairs.append((question, doc.content))
+
+        if missing_pairs:
+            if self.busy:
+                # The pool is still on an overdue predict: a new one would queue behind it and time out too
+                return self._keep_order("skipped", docs_lists, top_n)
+            RERANK_PAIRS.observe(len(missing_pairs))
+            future = asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(
+                self.model.predict, missing_pairs, batch_size=self.batch_size, show_progress_bar=False
+            ))
+            try:
+                # Budget per question: a batch of questions gets proportionally more time
+                predicted = await asyncio.wait_for(
+                    asyncio.shield(future), timeout=self.budget_seconds * len(questions)
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"Re-ranking of {len(missing_pairs)} pairs over budget, bi-encoder order kept")
+                self._overdue = future
+                future.add_done_callback(lambda done: self._store_late(missing_keys, done))
+                return self._keep_order("timeout", docs_lists, top_n)
+            except Exception as e:
+                logger.error(f"Re-ranking failed, bi-encoder order kept : {str(e)}")
+                return self._keep_order("error", docs_lists, top_n)
+            self._store(missing_keys, predicted)
+            scores.update(zip(missing_keys, (float(score) for score in predicted)))
+            RERANK_OUTCOMES.labels("reranked").inc()
+        else:
+            RERANK_OUTCOMES.labels("cached").inc()
+
+        results = []
+        for question, docs in zip(questions, docs_lists):
+            normalized = normalize_question(question)
+            ranked = sorted(docs, key=lambda doc: scores[(normalized, doc.id)], reverse=True)[:top_n]
+            results.append([doc.copy(update={'score': scores[(normalized, doc.id)]}) for doc in ranked])
+        return results
@@ -1,36 +1,126 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import contextlib
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import httpx
 from urllib.parse import urlparse
 
+from rag_project.config import (
+    HTTP_TIMEOUT, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS, HTTP_USER_AGENT,
+    SCRAPER_MAX_CONCURRENCY, SCRAPER_MAX_PER_HOST, SCRAPER_MAX_BYTES, HTML_PARSER
+)
 from rag_project.exceptions import ScraperError
+from rag_project.utils.html_extraction import get_extractor
+
+# A missing Content-Type is accepted, the page is parsed as HTML
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+
+class FetchedPage(NamedTuple):
+    content: bytes
+    encoding: Optional[str]  # Charset of the Content-Type header
+    etag: Optional[str]
+    last_modified: Optional[str]
+    not_modified: bool = False  # 304 to a conditional request, content is empty
+    url: Optional[str] = None  # After redirects
+
 
+def build_http_client() -> httpx.AsyncClient:
+    # Long-lived client: connections and TLS sessions are reused across requests
+    return httpx.AsyncClient(
+        timeout=HTTP_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS
+        ),
+        headers={"User-Agent": HTTP_USER_AGENT},
+        follow_redirects=True
+    )
 
-def default_scraper(url: str, timeout: int = 4) -> str:
-    try:
-        if not urlparse(url).scheme in ('http', 'https'):
+
+class WebScraper:
+    def __init__(
+            self,
+            client: Optional[httpx.AsyncClient] = None,
+            max_concurrency: int = SCRAPER_MAX_CONCURRENCY,
+            max_per_host: int = SCRAPER_MAX_PER_HOST,
+            max_bytes: int = SCRAPER_MAX_BYTES,
+            parser: str = HTML_PARSER
+    ):
+        self.client = client or build_http_client()
+        self.max_per_host = max_per_host
+        self.max_bytes = max_bytes
+        self.extract = get_extractor(parser)
+        self._global_limit = asyncio.Semaphore(max_concurrency)
+        # host -> [semaphore, requests holding or waiting for it], dropped with its last request
+        self._host_limits: Dict[str, List] = {}
+
+    @contextlib.asynccontextmanager
+    async def _host_limit(self, host: str):
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = [asyncio.Semaphore(self.max_per_host), 0]
+        limit[1] += 1
+        try:
+            async with limit[0]:
+                yield
+        finally:
+            limit[1] -= 1
+            if not limit[1]:
+                del self._host_limits[host]
+
+    async def fetch(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None,
+                    content_types: Optional[Tuple[str, ...]] = HTML_CONTENT_TYPES) -> FetchedPage:
+        """
+        Streamed: an oversized page is dropped without being buffered.
+        With the validators of a previous fetch, an unchanged page comes back as not_modified, without a body.
+        content_types=None accepts any type (robots.txt, sitemaps).
+        """
+        parsed_url = urlparse(url)
+        if not parsed_url.scheme in ('http', 'https'):
             raise ScraperError("Invalid URL scheme")
 
-        response = requests.get(url, timeout=timeout)
-        soup = BeautifulSoup(response.content, "html5lib")
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        # Global limit protects our resources, per-host limit the scraped sites
+        async with self._global_limit, self._host_limit(parsed_url.netloc.lower()):
+            async with self.client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304 and headers:
+                    # A 304 may carry updated validators
+                    return FetchedPage(
+                        b"", None,
+                        response.headers.get("etag", etag), response.headers.get("last-modified", last_modified),
+                        not_modified=True, url=str(response.url)
+                    )
+                response.raise_for_status()
 
-        # Tags to remove
-        for tag in soup(["script", "style", "nav", "footer", "header", "aside", "form", "noscript"]):
-            tag.decompose()
+                content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+                if content_types and content_type and content_type not in content_types:
+                    raise ScraperError(f"Unsupported content type {content_type}")
+                content_length = response.headers.get("content-length", "")
+                if content_length.isdigit() and int(content_length) > self.max_bytes:
+                    raise ScraperError(f"Page too large ({content_length} bytes)")
 
-        raw_texts = list(soup.stripped_strings)
+                body = bytearray()
+                async for part in response.aiter_bytes():  # Decompressed: also caps compression bombs
+                    body += part
+                    if len(body) > self.max_bytes:
+                        raise ScraperError(f"Page larger than {self.max_bytes} bytes")
+                return FetchedPage(
+                    bytes(body), response.charset_encoding,
+                    response.headers.get("etag"), response.headers.get("last-modified"), url=str(response.url)
+                )
 
-        texts = []
-        seen = set()
-        for text in raw_texts:
-            text = " ".join(text.split())  # Normalize whitespace
-            if len(text) < 15:  # Skip short content (likely noise)
-                continue
-            if text.lower() in seen:  # Avoid exact duplicates (case-insensitive)
-                continue
-            seen.add(text.lower())
-            texts.append(text)
+    async def extract_text(self, page: FetchedPage) -> str:
+        # Parsing is CPU bound, keep it off the event loop
+        return await asyncio.to_thread(self.extract, page.content, page.encoding)
 
-        return "\n\n".join(texts)
+    async def __call__(self, url: str) -> str:
+        return await self.extract_text(await self.fetch(url))
 
-    except Exception:
-        raise
+    async def aclose(self):
+        await self.client.aclose()
@@ -0,0 +1,198 @@
+"""
+Similarity search backends used by RagService, selected with SEARCH_BACKEND.
+
+postgres: pgvector index scan (ContentCRUD.find_similar_contents)
+mmap: top-k over the memory-mapped copy of the embeddings, Postgres only serves the
+      contents of the ids found (primary key lookup)
+
+Both also serve the hybrid retrieval (search_hybrid): full-text and vector rankings fused in one SQL statement.
+with_embeddings=True adds the vector of every row ('embedding'), for a selection step such as MMR.
+"""
+import asyncio
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from rag_project.config import HYBRID_CANDIDATES
+from rag_project.db.crud.content import ContentCRUD
+from rag_project.db.mmap_index import MmapVectorIndex
+from rag_project.domain.models import RetrievalFilters
+from rag_project.db.session import AsyncSessionLocal
+from rag_project.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Extra candidates for ids dropped at lookup (deleted rows not resynced yet)
+MMAP_OVERFETCH = 4
+# Candidates multiplier of each new round when the filters leave fewer than top_k rows
+MMAP_FILTER_GROWTH = 8
+
+
+class PostgresSearchBackend:
+    async def search(self, session: AsyncSession, query_vector: List[float], top_k: int,
+                     min_similarity: float = 0.5, filters: Optional[RetrievalFilters] = None,
+                     with_embeddings: bool = False) -> List[dict]:
+        return await ContentCRUD(session).find_similar_contents(
+            query_vector, top_k, min_similarity, filters=filters, with_embeddings=with_embeddings
+        )
+
+    async def search_batch(self, session: AsyncSession, query_vectors: np.ndarray, top_k: int,
+                           min_similarity: float = 0.5, filters: Optional[RetrievalFilters] = None,
+                           with_embeddings: bool = False) -> List[List[dict]]:
+        return await ContentCRUD(session).find_similar_contents_batch(
+            query_vectors, top_k, min_similarity, filters=filters, with_embeddings=with_embeddings
+        )
+
+    async def search_hybrid(self, session: AsyncSession, question: str, query_vector: List[float], top_k: int,
+                            min_similarity: float = 0.5, filters: Optional[RetrievalFilters] = None,
+                            with_embeddings: bool = False) -> List[dict]:
+        return await ContentCRUD(session).find_hybrid_contents(
+            question, query_vector, top_k, min_similarity, filters=filters, with_embeddings=with_embeddings
+        )
+
+    async def search_hybrid_batch(self, session: AsyncSession, questions: List[str], query_vectors: np.ndarray,
+                                  top_k: int, min_similarity: float = 0.5,
+                                  filters: Optional[RetrievalFilters] = None,
+                                  with_embeddings: bool = False) -> List[List[dict]]:
+        return await ContentCRUD(session).find_hybrid_contents_batch(
+            questions, query_vectors, top_k, min_similarity, filters=filters, with_embeddings=with_embeddings
+        )
+
+
+class MmapSearchBackend:
+    def __init__(self, index: MmapVectorIndex):
+        self.index = index
+
+    async def _filtered(self, crud: ContentCRUD, query_vector: np.ndarray, top_k: int, min_similarity: float,
+                        filters: Optional[RetrievalFilters], with_embeddings: bool = False) -> List[dict]:
+        # The filters are only known to Postgres: candidates widened by MMAP_FILTER_GROWTH until top_k of them pass
+        k = top_k + MMAP_OVERFETCH
+        while True:
+            ids, similarities = await asyncio.to_thread(self.index.search, query_vector, k, min_similarity)
+            contents = await crud.get_contents(ids.tolist(), filters, with_embeddings)
+            results = [
+                {**contents[content_id], 'similarity': similarity}
+                for content_id, similarity in zip(ids.tolist(), similarities.tolist())
+                if content_id in contents
+            ][:top_k]
+            if len(results) == top_k or len(ids) < k:  # Enough rows, or no other candidate above min_similarity
+                return results
+            k *= MMAP_FILTER_GROWTH
+
+    async def search(self, session: AsyncSession, query_vector: List[float], top_k: int,
+                     min_similarity: float = 0.5, filters: Optional[RetrievalFilters] = None,
+                     with_embeddings: bool = False) -> List[dict]:
+        # One matrix-vector product, in a thread: it grows with the corpus and would block the event loop
+        return await self._filtered(
+            ContentCRUD(session), np.asarray(query_vector), top_k, min_similarity, filters, with_embeddings
+        )
+
+    async def search_batch(self, session: AsyncSession, query_vectors: np.ndarray, top_k: int,
+                           min_similarity: float = 0.5, filters: Optional[RetrievalFilters] = None,
+                           with_embeddings: bool = False) -> List[List[dict]]:
+        crud = ContentCRUD(session)
+        found = await asyncio.to_thread(self.index.search_many, query_vectors, top_k + MMAP_OVERFETCH, min_similarity)
+        contents = await crud.get_contents(
+            list({content_id for ids, _ in found for content_id in ids.tolist()}), filters, with_embeddings
+        )
+        results = []
+        for query_vector, (ids, similarities) in zip(np.asarray(query_vectors), found):
+            documents = [
+                {**contents[content_id], 'similarity': similarity}
+                for content_id, similarity in zip(ids.tolist(), similarities.tolist())
+                if content_id in contents
+            ][:top_k]
+            if len(documents) < top_k and len(ids) == top_k + MMAP_OVERFETCH:
+                # Too many candidates filtered out: this question alone, with more candidates
+                documents = await self._filtered(crud, query_vector, top_k, min_similarity, filters, with_embeddings)
+            results.append(documents)
+        return results
+
+    async def search_hybrid(self, session: AsyncSession, question: str, query_vector: List[float], top_k: int,
+                            min_similarity: float = 0.5, filters: Optional[RetrievalFilters] = None,
+                            with_embeddings: bool = False) -> List[dict]:
+        # Vector ranking computed here, fused with the full-text one in the same round trip as the contents lookup
+        ids, _ = await asyncio.to_thread(
+            self.index.search, np.asarray(query_vector), max(HYBRID_CANDIDATES, top_k), min_similarity
+        )
+        return await ContentCRUD(session).find_hybrid_contents(
+            question, query_vector, top_k, min_similarity, vector_ids=ids.tolist(), filters=filters,
+            with_embeddings=with_embeddings
+        )
+
+    async def search_hybrid_batch(self, session: AsyncSession, questions: List[str], query_vectors: np.ndarray,
+                                  top_k: int, min_similarity: float = 0.5,
+                                  filters: Optional[RetrievalFilters] = None,
+                                  with_embeddings: bool = False) -> List[List[dict]]:
+        # One round trip per question: the vector rankings differ per question
+        found = await asyncio.to_thread(
+            self.index.search_many, query_vectors, max(HYBRID_CANDIDATES, top_k), min_similarity
+        )
+        crud = ContentCRUD(session)
+        return [
+            await crud.find_hybrid_contents(
+                question, vector.tolist(), top_k, min_similarity, vector_ids=ids.tolist(), filters=filters,
+                with_embeddings=with_embeddings
+            )
+            for question, vector, (ids, _) in zip(questions, np.asarray(query_vectors), found)
+        ]
+
+
+def build_search_backend(vector_index: Optional[MmapVectorIndex] = None):
+    return MmapSearchBackend(vector_index) if vector_index is not None else PostgresSearchBackend()
+
+
+async def agreeing_rows(crud: ContentCRUD, copied_ids: np.ndarray) -> int:
+    """Length of the head of the copy made of the first rows of Postgres, in the same order."""
+    if not len(copied_ids):
+        return 0
+    position = 0
+    async for ids in crud.iter_ids(up_to=int(copied_ids.max())):
+        copied = copied_ids[position:position + len(ids)]
+        mismatches = np.flatnonzero(copied != ids[:len(copied)])
+        if mismatches.size:
+            return position + int(mismatches[0])
+        position += len(copied)
+        if position == len(copied_ids):
+            break
+    return position
+
+
+async def sync_vector_index(index: MmapVectorIndex, session_factory=AsyncSessionLocal):
+    """
+    Brings the local copy in line with Postgres, at process startup.
+    - the rows copied still match Postgres (same count up to the highest copied id): the rows inserted since
+      the last sync are appended
+    - otherwise (deleted rows, rows committed out of id order): the head of the copy that matches Postgres
+      is kept and the rows after it are fetched again
+    Rows are only appended to the copy once committed, so every row it holds is visible here.
+    Rows cut by an interrupted append are dropped first. Full rebuild when the copy is missing or of another dim.
+    File I/O runs in threads, the event loop keeps serving while another process holds the lock.
+    """
+    async with session_factory() as session:
+        crud = ContentCRUD(session)
+        async with index.file_lock_async():  # Other processes wait, then find the copy up to date
+            if not await asyncio.to_thread(index.is_compatible):
+                with index.rebuilding() as write:
+                    async for ids, vectors in crud.iter_embeddings(index.dim):
+                        await asyncio.to_thread(write, ids, vectors)
+                return
+
+            await asyncio.to_thread(index.drop_partial_rows)
+            max_id = await asyncio.to_thread(index.max_id)
+            if len(index) == await crud.count_up_to(max_id):
+                appended = 0
+                async for ids, vectors in crud.iter_embeddings(index.dim, after_id=max_id):
+                    await asyncio.to_thread(index.append, ids, vectors, lock=False)
+                    appended += len(ids)
+                logger.info(f"Vector index synced: {len(index)} rows, {appended} appended")
+                return
+
+            copied_ids = index.ids()
+            keep = await agreeing_rows(crud, copied_ids)
+            logger.info(f"Vector index: {keep} of {len(copied_ids)} rows still match Postgres, resyncing the rest")
+            with index.rebuilding(keep=keep) as write:
+                after_id = int(copied_ids[keep - 1]) if keep else 0
+                async for ids, vectors in crud.iter_embeddings(index.dim, after_id=after_id):
+                    await asyncio.to_thread(write, ids, vectors)
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("prometheus_client")
+
+from rag_project.db.notifications import ALL_SOURCES  # noqa: E402
+from rag_project.services import answer_cache  # noqa: E402
+from rag_project.services.answer_cache import SemanticAnswerCache  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(answer_cache.time, "monotonic", clock)
+    return clock
+
+
+def new_cache(**kwargs) -> SemanticAnswerCache:
+    return SemanticAnswerCache(**{"max_entries": 10, "ttl_seconds": 60, "min_similarity": 0.9, **kwargs})
+
+
+def test_hit_needs_close_question_and_same_documents(clock):
+    cache = new_cache()
+    cache.store([1, 0, 0], doc_ids=[1, 2], source_ids=[7], answer="A", llm_seconds=2)
+
+    assert cache.lookup([1, 0.1, 0], [2, 1]).answer == "A"  # Order of the documents does not matter
+    assert cache.lookup([1, 0.1, 0], [1, 3]) is None  # Retrieval changed
+    assert cache.lookup([0, 1, 0], [1, 2]) is None  # Different question
+
+
+def test_ttl(clock):
+    cache = new_cache()
+    cache.store([1, 0], [1], [7], "A", 1)
+
+    clock.now += 59
+    assert cache.lookup([1, 0], [1]) is not None
+    clock.now += 1
+    assert cache.lookup([1, 0], [1]) is None
+    assert len(cache) == 0  # Expired entries met by a lookup are dropped
+
+
+def test_lru_bound(clock):
+    cache = new_cache(max_entries=2)
+    cache.store([1, 0, 0], [1], [], "A", 1)
+    cache.store([0, 1, 0], [2], [], "B", 1)
+    assert cache.lookup([1, 0, 0], [1]) is not None  # A becomes the most recently used
+    cache.store([0, 0, 1], [3], [], "C", 1)
+
+    assert len(cache) == 2
+    assert cache.lookup([0, 1, 0], [2]) is None
+    assert cache.lookup([1, 0, 0], [1]).answer == "A"
+
+
+def test_invalidate_sources(clock):
+    cache = new_cache()
+    cache.store([1, 0, 0], [1], [7], "A", 1)
+    cache.store([0, 1, 0], [2], [7, 8], "B", 1)
+    cache.store([0, 0, 1], [3], [9], "C", 1)
+
+    assert cache.invalidate_sources({8}) == 1
+    assert cache.lookup([0, 1, 0], [2]) is None
+    assert cache.lookup([1, 0, 0], [1]) is not None
+
+    asyncio.run(cache.on_content_changed("7"))
+    assert len(cache) == 1
+    asyncio.run(cache.on_content_changed(ALL_SOURCES))
+    assert len(cache) == 0
@@ -0,0 +1,106 @@
+import re
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("pgvector")
+
+from sqlalchemy import text  # noqa: E402
+
+from rag_project.db.crud.content import _filter_sql, _hybrid_sql  # noqa: E402
+from rag_project.domain.models import RetrievalFilters, SourceTypeEnum  # noqa: E402
+
+
+def normalized(sql: str) -> str:
+    return " ".join(sql.split())
+
+
+def bind_names(sql: str) -> set:
+    return set(text(sql).compile().params)
+
+
+def balanced(sql: str) -> bool:
+    depth = 0
+    for char in sql:
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if depth < 0:
+            return False
+    return depth == 0
+
+
+def test_hybrid_sql_fuses_both_rankings():
+    sql = normalized(_hybrid_sql("CAST(:vector AS vector)", ":question"))
+
+    assert balanced(sql)
+    assert bind_names(sql) == {"vector", "question", "candidates", "min_similarity", "rrf_k", "top_k"}
+    # Reciprocal rank fusion of the ANN and full-text rankings, ties broken by id
+    assert "sum(1.0 / (:rrf_k + h.rank)) AS score" in sql
+    assert re.search(r"row_number\(\) OVER \(ORDER BY v\.distance\) AS rank .* UNION ALL", sql)
+    assert "row_number() OVER (ORDER BY t.rank DESC, t.id) AS rank" in sql
+    assert sql.endswith("GROUP BY h.id) f JOIN contents c ON c.id = f.id ORDER BY f.score DESC, c.id LIMIT :top_k")
+    # Any term of the question matches, each ranking capped at :candidates
+    assert "replace(plainto_tsquery('rag_text', :question)::text, ' & ', ' | ')::tsquery" in sql
+    assert sql.count("LIMIT :candidates") == 2
+    assert "WHERE 1 - v.distance >= :min_similarity" in sql
+    assert ", c.embedding" not in sql
+
+
+def test_hybrid_sql_condition_in_both_rankings():
+    sql = normalized(_hybrid_sql("q.embedding", "q.question", condition="contents.id > 10", with_embeddings=True))
+
+    assert balanced(sql)
+    assert "WHERE contents.id > 10 ORDER BY" in sql  # ANN ranking
+    assert "@@ replace(plainto_tsquery('rag_text', q.question)" in sql
+    assert re.search(r"content_tsv @@ .*::tsquery AND contents\.id > 10 ORDER BY rank DESC", sql)  # Full-text
+    assert sql.startswith("SELECT c.id, c.content, c.source_id, 1 - (c.embedding <=> q.embedding) AS similarity, "
+                          "f.score, c.embedding FROM")
+
+
+def test_hybrid_sql_precomputed_vector_ranking():
+    ranking = "SELECT v.id, v.rank FROM unnest(CAST(:vector_ids AS integer[])) WITH ORDINALITY AS v(id, rank)"
+    sql = normalized(_hybrid_sql("CAST(:vector AS vector)", ":question", vector_ranking=ranking))
+
+    assert balanced(sql)
+    assert f"( ({ranking}) UNION ALL" in sql
+    assert "v.distance" not in sql  # No ANN query left
+    assert "vector_ids" in bind_names(sql) and "min_similarity" not in bind_names(sql)
+
+
+def test_filter_sql_without_filters():
+    assert _filter_sql("contents.id", None) == ("TRUE", {})
+    assert _filter_sql("contents.id", RetrievalFilters(only_accepted=False)) == ("TRUE", {})
+
+
+def test_filter_sql_semi_join_on_sources():
+    condition, params = _filter_sql("v.id", RetrievalFilters(
+        source_types=[SourceTypeEnum.WEB, SourceTypeEnum.PDF], categories=["santé", "droit"]
+    ))
+    sql = normalized(condition)
+
+    assert balanced(sql)
+    assert sql.startswith(
+        "EXISTS (SELECT 1 FROM source_contents sc JOIN sources s ON s.id = sc.source_id WHERE sc.content_id = v.id AND "
+    )
+    assert " AND ".join([
+        "s.is_accepted",
+        "s.source_type = ANY(CAST(:filter_source_types AS sourcetypeenum[]))",
+        "EXISTS (SELECT 1 FROM source_categories scat JOIN categories cat ON cat.id = scat.category_id "
+        "WHERE scat.source_id = s.id AND cat.name = ANY(CAST(:filter_categories AS text[])))",
+    ]) in sql
+    assert params == {"filter_source_types": ["WEB", "PDF"], "filter_categories": ["santé", "droit"]}  # Enum names
+    assert bind_names(sql) == set(params)
+
+
+def test_filter_sql_only_accepted():
+    condition, params = _filter_sql("contents.id", RetrievalFilters())
+    assert normalized(condition).endswith("WHERE sc.content_id = contents.id AND s.is_accepted)")
+    assert params == {}
+
+
+def test_filter_sql_in_hybrid_sql():
+    condition, params = _filter_sql("contents.id", RetrievalFilters(categories=["santé"]))
+    sql = normalized(_hybrid_sql("CAST(:vector AS vector)", ":question", condition=condition))
+
+    assert balanced(sql)
+    assert sql.count("cat.name = ANY(CAST(:filter_categories AS text[]))") == 2  # ANN and full-text rankings
+    assert set(params) <= bind_names(sql)
@@ -0,0 +1,73 @@
+import struct
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from rag_project.db.crud.operations.copy_loader import (  # noqa: E402
+    COPY_SIGNATURE, COPY_TRAILER, encode_rows, iter_copy_stream
+)
+
+
+def decode_rows(data: bytes):
+    # Reference reader of the COPY BINARY tuples: (content, (dim, unused, values), source_id, content_hash)
+    rows, offset = [], 0
+    while offset < len(data):
+        (n_fields,) = struct.unpack_from(">h", data, offset)
+        offset += 2
+        fields = []
+        for _ in range(n_fields):
+            (length,) = struct.unpack_from(">i", data, offset)
+            offset += 4
+            fields.append(data[offset:offset + length])
+            offset += length
+        rows.append(fields)
+    return rows
+
+
+def decode_vector(field: bytes):
+    dim, unused = struct.unpack_from(">HH", field, 0)
+    return dim, unused, np.array(struct.unpack_from(f">{dim}f", field, 4), dtype=np.float32)
+
+
+def sample(n_rows: int = 3, dim: int = 5):
+    rng = np.random.default_rng(0)
+    contents = ["premier chunk", "deuxième chunk, accentué", ""][:n_rows]
+    embeddings = rng.standard_normal((n_rows, dim)).astype(np.float32)
+    source_ids = np.array([7, 42, 2 ** 31 - 1][:n_rows], dtype=np.int32)
+    hashes = np.array([f"{i:x}" * 64 for i in range(10, 10 + n_rows)], dtype="S64")
+    return contents, embeddings, source_ids, hashes
+
+
+def test_encode_rows_layout():
+    contents, embeddings, source_ids, hashes = sample()
+    data = encode_rows([content.encode("utf-8") for content in contents], embeddings, source_ids, hashes)
+
+    rows = decode_rows(data)
+    assert len(rows) == len(contents)
+    for row, content, embedding, source_id, content_hash in zip(rows, contents, embeddings, source_ids, hashes):
+        assert len(row) == 4
+        assert row[0].decode("utf-8") == content  # Length in bytes, not characters
+
+        assert len(row[1]) == 4 + 4 * embeddings.shape[1]
+        dim, unused, values = decode_vector(row[1])
+        assert (dim, unused) == (embeddings.shape[1], 0)
+        np.testing.assert_array_equal(values, embedding)
+
+        assert len(row[2]) == 4
+        assert struct.unpack(">i", row[2])[0] == source_id
+
+        assert len(row[3]) == 64
+        assert row[3] == content_hash
+
+
+def test_copy_stream_framing():
+    contents, embeddings, source_ids, hashes = sample()
+    blocks = list(iter_copy_stream(contents, embeddings, source_ids, hashes, batch_rows=2))
+
+    assert blocks[0] == COPY_SIGNATURE
+    assert blocks[-1] == COPY_TRAILER
+    assert len(blocks) == 2 + 2  # Two batches of rows between signature and trailer
+    rows = decode_rows(b"".join(blocks[1:-1]))
+    assert [row[0].decode("utf-8") for row in rows] == contents
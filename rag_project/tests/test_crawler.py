@@ -0,0 +1,280 @@
+import asyncio
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("lxml")
+pytest.importorskip("bs4")
+pytest.importorskip("sqlalchemy")
+
+from rag_project.db.crud.crawl import FrontierUrl  # noqa: E402
+from rag_project.domain.models import (  # noqa: E402
+    CrawlDomain, CrawlUrlStatusEnum, IngestionStatusEnum, JobStatusEnum, SourceTypeEnum, UrlIngestionResult
+)
+from rag_project.services import crawler as crawler_module  # noqa: E402
+from rag_project.services.crawler import Crawler  # noqa: E402
+from rag_project.services.scraping_service import WebScraper  # noqa: E402
+
+
+def html(*links: str) -> bytes:
+    anchors = "".join(f'<a href="{link}">{link}</a>' for link in links)
+    return f"<html><body><p>Page content.</p>{anchors}</body></html>".encode()
+
+
+def sitemap(*urls: str) -> bytes:
+    locs = "".join(f"<url><loc>{url}</loc></url>" for url in urls)
+    return gzip.compress(
+        f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{locs}</urlset>'.encode()
+    )
+
+
+class Site:
+    """Local site: robots.txt, a gzipped sitemap and linked pages, requested paths recorded."""
+
+    def __init__(self):
+        self.requests: List[str] = []
+        self.pages: Dict[str, Tuple[str, bytes]] = {}
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.requests.append(self.path)
+                if self.path not in site.pages:
+                    self.send_error(404)
+                    return
+                content_type, body = site.pages[self.path]
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        port = self.server.server_port
+        self.origin = f"http://127.0.0.1:{port}"
+        other_host = f"http://localhost:{port}"  # Same server, out of the allowed domains
+
+        self.add("/robots.txt", "text/plain", b"User-agent: *\nDisallow: /private\n")
+        self.add("/sitemap.xml.gz", "application/gzip", sitemap(f"{self.origin}/from-sitemap", f"{other_host}/out"))
+        self.add("/", "text/html", html(
+            "/a", "/a#top", "/./a", "/a?utm_source=news", f"HTTP://127.0.0.1:{port}/x/../a",
+            "/private/secret", f"{other_host}/elsewhere", "/image.png", "/level1"
+        ))
+        self.add("/a", "text/html", html("/", "/a"))
+        self.add("/level1", "text/html", html("/level2"))
+        self.add("/level2", "text/html", html("/level3"))
+        self.add("/level3", "text/html", html())
+        self.add("/from-sitemap", "text/html", html("/level1"))
+        self.add("/private/secret", "text/html", html())
+
+    def add(self, path: str, content_type: str, body: bytes):
+        self.pages[path] = (content_type, body)
+
+    def url(self, path: str) -> str:
+        return self.origin + path
+
+    def count(self, path: str) -> int:
+        return self.requests.count(path)
+
+
+@pytest.fixture
+def site():
+    site = Site()
+    thread = threading.Thread(target=site.server.serve_forever, daemon=True)
+    thread.start()
+    yield site
+    site.server.shutdown()
+    site.server.server_close()
+
+
+class Frontier:
+    """In memory CrawlCRUD: url -> [id, depth, status, error]."""
+
+    def __init__(self):
+        self.urls: Dict[str, list] = {}
+        self.touches = 0
+
+    def __call__(self, session):
+        return self
+
+    async def add_urls(self, crawl_id, urls):
+        added = 0
+        for url, depth in urls:
+            if url not in self.urls:
+                self.urls[url] = [len(self.urls) + 1, depth, CrawlUrlStatusEnum.PENDING, None]
+                added += 1
+        return added
+
+    async def claim_urls(self, crawl_id, limit):
+        pending = sorted(
+            (row for row in self.urls.items() if row[1][2] == CrawlUrlStatusEnum.PENDING),
+            key=lambda row: (row[1][1], row[1][0])
+        )[:limit]
+        for _, row in pending:
+            row[2] = CrawlUrlStatusEnum.RUNNING
+        return [FrontierUrl(row[0], url, row[1]) for url, row in pending]
+
+    async def set_url_statuses(self, statuses):
+        by_id = {row[0]: row for row in self.urls.values()}
+        for url_id, status, error in statuses:
+            by_id[url_id][2:] = [status, error]
+
+    async def touch(self, crawl_id):
+        self.touches += 1
+
+    async def requeue_running_urls(self, crawl_id):
+        return 0
+
+    async def count_urls(self, crawl_id):
+        return {}
+
+    def status(self, url: str) -> CrawlUrlStatusEnum:
+        return self.urls[url][2]
+
+
+class NoSources:
+    def __init__(self, session):
+        pass
+
+    async def get_sources_by_paths(self, paths):
+        return {}
+
+
+class FakeSession:
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class IngestionSink:
+    """IngestionService stand-in: records the fetched and ingested pages."""
+
+    def __init__(self):
+        self.fetched: List[str] = []
+        self.ingested: List[str] = []
+
+    async def content_from_page(self, ctx, url, page, source=None):
+        ctx.source_url, ctx.texts = url, page.content.decode()
+        self.fetched.append(url)
+
+    async def chunk_in_thread(self, ctx, max_tokens):
+        pass
+
+    async def ingest_contexts(self, contexts, source_type):
+        self.ingested.extend(ctx.source_url for ctx in contexts)
+        return {
+            ctx.source_url: UrlIngestionResult(url=ctx.source_url, status=IngestionStatusEnum.SUCCESS)
+            for ctx in contexts
+        }
+
+
+@pytest.fixture
+def frontier(monkeypatch):
+    frontier = Frontier()
+    monkeypatch.setattr(crawler_module, "CrawlCRUD", frontier)
+    monkeypatch.setattr(crawler_module, "SourceCRUD", NoSources)
+    return frontier
+
+
+def crawl(site: Site, max_depth: int = 2, max_pages: int = 100, sitemaps: bool = True) -> CrawlDomain:
+    return CrawlDomain(
+        id=1, seeds=[site.url("/")], sitemaps=[site.url("/sitemap.xml.gz")] if sitemaps else [],
+        allowed_domains=["127.0.0.1"], max_depth=max_depth, max_pages=max_pages,
+        source_type=SourceTypeEnum.WEB, status=JobStatusEnum.RUNNING
+    )
+
+
+def run(crawl_domain: CrawlDomain, sink: IngestionSink) -> bool:
+    async def main():
+        scraper = WebScraper(client=httpx.AsyncClient(trust_env=False))
+        try:
+            crawler = Crawler(sink, scraper, session_factory=FakeSession, concurrency=3, host_delay=0, ingest_batch=2)
+            return await crawler.run(crawl_domain)
+        finally:
+            await scraper.aclose()
+
+    return asyncio.run(main())
+
+
+def test_crawl_scope_depth_and_robots(site, frontier):
+    sink = IngestionSink()
+    assert run(crawl(site, max_depth=2), sink)
+
+    assert sorted(frontier.urls) == sorted(site.url(path) for path in (
+        "/", "/a", "/private/secret", "/level1", "/level2", "/from-sitemap"
+    ))
+    # Disallowed by robots.txt: recorded, never requested
+    assert frontier.status(site.url("/private/secret")) == CrawlUrlStatusEnum.SKIPPED
+    assert site.count("/private/secret") == 0
+    # Depth 2 is the last level: its links are not followed
+    assert site.count("/level3") == 0
+    # Out of allowed_domains (sitemap and links) and not pages
+    assert site.count("/out") == site.count("/elsewhere") == site.count("/image.png") == 0
+
+    assert site.count("/robots.txt") == 1
+    assert sorted(sink.ingested) == sorted(sink.fetched) == sorted(
+        site.url(path) for path in ("/", "/a", "/level1", "/level2", "/from-sitemap")
+    )
+    assert all(frontier.status(url) == CrawlUrlStatusEnum.INGESTED for url in sink.ingested)
+
+
+def test_normalized_urls_fetched_once(site, frontier):
+    sink = IngestionSink()
+    run(crawl(site, max_depth=2, sitemaps=False), sink)
+    # /a, /a#top, /./a, /a?utm_source=news and the uppercase absolute one are the same frontier url
+    assert [url for url in frontier.urls if url.endswith("/a")] == [site.url("/a")]
+    assert site.count("/a") == 1
+    assert site.count("/") == 1  # Linked back from /a
+
+
+def test_max_pages(site, frontier):
+    sink = IngestionSink()
+    run(crawl(site, max_pages=2), sink)
+
+    processed = [url for url, row in frontier.urls.items() if row[2] != CrawlUrlStatusEnum.PENDING]
+    assert len(processed) == 2
+    assert len(sink.fetched) <= 2
+    pages = [path for path in site.requests if path not in ("/robots.txt", "/sitemap.xml.gz")]
+    assert len(pages) <= 2
+    assert any(row[2] == CrawlUrlStatusEnum.PENDING for row in frontier.urls.values())  # Left for a later run
+
+
+def test_depth_zero_fetches_seeds_only(site, frontier):
+    sink = IngestionSink()
+    run(crawl(site, max_depth=0, sitemaps=False), sink)
+    assert list(frontier.urls) == [site.url("/")]
+    assert sink.ingested == [site.url("/")]
+
+
+def test_crawl_touched_while_expanding_sitemaps(site, frontier):
+    index = (
+        '<?xml version="1.0"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        f'<sitemap><loc>{site.url("/sitemap.xml.gz")}</loc></sitemap>'
+        f'<sitemap><loc>{site.url("/missing.xml")}</loc></sitemap></sitemapindex>'
+    ).encode()
+    site.add("/index.xml", "application/xml", index)
+    crawl_domain = crawl(site, max_depth=0, sitemaps=False)
+    crawl_domain.sitemaps = [site.url("/index.xml")]
+
+    async def main():
+        scraper = WebScraper(client=httpx.AsyncClient(trust_env=False))
+        try:
+            crawler = Crawler(IngestionSink(), scraper, session_factory=FakeSession, host_delay=0)
+            return await crawler.expand_sitemaps(crawl_domain)
+        finally:
+            await scraper.aclose()
+
+    assert asyncio.run(main()) == 1  # /from-sitemap, the other host is out of allowed_domains
+    assert frontier.touches == 3  # Once per sitemap, the failed one included
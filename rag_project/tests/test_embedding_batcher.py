@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip("prometheus_client")
+
+from rag_project.services.embedding_batcher import EmbeddingBatcher  # noqa: E402
+
+
+class FakeModel:
+    """SentenceTransformer stand-in: one encode call recorded per batch, vector = [len(text)]."""
+
+    def __init__(self):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=False):
+        with self.lock:
+            self.batches.append(list(texts))
+        if "boom" in texts:
+            raise RuntimeError("encode failed")
+        return np.array([[float(len(text))] for text in texts], dtype=np.float32)
+
+
+def run(batcher: EmbeddingBatcher, coroutine_factory):
+    async def main():
+        await batcher.start()
+        try:
+            return await coroutine_factory()
+        finally:
+            await batcher.stop()
+
+    return asyncio.run(main())
+
+
+def test_concurrent_texts_share_one_encode():
+    model = FakeModel()
+    batcher = EmbeddingBatcher(model, max_batch_size=64, max_wait_ms=50)
+
+    vectors = run(batcher, lambda: asyncio.gather(*(batcher.embed("x" * n) for n in range(1, 6))))
+    assert vectors == [[1.0], [2.0], [3.0], [4.0], [5.0]]  # Each caller gets its own vector
+    assert model.batches == [["x", "xx", "xxx", "xxxx", "xxxxx"]]
+    assert batcher.stats.as_dict()["max_batch_size"] == 5
+
+
+def test_full_batch_flushed_before_the_window():
+    model = FakeModel()
+    batcher = EmbeddingBatcher(model, max_batch_size=2, max_wait_ms=10_000)
+
+    async def embed_four():
+        # Would time out if a batch waited for its 10 s window
+        return await asyncio.wait_for(asyncio.gather(*(batcher.embed(str(n)) for n in range(4))), 2)
+
+    run(batcher, embed_four)
+    assert model.batches == [["0", "1"], ["2", "3"]]
+
+
+def test_window_flushes_a_partial_batch():
+    model = FakeModel()
+    batcher = EmbeddingBatcher(model, max_batch_size=64, max_wait_ms=20)
+
+    async def two_windows():
+        first = await batcher.embed("a")  # Alone in its window
+        second = await asyncio.gather(batcher.embed("bb"), batcher.embed("ccc"))
+        return first, second
+
+    assert run(batcher, two_windows) == ([1.0], [[2.0], [3.0]])
+    assert model.batches == [["a"], ["bb", "ccc"]]
+
+
+def test_encode_error_fails_the_batch_only():
+    model = FakeModel()
+    batcher = EmbeddingBatcher(model, max_batch_size=64, max_wait_ms=20)
+
+    async def failing_then_ok():
+        results = await asyncio.gather(batcher.embed("boom"), batcher.embed("ok"), return_exceptions=True)
+        return results, await batcher.embed("again")
+
+    results, again = run(batcher, failing_then_ok)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert again == [5.0]
+
+
+def test_embed_before_start():
+    batcher = EmbeddingBatcher(FakeModel())
+    with pytest.raises(RuntimeError):
+        asyncio.run(batcher.embed("question"))
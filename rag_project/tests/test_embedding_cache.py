@@ -0,0 +1,72 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip("prometheus_client")
+
+from rag_project.services.embedding_cache import QueryEmbeddingCache, normalize_question  # noqa: E402
+
+
+def vector(*values: float) -> np.ndarray:
+    return np.array(values, dtype=np.float32)
+
+
+def test_normalize_question():
+    assert normalize_question("  Quelle  est\tla ＣAPITALE ?\n") == "quelle est la capitale ?"
+
+
+def test_lru_without_disk():
+    cache = QueryEmbeddingCache("model", max_entries=2, disk_path=None)
+
+    async def main():
+        await cache.put("one", [1.0, 0.0])
+        await cache.put("two", [0.0, 1.0])
+        assert (await cache.get("ONE ")).tolist() == [1.0, 0.0]  # Normalized key, "one" most recent now
+        await cache.put("three", [1.0, 1.0])
+        return await cache.get("two"), await cache.get("one")
+
+    evicted, kept = asyncio.run(main())
+    assert evicted is None
+    assert kept.dtype == np.float32
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+
+def test_disk_tier_shared_across_instances_and_off_the_loop(tmp_path):
+    path = str(tmp_path / "cache" / "embeddings.sqlite")
+    writer = QueryEmbeddingCache("model", max_entries=10, disk_path=path)
+    reader = QueryEmbeddingCache("model", max_entries=10, disk_path=path)
+    other_model = QueryEmbeddingCache("other", max_entries=10, disk_path=path)
+    disk_threads = []
+    disk_get = reader._disk_get
+
+    def recording_disk_get(key):
+        disk_threads.append(threading.current_thread())
+        return disk_get(key)
+
+    reader._disk_get = recording_disk_get
+
+    async def main():
+        await writer.put("Question", vector(0.5, 0.25))
+        found = await reader.get("question")
+        assert await reader.get("question") is found  # Second lookup from the LRU
+        return found, await other_model.get("question")
+
+    try:
+        found, not_shared = asyncio.run(main())
+    finally:
+        for cache in (writer, reader, other_model):
+            cache.close()
+
+    assert found.tolist() == [0.5, 0.25]
+    assert not_shared is None  # Vectors of another model are never returned
+    assert reader.stats()["disk_hits"] == 1 and reader.stats()["hits"] == 1
+    assert disk_threads and threading.main_thread() not in disk_threads
+
+
+def test_closed_disk_tier_is_a_miss(tmp_path):
+    cache = QueryEmbeddingCache("model", max_entries=10, disk_path=str(tmp_path / "embeddings.sqlite"))
+    cache.close()
+    assert cache._disk_get("question") is None
+    cache._disk_put("question", vector(1.0))  # No error once closed
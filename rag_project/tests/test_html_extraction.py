@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip("bs4")
+
+from rag_project.exceptions import ScraperError  # noqa: E402
+from rag_project.utils.html_extraction import EXTRACTORS, get_extractor  # noqa: E402
+
+PAGE = """<html><head><title>T</title><style>p { color: red }</style><script>var x = "ignored script text";</script>
+</head><body>
+<nav>Navigation links, not content</nav>
+<h1>Le titre de la page principale</h1>
+<p>Premier   paragraphe
+   sur plusieurs lignes.</p>
+<p>PREMIER paragraphe sur plusieurs lignes.</p>
+<p>Court</p>
+<div><span>Texte conservé</span> après la balise retirée.<footer>Pied de page du site</footer></div>
+</body></html>""".encode("utf-8")
+# Removed tags and their text dropped, short texts ("Court", "Texte conservé") too
+EXPECTED = "Le titre de la page principale\n\nPremier paragraphe sur plusieurs lignes.\n\naprès la balise retirée."
+
+
+@pytest.fixture(params=list(EXTRACTORS))
+def extract(request):
+    pytest.importorskip(request.param)  # selectolax is optional
+    return get_extractor(request.param)
+
+
+def test_backends_extract_the_same_text(extract):
+    assert extract(PAGE, "utf-8") == EXPECTED  # Whitespace normalized, case-insensitive duplicate dropped
+
+
+def test_backends_detect_encoding(extract):
+    page = '<meta charset="iso-8859-1"><p>Une phrase accentuée assez longue.</p>'.encode("iso-8859-1")
+    assert extract(page, None) == "Une phrase accentuée assez longue."
+
+
+def test_backends_handle_empty_pages(extract):
+    assert extract(b"", None) == ""
+    assert extract(b"   <!-- nothing -->  ", None) == ""
+
+
+def test_unknown_parser():
+    with pytest.raises(ScraperError):
+        get_extractor("regex")
@@ -0,0 +1,268 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Dict, List
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("httpx")
+pytest.importorskip("prometheus_client")
+
+from rag_project.db.crud import source as source_crud  # noqa: E402
+from rag_project.domain.models import SourceTypeEnum  # noqa: E402
+from rag_project.services import ingestion_service as ingestion_module  # noqa: E402
+from rag_project.services.ingestion_service import IngestionContext, IngestionService  # noqa: E402
+from rag_project.services.scraping_service import FetchedPage  # noqa: E402
+from rag_project.utils.text_processing import compute_text_hash  # noqa: E402
+
+
+class Sessions:
+    """Session factory: counts the sessions open at any time, records what ran inside one."""
+
+    def __init__(self):
+        self.open = 0
+        self.opened = 0
+
+    def __call__(self):
+        self.open += 1
+        self.opened += 1
+        sessions = self
+
+        class Session:
+            async def commit(self):
+                pass
+
+            async def rollback(self):
+                pass
+
+            async def close(self):
+                sessions.open -= 1
+
+        return Session()
+
+
+class Database:
+    """SourceCRUD / ContentCRUD stand-in: sources by path, stored chunk hashes."""
+
+    def __init__(self):
+        self.sources: Dict[str, SimpleNamespace] = {}
+        self.hashes: set = set()
+        self.stored: List = []
+        database = self
+
+        class SourceCRUD:
+            remember_fetch = staticmethod(source_crud.SourceCRUD.remember_fetch)
+
+            def __init__(self, session):
+                pass
+
+            async def get_sources_by_paths(self, paths):
+                return {path: database.sources[path] for path in paths if path in database.sources}
+
+        self.source_crud = SourceCRUD
+
+    def content_crud(self, session):
+        database = self
+
+        class ContentCRUD:
+            inserted_rows = []
+
+            async def find_existing_hashes(self, hashes):
+                return [h for h in hashes if h in database.hashes]
+
+            async def store_sources_chunks(self, sources_chunks, source_type):
+                database.stored.extend(sources_chunks)
+                for chunks in sources_chunks:
+                    database.hashes.update(chunks.new_hashes)
+                    ids = np.arange(len(database.hashes) - len(chunks.new_hashes), len(database.hashes))
+                    self.inserted_rows.append((ids, chunks.new_embeddings))
+                return {chunks.source_url: len(chunks.new_chunks) for chunks in sources_chunks}
+
+        return ContentCRUD()
+
+
+class Scraper:
+    def __init__(self, sessions: Sessions, text: str):
+        self.sessions = sessions
+        self.text = text
+        self.open_while_fetching = []
+
+    async def fetch(self, url, etag=None, last_modified=None):
+        self.open_while_fetching.append(self.sessions.open)
+        return FetchedPage(self.text.encode(), "utf-8", '"v1"', None)
+
+    async def extract_text(self, page):
+        return page.content.decode()
+
+
+class Chunker:
+    def __init__(self, sessions: Sessions):
+        self.sessions = sessions
+        self.open_while_chunking = []
+
+    def __call__(self, text, max_tokens):
+        self.open_while_chunking.append(self.sessions.open)
+        return [sentence.strip() + "." for sentence in text.split(".") if sentence.strip()]
+
+
+class VectorIndex:
+    """MmapVectorIndex stand-in: the appended ids, with the number of sessions open at the time."""
+
+    def __init__(self, sessions: Sessions):
+        self.sessions = sessions
+        self.appends = []
+
+    def append(self, ids, vectors):
+        self.appends.append((ids.tolist(), self.sessions.open))
+
+
+class Model:
+    def encode(self, texts, batch_size=32, normalize_embeddings=False):
+        return np.ones((len(texts), 3), dtype=np.float32)
+
+    def get_sentence_embedding_dimension(self):
+        return 3
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = Database()
+    monkeypatch.setattr(ingestion_module, "SourceCRUD", database.source_crud)
+    monkeypatch.setattr(ingestion_module, "ContentCRUD", database.content_crud)
+    return database
+
+
+def service(sessions: Sessions, text: str) -> IngestionService:
+    return IngestionService(
+        Model(), session_factory=sessions, scraper=Scraper(sessions, text), chunker=Chunker(sessions)
+    )
+
+
+def ingest(ingestion: IngestionService, url: str = "https://a.example/page", stages: List = None) -> int:
+    async def on_progress(stage, progress):
+        stages.append(stage)
+
+    return asyncio.run(ingestion.ingest_content(
+        source_type=SourceTypeEnum.WEB, url=url, on_progress=on_progress if stages is not None else None
+    ))
+
+
+def test_no_session_while_fetching_and_chunking(database):
+    sessions = Sessions()
+    ingestion = service(sessions, "First sentence. Second sentence. Third one.")
+    stages = []
+
+    assert ingest(ingestion, stages=stages) == 3
+    assert ingestion.scraper.open_while_fetching == [0]
+    assert ingestion.chunker.open_while_chunking == [0]
+    assert sessions.opened == 2  # Source lookup, then the write
+    assert sessions.open == 0
+    assert stages == ["fetching", "chunking", "storing"]
+    assert [chunks.new_chunks for chunks in database.stored] == [
+        ["First sentence.", "Second sentence.", "Third one."]
+    ]
+
+
+def test_known_chunks_not_embedded_again(database):
+    database.hashes.add(compute_text_hash("Second sentence."))
+    ingestion = service(Sessions(), "First sentence. Second sentence.")
+
+    assert ingest(ingestion) == 2  # Chunks of the source, known ones included
+    assert database.stored[0].new_chunks == ["First sentence."]
+    assert database.stored[0].chunk_hashes == [
+        compute_text_hash("First sentence."), compute_text_hash("Second sentence.")
+    ]
+
+
+def test_exactly_one_source():
+    ingestion = service(Sessions(), "")
+    with pytest.raises(ingestion_module.IngestionError):
+        asyncio.run(ingestion.ingest_content(source_type=SourceTypeEnum.WEB))
+
+
+def test_vector_index_appended_after_commit(database):
+    sessions = Sessions()
+    ingestion = service(sessions, "First sentence. Second sentence.")
+    ingestion.vector_index = VectorIndex(sessions)
+
+    ingest(ingestion)
+    assert ingestion.vector_index.appends == [([0, 1], 0)]  # Transaction over: only committed rows
+
+
+def test_chunks_deduplicated_across_the_batch(database):
+    ingestion = service(Sessions(), "")
+    first = IngestionContext(source_url="https://a.example/1", chunks=["Shared.", "Own one.", "Shared."])
+    second = IngestionContext(source_url="https://a.example/2", chunks=["Shared.", "Stored."])
+    database.hashes.add(compute_text_hash("Stored."))
+
+    asyncio.run(IngestionService.filter_known_chunks(None, [first, second]))
+    assert first.new_chunks == ["Shared.", "Own one."]  # Embedded once, even when repeated in the page
+    assert second.new_chunks == []  # Shared with the first page, or already stored
+    assert second.hashes == [compute_text_hash("Shared."), compute_text_hash("Stored.")]  # Both still linked
+
+
+
+class ConditionalSite(Scraper):
+    """Scraper stand-in answering 304 when the validator sent is the current one."""
+
+    def __init__(self, sessions: Sessions, text: str, etag: str):
+        super().__init__(sessions, text)
+        self.etag = etag
+        self.sent = []
+
+    async def fetch(self, url, etag=None, last_modified=None):
+        self.sent.append(etag)
+        if etag == self.etag:
+            return FetchedPage(b"", None, self.etag, None, not_modified=True)
+        return FetchedPage(self.text.encode(), "utf-8", self.etag, None)
+
+
+def known_source(database: Database, url: str, etag: str, text: str) -> SimpleNamespace:
+    source = SimpleNamespace(etag=etag, last_modified=None, text_hash=compute_text_hash(text))
+    database.sources[url] = source
+    return source
+
+
+def conditional_service(text: str, etag: str) -> IngestionService:
+    sessions = Sessions()
+    return IngestionService(
+        Model(), session_factory=sessions, scraper=ConditionalSite(sessions, text, etag), chunker=Chunker(sessions)
+    )
+
+
+def test_not_modified_page_not_stored(database):
+    url = "https://a.example/page"
+    source = known_source(database, url, '"v1"', "First sentence.")
+    ingestion = conditional_service("First sentence.", '"v1"')
+
+    assert ingest(ingestion, url) == 0
+    assert ingestion.scraper.sent == ['"v1"']  # Conditional request with the stored validator
+    assert ingestion.chunker.open_while_chunking == []
+    assert database.stored == []
+    assert source.etag == '"v1"'
+
+
+def test_same_text_new_etag_is_unchanged(database):
+    url = "https://a.example/page"
+    source = known_source(database, url, '"v1"', "First sentence.")
+    ingestion = conditional_service("First sentence.", '"v2"')  # Regenerated page, same text
+
+    results = asyncio.run(ingestion.ingest_urls([url]))
+    assert [result.status for result in results] == [ingestion_module.IngestionStatusEnum.UNCHANGED]
+    assert ingestion.chunker.open_while_chunking == []  # Fingerprint matched: not chunked nor embedded
+    assert source.etag == '"v2"'  # Validators refreshed for the next conditional request
+    assert source.text_hash == compute_text_hash("First sentence.")
+
+
+def test_changed_text_ingested(database):
+    url = "https://a.example/page"
+    known_source(database, url, '"v1"', "First sentence.")
+    ingestion = conditional_service("First sentence. New sentence.", '"v2"')
+
+    results = asyncio.run(ingestion.ingest_urls([url]))
+    assert [(result.status, result.chunks) for result in results] == [
+        (ingestion_module.IngestionStatusEnum.SUCCESS, 2)
+    ]
+    assert database.stored[0].new_chunks == ["First sentence.", "New sentence."]
+    assert database.stored[0].text_hash == compute_text_hash("First sentence. New sentence.")
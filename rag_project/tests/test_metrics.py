@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("prometheus_client")
+
+from prometheus_client import REGISTRY  # noqa: E402
+from prometheus_client.openmetrics.exposition import generate_latest as openmetrics_latest  # noqa: E402
+
+from rag_project.logger import request_id_var  # noqa: E402
+from rag_project.metrics import record_chunks, record_llm_usage, stage_timer  # noqa: E402
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_stage_timer_outcomes():
+    ok = sample("rag_stage_seconds_count", pipeline="test", stage="ok_stage", outcome="ok")
+    error = sample("rag_stage_seconds_count", pipeline="test", stage="failing_stage", outcome="error")
+
+    with stage_timer("test", "ok_stage"):
+        pass
+    with pytest.raises(ValueError):
+        with stage_timer("test", "failing_stage"):
+            raise ValueError("stage failed")
+
+    assert sample("rag_stage_seconds_count", pipeline="test", stage="ok_stage", outcome="ok") == ok + 1
+    assert sample("rag_stage_seconds_count", pipeline="test", stage="failing_stage", outcome="error") == error + 1
+
+
+def test_stage_exemplar_carries_the_request_id():
+    token = request_id_var.set("req-exemplar")
+    try:
+        with stage_timer("test", "exemplar_stage"):
+            pass
+    finally:
+        request_id_var.reset(token)
+    assert b'request_id="req-exemplar"' in openmetrics_latest(REGISTRY)
+
+
+def test_chunk_and_llm_counters():
+    before = {kind: sample("rag_chunks_total", kind=kind) for kind in ("chunked", "new", "inserted")}
+    record_chunks(10, 4, 3)
+    assert {kind: sample("rag_chunks_total", kind=kind) - before[kind] for kind in before} == {
+        "chunked": 10, "new": 4, "inserted": 3
+    }
+
+    prompt = sample("rag_llm_tokens_total", model="test-model", kind="prompt")
+    record_llm_usage("test-model", SimpleNamespace(prompt_tokens=120, completion_tokens=30))
+    record_llm_usage("test-model", None)  # Not reported by the server
+    assert sample("rag_llm_tokens_total", model="test-model", kind="prompt") == prompt + 120
@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pytest
+
+from rag_project.db.mmap_index import IDS_FILE, VECTORS_FILE, MmapVectorIndex
+
+DIM = 8
+
+
+def normalized(n_rows: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((n_rows, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = MmapVectorIndex(str(tmp_path), DIM)
+    with index.file_lock(), index.rebuilding() as write:
+        write(np.arange(1, 101), normalized(100))
+    return index
+
+
+def test_empty_index(tmp_path):
+    index = MmapVectorIndex(str(tmp_path), DIM)
+    assert len(index) == 0 and index.max_id() == 0
+    ids, similarities = index.search(normalized(1)[0], top_k=5)
+    assert len(ids) == 0 and len(similarities) == 0
+    assert not index.is_compatible()
+
+
+def test_search_matches_brute_force(index):
+    vectors = normalized(100)
+    query = normalized(1, seed=1)[0] * 3  # Normalized by search
+    ids, similarities = index.search(query, top_k=10)
+
+    expected = np.argsort(-(vectors @ (query / np.linalg.norm(query))), kind="stable")[:10] + 1
+    np.testing.assert_array_equal(ids, expected)
+    assert np.all(np.diff(similarities) <= 0)
+    found, scores = index.search(vectors[41], top_k=1)
+    assert found.tolist() == [42] and scores[0] == pytest.approx(1.0)
+
+
+def test_search_min_similarity_and_top_k(index):
+    query = normalized(1, seed=2)[0]
+    ids, similarities = index.search(query, top_k=1000, min_similarity=0.3)
+    assert len(ids) < 100 and np.all(similarities >= 0.3)
+    assert len(index.search(query, top_k=0)[0]) == 0
+
+
+def test_search_many_matches_search(index):
+    queries = normalized(5, seed=3)
+    for (ids, similarities), query in zip(index.search_many(queries, top_k=7, block_size=2), queries):
+        expected_ids, expected_similarities = index.search(query, top_k=7)
+        np.testing.assert_array_equal(ids, expected_ids)
+        np.testing.assert_allclose(similarities, expected_similarities, rtol=1e-6)
+
+
+def test_append_is_seen_by_other_processes(index, tmp_path):
+    reader = MmapVectorIndex(str(tmp_path), DIM)
+    assert len(reader) == 100
+
+    vectors = normalized(3, seed=4)
+    index.append(np.array([101, 102, 103]), vectors)
+    assert len(reader) == 103 and reader.max_id() == 103  # Remapped on the next access
+    assert reader.search(vectors[1], top_k=1)[0].tolist() == [102]
+
+
+def test_rebuild_keeps_head_and_replaces_files(index, tmp_path):
+    reader = MmapVectorIndex(str(tmp_path), DIM)
+    old_ids = reader.ids()
+
+    with index.file_lock(), index.rebuilding(keep=60) as write:
+        write(np.array([500, 501]), normalized(2, seed=5))
+
+    np.testing.assert_array_equal(old_ids[:5], np.arange(1, 6))  # Old mapping still readable
+    assert reader.ids().tolist() == list(range(1, 61)) + [500, 501]
+    assert reader.is_compatible()
+
+
+def test_partial_rows_dropped(index, tmp_path):
+    # Interrupted append: vector written, id not
+    with open(os.path.join(str(tmp_path), VECTORS_FILE), "ab") as f:
+        f.write(normalized(1, seed=6).tobytes() + b"\0\0")
+
+    assert len(index) == 100  # Complete rows only
+    with index.file_lock():
+        assert index.drop_partial_rows()
+        assert not index.drop_partial_rows()
+    assert os.path.getsize(os.path.join(str(tmp_path), VECTORS_FILE)) == 100 * DIM * 4
+    assert os.path.getsize(os.path.join(str(tmp_path), IDS_FILE)) == 100 * 8
+
+    index.append(np.array([101]), normalized(1, seed=7))
+    assert index.search(normalized(1, seed=7)[0], top_k=1)[0].tolist() == [101]  # Rows aligned again
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from rag_project.utils.mmr import mmr_select
+
+
+def unit(*values: float) -> np.ndarray:
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+QUERY = unit(1, 0, 0)
+# Relevance order 0, 1, 2, 3: row 1 is a near duplicate of row 0, rows 2 and 3 point elsewhere
+CANDIDATES = np.vstack([
+    unit(1, 0.05, 0),
+    unit(1, 0.1, 0),
+    unit(0.5, 1, 0),
+    unit(0.3, 0, 1),
+])
+
+
+def test_lambda_one_is_relevance_order():
+    rng = np.random.default_rng(0)
+    candidates = rng.standard_normal((30, 8)).astype(np.float32) * rng.uniform(0.1, 10, (30, 1))  # Any norm
+    query = rng.standard_normal(8).astype(np.float32)
+    normalized = candidates / np.linalg.norm(candidates, axis=1, keepdims=True)
+    expected = np.argsort(-(normalized @ query)).tolist()
+
+    assert mmr_select(query, candidates, k=10, diversity_lambda=1.0) == expected[:10]
+    assert mmr_select(QUERY, CANDIDATES, k=4, diversity_lambda=1.0) == [0, 1, 2, 3]
+
+
+def test_lambda_zero_maximizes_diversity():
+    selected = mmr_select(QUERY, CANDIDATES, k=3, diversity_lambda=0.0)
+    assert selected[0] == 0  # Most relevant first
+    assert 1 not in selected  # The near duplicate comes last
+    assert sorted(selected) == [0, 2, 3]
+
+
+def test_intermediate_lambda_demotes_near_duplicate():
+    assert mmr_select(QUERY, CANDIDATES, k=2, diversity_lambda=1.0) == [0, 1]
+    assert mmr_select(QUERY, CANDIDATES, k=2, diversity_lambda=0.5) == [0, 3]
+
+
+def test_duplicate_vectors_selected_once_each():
+    candidates = np.vstack([CANDIDATES[0]] * 3 + [CANDIDATES[2]])
+    selected = mmr_select(QUERY, candidates, k=4, diversity_lambda=0.3)
+    assert sorted(selected) == [0, 1, 2, 3]  # Every index once, even among identical rows
+    assert selected[:2] == [0, 3]  # The distinct row before the copies of the first one
+
+    identical = np.tile(CANDIDATES[0], (5, 1))
+    assert sorted(mmr_select(QUERY, identical, k=5, diversity_lambda=0.3)) == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.parametrize("diversity_lambda", [0.0, 0.5, 1.0])
+def test_k_larger_than_candidates(diversity_lambda):
+    selected = mmr_select(QUERY, CANDIDATES, k=10, diversity_lambda=diversity_lambda)
+    assert sorted(selected) == [0, 1, 2, 3]
+
+
+def test_nothing_to_select():
+    assert mmr_select(QUERY, CANDIDATES, k=0) == []
+    assert mmr_select(QUERY, np.empty((0, 3), dtype=np.float32), k=5) == []
+
+
+def test_relevance_overrides_query_similarity():
+    # Re-ranker order 3, 2, 1, 0: the query vector is not used for relevance any more
+    relevance = np.array([0.0, 0.3, 0.6, 1.0])
+    assert mmr_select(QUERY, CANDIDATES, k=4, diversity_lambda=1.0, relevance=relevance) == [3, 2, 1, 0]
+    assert mmr_select(QUERY, CANDIDATES, k=2, diversity_lambda=0.5, relevance=relevance)[0] == 3
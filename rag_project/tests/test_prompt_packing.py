@@ -0,0 +1,78 @@
+import re
+
+import pytest
+
+pytest.importorskip("tiktoken")
+pytest.importorskip("pydantic")
+
+from rag_project.domain.models import DocumentDomain  # noqa: E402
+from rag_project.utils import prompt_packing  # noqa: E402
+from rag_project.utils.prompt_packing import PromptPacker  # noqa: E402
+
+
+class WordEncoding:
+    """tiktoken.Encoding stub: one token per word with its leading whitespace, no BPE file to download."""
+
+    def encode(self, text, disallowed_special=()):
+        return re.findall(r"\s*\S+|\s+", text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+@pytest.fixture
+def packer(monkeypatch):
+    monkeypatch.setattr(prompt_packing, "get_encoding", lambda model: WordEncoding())
+    return PromptPacker(model="stub", min_doc_tokens=3)
+
+
+def doc(content_id: int, content: str, similarity: float = 0.5, score: float = None) -> DocumentDomain:
+    return DocumentDomain(id=content_id, content=content, similarity=similarity, score=score)
+
+
+def words(n: int, prefix: str = "w") -> str:
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def test_incoming_order_kept(packer):
+    # MMR / re-ranked order: neither similarity nor score sorted
+    docs = [doc(1, words(5), similarity=0.6), doc(2, words(5), similarity=0.9, score=0.1),
+            doc(3, words(5), similarity=0.7, score=0.8)]
+    packed = packer.pack(docs, budget=100)
+    assert [p.doc.id for p in packed] == [1, 2, 3]
+    assert not any(p.truncated for p in packed)
+
+
+def test_budget_counts_separators(packer):
+    docs = [doc(1, words(10)), doc(2, words(10))]
+    # Separator "\n\n" is one token between two documents
+    assert [p.doc.id for p in packer.pack(docs, budget=21)] == [1, 2]
+    packed = packer.pack(docs, budget=20)
+    assert [(p.doc.id, p.truncated) for p in packed] == [(1, False), (2, True)]
+    assert sum(p.tokens for p in packed) + packer.separator_tokens <= 20
+
+
+def test_first_doc_over_budget_truncated_at_sentence(packer):
+    content = "Une première phrase ici. Une deuxième phrase ici. Une troisième phrase qui ne tient pas."
+    packed = packer.pack([doc(1, content), doc(2, words(3))], budget=9)
+    assert len(packed) == 1  # Documents after the truncated one are left out
+    assert packed[0].truncated
+    assert packed[0].content == "Une première phrase ici. Une deuxième phrase ici."
+    assert packed[0].tokens <= 9
+
+
+def test_hard_cut_without_sentence_boundary(packer):
+    packed = packer.pack([doc(1, words(4)), doc(2, words(20, "x"))], budget=10)
+    assert packed[1].truncated
+    assert packed[1].content == words(5, "x")  # 10 - 4 - 1 separator
+    assert packer.count(packed[1].content) == packed[1].tokens
+
+
+def test_remainder_under_min_doc_tokens_dropped(packer):
+    packed = packer.pack([doc(1, words(8)), doc(2, words(20))], budget=10)
+    assert [p.doc.id for p in packed] == [1]  # 1 token left after the separator, min_doc_tokens 3
+
+
+def test_nothing_fits(packer):
+    assert packer.pack([doc(1, words(20))], budget=2) == []
+    assert packer.pack([], budget=100) == []
@@ -0,0 +1,266 @@
+import asyncio
+import re
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("tiktoken")
+pytest.importorskip("prometheus_client")
+
+from rag_project.api.sse import until_disconnected  # noqa: E402
+from rag_project.domain.models import DocumentDomain  # noqa: E402
+from rag_project.services.rag_service import RagContext, RagService  # noqa: E402
+from rag_project.services.reranker import CrossEncoderReranker  # noqa: E402
+from rag_project.utils import prompt_packing  # noqa: E402
+
+
+def unit(*values: float) -> np.ndarray:
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+QUERY = unit(1, 0, 0)
+# Bi-encoder order 0..5, cross-encoder score = content length: 1 and 2 are the best but near duplicates
+DOCUMENTS = [
+    (0, "a", unit(1, 0, 0)),
+    (1, "xxxxxx", unit(0.6, 0.8, 0)),
+    (2, "xxxxx", unit(0.6, 0.79, 0.05)),
+    (3, "xxxx", unit(0.6, -0.8, 0)),
+    (4, "xx", unit(0.5, 0, 0.9)),
+    (5, "b", unit(0.4, 0, -0.9)),
+]
+
+
+class WordEncoding:
+    def encode(self, text, disallowed_special=()):
+        return re.findall(r"\s*\S+|\s+", text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+class FakeCrossEncoder:
+    def __init__(self):
+        self.pairs = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.pairs.append(list(pairs))
+        return [float(len(content)) for _, content in pairs]
+
+
+class FakeBackend:
+    """Search backend stand-in: DOCUMENTS in bi-encoder order, the requested top_k recorded."""
+
+    def __init__(self):
+        self.top_ks = []
+
+    def rows(self, top_k, with_embeddings):
+        self.top_ks.append(top_k)
+        rows = []
+        for content_id, content, vector in DOCUMENTS[:top_k]:
+            row = {'id': content_id, 'content': content, 'similarity': float(vector @ QUERY)}
+            if with_embeddings:
+                row['embedding'] = vector
+            rows.append(row)
+        return rows
+
+    async def search(self, session, query_vector, top_k, filters=None, with_embeddings=False):
+        return self.rows(top_k, with_embeddings)
+
+    async def search_batch(self, session, query_vectors, top_k, filters=None, with_embeddings=False):
+        return [self.rows(top_k, with_embeddings) for _ in query_vectors]
+
+
+class FakeSession:
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class FakeBatcher:
+    class model:
+        @staticmethod
+        def encode(texts, batch_size=32, normalize_embeddings=False):
+            return np.vstack([QUERY for _ in texts])
+
+    async def embed(self, text):
+        return QUERY.tolist()
+
+
+@pytest.fixture
+def cross_encoder():
+    return FakeCrossEncoder()
+
+
+@pytest.fixture
+def service(monkeypatch, cross_encoder):
+    monkeypatch.setattr(prompt_packing, "get_encoding", lambda model: WordEncoding())
+    reranker = CrossEncoderReranker(cross_encoder, candidates=6, top_n=2, budget_ms=5000, max_workers=1)
+    service = RagService(
+        FakeBatcher(), session_factory=FakeSession, llm_client=object(), search_backend=FakeBackend(),
+        reranker=reranker, mmr_lambda=0.5, mmr_candidates=4
+    )
+    yield service
+    reranker.close()
+
+
+def test_rerank_sees_every_candidate_before_mmr(service, cross_encoder):
+    ctx = RagContext(question="question", query_vector=QUERY.tolist())
+    asyncio.run(service.search_similar_documents(None, ctx, top_k=3, min_k=1))
+
+    assert service.search_backend.top_ks == [6]  # max(top_k, MMR_CANDIDATES, RERANK_CANDIDATES)
+    assert len(cross_encoder.pairs[0]) == 6  # The whole candidate set is scored, not MMR's top_k
+    # Best cross-encoder score first, then the distinct 3 rather than its near duplicate 2, top_n kept
+    assert [doc.id for doc in ctx.docs] == [1, 3]
+    assert [doc.score for doc in ctx.docs] == [6.0, 4.0]
+
+
+def test_rerank_then_mmr_in_retrieve_batch(service, cross_encoder):
+    contexts = asyncio.run(service.retrieve_batch(["first question", "second question"], top_k=3))
+
+    assert [len(pairs) for pairs in cross_encoder.pairs] == [12]  # One predict for both questions
+    assert [[doc.id for doc in ctx.docs] for ctx in contexts] == [[1, 3], [1, 3]]
+
+
+def test_mmr_without_reranker_keeps_top_k(service):
+    service.reranker = None
+    ctx = RagContext(question="question", query_vector=QUERY.tolist())
+    asyncio.run(service.search_similar_documents(None, ctx, top_k=3, min_k=1))
+
+    assert service.search_backend.top_ks == [4]
+    assert len(ctx.docs) == 3
+    assert ctx.docs[0].id == 0  # Bi-encoder relevance when there are no scores
+
+
+class StalledLLMStream:
+    """OpenAI stream stand-in: two chunks, then no more until closed."""
+
+    def __init__(self):
+        self.closed = False
+
+    async def __aiter__(self):
+        for text in ("Bon", "jour"):
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+        await asyncio.sleep(3600)
+
+    async def close(self):
+        self.closed = True
+
+
+class StalledLLM:
+    def __init__(self):
+        self.streams = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.streams.append(StalledLLMStream())
+        return self.streams[-1]
+
+
+class RecordingAnswerCache:
+    def __init__(self):
+        self.stored = []
+
+    def lookup(self, query_vector, doc_ids):
+        return None
+
+    def store(self, query_vector, doc_ids, source_ids, answer, llm_seconds):
+        self.stored.append(answer)
+
+
+def test_disconnect_mid_stream_closes_the_llm_stream(service):
+    llm, answer_cache = StalledLLM(), RecordingAnswerCache()
+    service.client, service.answer_cache = llm, answer_cache
+    ctx = RagContext(question="question", query_vector=QUERY.tolist(), docs=[
+        DocumentDomain(id=1, content="Le contexte.", similarity=0.9)
+    ])
+    received = []
+
+    async def main():
+        async def is_disconnected():
+            return len(received) >= 2  # Client gone while the LLM stalls after two tokens
+
+        tokens = service.stream_answer(ctx)
+        try:
+            async for text in until_disconnected(tokens, is_disconnected, poll_seconds=0.02):
+                received.append(text)
+        finally:
+            await tokens.aclose()
+
+    asyncio.run(asyncio.wait_for(main(), 5))
+    assert received == ["Bon", "jour"]
+    assert llm.streams[0].closed  # Generation stopped as soon as the client left
+    assert answer_cache.stored == []  # Partial answers are not cached
+
+
+class EchoBackend:
+    """One document per question, id = first coordinate of its vector; yields to the loop mid search."""
+
+    async def search(self, session, query_vector, top_k, filters=None, with_embeddings=False):
+        await asyncio.sleep(0.01 * (3 - query_vector[0]))  # Later questions finish first
+        return [{'id': int(query_vector[0]), 'content': f"doc {query_vector[0]}", 'similarity': 0.9}]
+
+
+def test_concurrent_requests_share_no_state(service):
+    service.search_backend, service.reranker, service.mmr_lambda = EchoBackend(), None, 1.0
+    state_before = dict(vars(service))
+    contexts = [RagContext(question=f"question {n}", query_vector=[float(n), 0.0, 0.0]) for n in range(3)]
+
+    async def main():
+        await asyncio.gather(*(
+            service.search_similar_documents(None, ctx, top_k=1, min_k=1) for ctx in contexts
+        ))
+
+    asyncio.run(main())
+    assert [[doc.id for doc in ctx.docs] for ctx in contexts] == [[0], [1], [2]]
+    assert vars(service) == state_before  # Per request state lives in the RagContext only
+
+
+def test_injected_clients_are_reused(monkeypatch):
+    monkeypatch.setattr(prompt_packing, "get_encoding", lambda model: WordEncoding())
+    llm_client = object()
+    first = RagService(FakeBatcher(), llm_client=llm_client, search_backend=FakeBackend())
+    second = RagService(FakeBatcher(), llm_client=llm_client, search_backend=FakeBackend())
+    assert first.client is second.client is llm_client
+
+
+class QuestionLLM:
+    """Answers with the question of the prompt after a delay shorter for later questions, fails on 'broken'."""
+
+    def __init__(self):
+        self.prompts = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages):
+        prompt = messages[0]["content"]
+        self.prompts.append(prompt)
+        question = next(q for q in ("first question", "second question", "broken question") if q in prompt)
+        await asyncio.sleep(0.05 if question == "first question" else 0.01)
+        if question == "broken question":
+            raise RuntimeError("LLM unavailable")
+        message = SimpleNamespace(content=f"answer to {question}")
+        return SimpleNamespace(usage=None, choices=[SimpleNamespace(message=message)])
+
+
+def test_ask_batch_keeps_question_order(service):
+    service.client = llm = QuestionLLM()
+    questions = ["first question", "broken question", "bad", "second question", "first question"]
+    answers = asyncio.run(service.answer_questions(questions, top_k=3))
+
+    assert [answer.question for answer in answers] == questions  # Order kept, though first answered last
+    assert answers[0].answer == answers[4].answer == "answer to first question"
+    assert answers[0].documents == [1, 3]
+    assert answers[3].answer == "answer to second question"
+    assert answers[1].answer is None and "LLM unavailable" in answers[1].error  # The others still answered
+    assert "not valid" in answers[2].error
+    # Repeated question sent once, the failing one retried by query_llm_async
+    assert sum("first question" in prompt for prompt in llm.prompts) == 1
+    assert sum("broken question" in prompt for prompt in llm.prompts) == 3
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("pydantic")
+pytest.importorskip("prometheus_client")
+
+from rag_project.domain.models import DocumentDomain  # noqa: E402
+from rag_project.services.reranker import CrossEncoderReranker  # noqa: E402
+
+
+class FakeCrossEncoder:
+    """Score = length of the chunk. predict blocks while release is not set."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.release.set()
+        self.calls = 0
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.calls += 1
+        self.release.wait(5)
+        if any(content == "boom" for _, content in pairs):
+            raise RuntimeError("predict failed")
+        return [float(len(content)) for _, content in pairs]
+
+
+def docs(*contents: str):
+    return [DocumentDomain(id=i, content=content, similarity=1 - i / 10) for i, content in enumerate(contents)]
+
+
+@pytest.fixture
+def model():
+    return FakeCrossEncoder()
+
+
+@pytest.fixture
+def reranker(model):
+    reranker = CrossEncoderReranker(model, top_n=2, budget_ms=50, max_workers=1)
+    yield reranker
+    model.release.set()
+    reranker.close()
+
+
+def test_rerank_orders_by_score_and_caches(reranker, model):
+    async def main():
+        ranked = await reranker.rerank("question", docs("a", "ccc", "bb"))
+        assert [doc.content for doc in ranked] == ["ccc", "bb"]
+        assert ranked[0].score == 3.0
+        await reranker.rerank("  Question ", docs("a", "ccc", "bb"))  # Same normalized question
+
+    asyncio.run(main())
+    assert model.calls == 1
+
+
+def test_overdue_predict_skips_new_ones(reranker, model):
+    async def main():
+        model.release.clear()
+        kept = await reranker.rerank("slow", docs("a", "ccc", "bb"))
+        assert [doc.content for doc in kept] == ["a", "ccc"]  # Bi-encoder order
+        assert reranker.busy
+
+        # Not queued behind the overdue predict
+        kept = await reranker.rerank("other", docs("dddd", "e"))
+        assert [doc.content for doc in kept] == ["dddd", "e"]
+        assert model.calls == 1
+
+        model.release.set()
+        while reranker.busy:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)  # Late scores stored by the done callback, nothing was queued behind
+        assert model.calls == 1
+
+        ranked = await reranker.rerank("slow", docs("a", "ccc", "bb"))  # Scored by the late predict
+        assert [doc.content for doc in ranked] == ["ccc", "bb"]
+        assert model.calls == 1
+
+        ranked = await reranker.rerank("other", docs("e", "dddd"))
+        assert [doc.content for doc in ranked] == ["dddd", "e"]
+        assert model.calls == 2
+
+    asyncio.run(main())
+
+
+def test_predict_error_keeps_bi_encoder_order(reranker, model):
+    kept = asyncio.run(reranker.rerank("question", docs("a", "boom", "ccc")))
+    assert [doc.content for doc in kept] == ["a", "boom"]
+    assert all(doc.score is None for doc in kept)
+    assert not reranker.busy
+
+
+def test_score_cache_bounded(model):
+    reranker = CrossEncoderReranker(model, top_n=3, cache_size=2, max_workers=1)
+    try:
+        asyncio.run(reranker.rerank("question", docs("a", "bb", "ccc")))
+        assert len(reranker._scores) == 2  # Least recently stored pair evicted
+        asyncio.run(reranker.rerank("question", docs("a", "bb", "ccc")))
+        assert model.calls == 2
+    finally:
+        reranker.close()
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("bs4")
+
+from rag_project.config import HTTP_TIMEOUT, HTTP_USER_AGENT  # noqa: E402
+from rag_project.exceptions import ScraperError  # noqa: E402
+from rag_project.services.scraping_service import WebScraper, build_http_client  # noqa: E402
+
+
+class SlowSite:
+    """httpx transport: every response takes a little while, concurrent requests counted per host."""
+
+    def __init__(self):
+        self.in_flight = {}
+        self.max_in_flight = {}
+
+    async def __call__(self, request):
+        host = request.url.host
+        self.in_flight[host] = self.in_flight.get(host, 0) + 1
+        self.max_in_flight[host] = max(self.max_in_flight.get(host, 0), self.in_flight[host])
+        await asyncio.sleep(0.01)
+        self.in_flight[host] -= 1
+        if request.url.path == "/missing":
+            return httpx.Response(404)
+        return httpx.Response(200, headers={"Content-Type": "text/html"}, content=b"<p>Page</p>")
+
+
+def scraper(site, **kwargs) -> WebScraper:
+    return WebScraper(client=httpx.AsyncClient(transport=httpx.MockTransport(site)), **kwargs)
+
+
+def test_per_host_limit_and_eviction():
+    site = SlowSite()
+
+    async def main():
+        web_scraper = scraper(site, max_concurrency=10, max_per_host=2)
+        try:
+            urls = [f"https://{host}.example/{n}" for host in ("a", "b", "c") for n in range(5)]
+            await asyncio.gather(*(web_scraper.fetch(url) for url in urls))
+            with pytest.raises(httpx.HTTPStatusError):
+                await web_scraper.fetch("https://d.example/missing")
+            return web_scraper._host_limits
+        finally:
+            await web_scraper.aclose()
+
+    host_limits = asyncio.run(main())
+    assert site.max_in_flight == {"a.example": 2, "b.example": 2, "c.example": 2, "d.example": 1}
+    assert host_limits == {}  # No semaphore left behind for the hosts done with, failed requests included
+
+
+def test_invalid_scheme():
+    async def main():
+        web_scraper = scraper(SlowSite())
+        try:
+            await web_scraper.fetch("ftp://a.example/file")
+        finally:
+            await web_scraper.aclose()
+
+    with pytest.raises(ScraperError):
+        asyncio.run(main())
+
+
+def test_one_pooled_client_shared_by_scrapers():
+    client = build_http_client()
+    try:
+        assert client.headers["User-Agent"] == HTTP_USER_AGENT
+        assert client.follow_redirects
+        assert client.timeout.read == HTTP_TIMEOUT
+        assert WebScraper(client=client).client is WebScraper(client=client).client is client
+    finally:
+        asyncio.run(client.aclose())
+
+
+def test_max_bytes_cap():
+    served = []
+
+    async def stream(size: int):
+        for _ in range(size // 100):
+            served.append(100)
+            yield b"x" * 100
+
+    def site(request):
+        size = int(request.url.path.strip("/"))
+        if request.url.query == b"length":
+            return httpx.Response(200, headers={"Content-Type": "text/html", "Content-Length": str(size)},
+                                  content=b"x" * size)
+        return httpx.Response(200, headers={"Content-Type": "text/html"}, content=stream(size))  # Chunked
+
+    async def fetch(url: str):
+        web_scraper = scraper(site, max_bytes=1000)
+        try:
+            return await web_scraper.fetch(url)
+        finally:
+            await web_scraper.aclose()
+
+    assert len(asyncio.run(fetch("https://a.example/1000?length")).content) == 1000
+    assert len(asyncio.run(fetch("https://a.example/1000")).content) == 1000
+    with pytest.raises(ScraperError, match="too large"):  # Announced size, rejected before reading the body
+        asyncio.run(fetch("https://a.example/1001?length"))
+
+    served.clear()
+    with pytest.raises(ScraperError, match="larger than 1000"):
+        asyncio.run(fetch("https://a.example/100000"))
+    assert sum(served) <= 1100  # Reading stopped once over the cap
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+httpx = pytest.importorskip("httpx")
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from rag_project.db.session_manager import async_db_session_manager  # noqa: E402
+from rag_project.exceptions import DataBaseError, RagError, TimeOutError, UnexpectedError  # noqa: E402
+
+
+class Session:
+    def __init__(self, log):
+        self.log = log
+
+    async def commit(self):
+        self.log.append("commit")
+
+    async def rollback(self):
+        self.log.append("rollback")
+
+    async def close(self):
+        self.log.append("close")
+
+
+class Service:
+    def __init__(self):
+        self.log = []
+
+    def session_factory(self):
+        self.log.append("open")
+        return Session(self.log)
+
+    @async_db_session_manager
+    async def work(self, session, result=None, error=None):
+        await asyncio.sleep(0)  # Awaited inside the session
+        self.log.append("work")
+        if error is not None:
+            raise error
+        return result
+
+
+def test_commit_then_close():
+    service = Service()
+    assert asyncio.run(service.work(result=42)) == 42
+    assert service.log == ["open", "work", "commit", "close"]
+
+
+@pytest.mark.parametrize("error, translated", [
+    (OperationalError("SELECT 1", {}, Exception("connection lost")), DataBaseError),
+    (RagError("Not enough information to answer", exc_info=False), RagError),
+    (httpx.ReadTimeout("read timed out"), TimeOutError),
+    (ValueError("bad value"), UnexpectedError),
+])
+def test_errors_rolled_back_and_translated(error, translated):
+    service = Service()
+    with pytest.raises(translated) as raised:
+        asyncio.run(service.work(error=error))
+    assert raised.value.__cause__ is error
+    assert service.log == ["open", "work", "rollback", "close"]
+
+
+def test_one_session_per_call():
+    service = Service()
+
+    async def main():
+        return await asyncio.gather(*(service.work(result=n) for n in range(3)))
+
+    assert asyncio.run(main()) == [0, 1, 2]
+    assert service.log.count("open") == service.log.count("close") == 3
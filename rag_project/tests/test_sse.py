@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+from rag_project.api.sse import sse_event, until_disconnected  # noqa: E402
+
+
+class Client:
+    def __init__(self, disconnect_after: float = None):
+        self.disconnect_at = None if disconnect_after is None else time.monotonic() + disconnect_after
+        self.checks = 0
+
+    async def is_disconnected(self) -> bool:
+        self.checks += 1
+        return self.disconnect_at is not None and time.monotonic() >= self.disconnect_at
+
+
+class Upstream:
+    """Async generator stand-in: a few tokens, then nothing (stalled) unless stall is False."""
+
+    def __init__(self, tokens, stall=True):
+        self.tokens = list(tokens)
+        self.stall = stall
+        self.closed = False
+
+    async def generate(self):
+        try:
+            for token in self.tokens:
+                yield token
+            if self.stall:
+                await asyncio.sleep(3600)
+        finally:
+            self.closed = True
+
+
+def collect(upstream: Upstream, client: Client, poll_seconds: float = 0.02):
+    async def main():
+        tokens = upstream.generate()
+        received = []
+        try:
+            async for text in until_disconnected(tokens, client.is_disconnected, poll_seconds):
+                received.append(text)
+        finally:
+            await tokens.aclose()
+        return received
+
+    return asyncio.run(asyncio.wait_for(main(), 5))
+
+
+def test_all_tokens_while_connected():
+    upstream = Upstream(["a", "b", "c"], stall=False)
+    assert collect(upstream, Client()) == ["a", "b", "c"]
+    assert upstream.closed
+
+
+def test_disconnect_noticed_while_upstream_stalls():
+    upstream = Upstream(["a", "b"])
+    client = Client(disconnect_after=0.1)
+    started = time.monotonic()
+
+    assert collect(upstream, client) == ["a", "b"]
+    assert time.monotonic() - started < 1  # Not waiting for a token that never comes
+    assert upstream.closed
+    assert client.checks > 2  # Polled while no token arrived
+
+
+def test_upstream_error_propagates():
+    async def failing():
+        yield "a"
+        raise RuntimeError("LLM gone")
+
+    async def main():
+        return [text async for text in until_disconnected(failing(), Client().is_disconnected, 0.02)]
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(main())
+
+
+def test_sse_event_framing():
+    assert sse_event("token", {"text": "a\nb"}) == 'event: token\ndata: {"text": "a\\nb"}\n\n'
@@ -0,0 +1,98 @@
+import re
+
+import pytest
+
+from rag_project.utils.text_processing import TokenChunker, iter_sentences, sentence_prefix
+
+WORD = re.compile(r"\S+")
+
+
+class WordTokenizer:
+    """Tokenizer stub: one token per whitespace separated word, [CLS] / [SEP] as special tokens."""
+
+    def num_special_tokens_to_add(self) -> int:
+        return 2
+
+    def __call__(self, texts, add_special_tokens=False, verbose=False, return_offsets_mapping=False):
+        if isinstance(texts, str):
+            offsets = [match.span() for match in WORD.finditer(texts)]
+            encoded = {"input_ids": list(range(len(offsets)))}
+            if return_offsets_mapping:
+                encoded["offset_mapping"] = offsets
+            return encoded
+        return {"input_ids": [list(range(len(WORD.findall(text)))) for text in texts]}
+
+
+def n_tokens(text: str) -> int:
+    return len(WORD.findall(text))
+
+
+def sentence(i: int, words: int = 4) -> str:
+    return " ".join(f"s{i}w{j}" for j in range(words - 1)) + f" s{i}end."
+
+
+@pytest.fixture
+def chunker():
+    return TokenChunker(WordTokenizer(), max_seq_length=66, overlap_tokens=4)
+
+
+@pytest.mark.parametrize("text", ["", "   ", "\n\n \n"])
+def test_empty_text_gives_no_chunk(chunker, text):
+    assert list(chunker(text, max_tokens=10)) == []
+
+
+def test_short_text_is_one_chunk(chunker):
+    text = "Une phrase courte. Une autre !"
+    assert list(chunker(text, max_tokens=10)) == ["Une phrase courte. Une autre !"]
+
+
+def test_chunks_stay_within_max_tokens(chunker):
+    text = " ".join(sentence(i, words=3 + i % 4) for i in range(40))
+    chunks = list(chunker(text, max_tokens=12))
+    assert len(chunks) > 1
+    assert all(n_tokens(chunk) <= 12 for chunk in chunks)
+
+
+def test_max_tokens_capped_by_model_length(chunker):
+    # max_seq_length 66 minus the 2 special tokens
+    text = " ".join(sentence(i, words=5) for i in range(60))
+    chunks = list(chunker(text, max_tokens=1000))
+    assert max(n_tokens(chunk) for chunk in chunks) <= 64
+
+
+def test_consecutive_chunks_overlap_on_whole_sentences(chunker):
+    sentences = [sentence(i) for i in range(12)]
+    chunks = list(chunker(" ".join(sentences), max_tokens=12))
+
+    for previous, current in zip(chunks, chunks[1:]):
+        shared = [s for s in iter_sentences(previous) if s in list(iter_sentences(current))]
+        assert shared, "no overlap"
+        assert sum(n_tokens(s) for s in shared) <= 4  # overlap_tokens
+        assert current.startswith(" ".join(shared))  # Tail of the previous chunk, head of the next one
+
+
+def test_every_sentence_is_kept(chunker):
+    sentences = [sentence(i, words=2 + i % 5) for i in range(30)]
+    chunks = list(chunker(" ".join(sentences), max_tokens=10))
+    assert [s for s in sentences if not any(s in chunk for chunk in chunks)] == []
+
+
+def test_overlap_never_exceeds_half_the_chunk():
+    chunker = TokenChunker(WordTokenizer(), max_seq_length=66, overlap_tokens=50)
+    chunks = list(chunker(" ".join(sentence(i) for i in range(10)), max_tokens=8))
+    assert all(n_tokens(chunk) <= 8 for chunk in chunks)
+    assert len(chunks) >= 5  # Progress: at most 4 tokens carried over per chunk
+
+
+def test_long_sentence_cut_on_token_boundaries(chunker):
+    long_sentence = " ".join(f"w{i}" for i in range(25)) + "."
+    chunks = list(chunker(long_sentence, max_tokens=10))
+    assert [n_tokens(chunk) for chunk in chunks] == [10, 10, 5]
+    assert " ".join(chunks) == long_sentence
+
+
+def test_sentence_prefix():
+    assert sentence_prefix("Première phrase. Deuxième ! Troisième coupée") == "Première phrase. Deuxième !"
+    assert sentence_prefix("Paragraphe\n\nsuite") == "Paragraphe"
+    assert sentence_prefix("Aucune fin de phrase") == ""
+    assert sentence_prefix("") == ""
@@ -0,0 +1,62 @@
+import pytest
+
+from rag_project.config import HNSW_EF_CONSTRUCTION, HNSW_M, IVFFLAT_REBUILD_GROWTH
+from rag_project.db.vector_index import (
+    IVFFLAT_MIN_LISTS, IndexSpec, IndexState, default_spec, ivfflat_lists, ivfflat_probes, rebuild_reason
+)
+
+
+@pytest.mark.parametrize("rows, lists", [
+    (0, IVFFLAT_MIN_LISTS),
+    (5_000, IVFFLAT_MIN_LISTS),  # rows / 1000 below the minimum
+    (50_000, 50),
+    (1_000_000, 1000),
+    (4_000_000, 2000),  # sqrt(rows) above 1M
+])
+def test_ivfflat_lists(rows, lists):
+    assert ivfflat_lists(rows) == lists
+    spec = IndexSpec.for_rows(rows, "ivfflat")
+    assert spec.options == {"lists": lists}
+    assert spec.rows == rows
+
+
+def test_ivfflat_probes():
+    assert IndexSpec.for_rows(100_000, "ivfflat").search_settings() == {"ivfflat.probes": 10}
+    assert ivfflat_probes(1) == 1
+    assert ivfflat_probes(2000) == 45
+
+
+@pytest.mark.parametrize("rows", [0, 10_000, 10_000_000])
+def test_hnsw_options_do_not_depend_on_rows(rows):
+    spec = IndexSpec.for_rows(rows, "hnsw")
+    assert spec.options == {"m": HNSW_M, "ef_construction": HNSW_EF_CONSTRUCTION}
+
+
+def test_unknown_method_or_storage():
+    with pytest.raises(ValueError):
+        IndexSpec.for_rows(1000, "flat")
+    with pytest.raises(ValueError):
+        IndexSpec.for_rows(1000, "hnsw", "int8")
+
+
+def test_default_spec_is_plain_ivfflat():
+    spec = default_spec(20_000)
+    assert (spec.method, spec.storage, spec.options) == ("ivfflat", "vector", {"lists": 20})
+
+
+def test_create_sql():
+    assert IndexSpec.for_rows(0, "hnsw", "halfvec").create_sql(concurrently=True) == (
+        "CREATE INDEX CONCURRENTLY ix_embedding_cosine ON contents USING hnsw "
+        f"((embedding::halfvec(384)) halfvec_cosine_ops) WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})"
+    )
+
+
+def test_ivfflat_rebuilt_once_grown():
+    spec = IndexSpec.for_rows(200_000, "ivfflat")
+    grown = 50_000 * IVFFLAT_REBUILD_GROWTH
+    assert rebuild_reason(IndexState("ivfflat", {"lists": 50}, True, 50_000, grown - 1), spec) is None
+    assert rebuild_reason(IndexState("ivfflat", {"lists": 50}, True, 50_000, grown), spec) is not None
+    assert rebuild_reason(None, spec) == "missing"
+    assert rebuild_reason(IndexState("hnsw", {}, True, None, 0), spec) == "hnsw -> ivfflat"
+    assert rebuild_reason(IndexState("ivfflat", {}, False, None, 0), spec) == "invalid"
+    assert IndexState("ivfflat", {}, True, None, 0).option("lists") == 100  # pgvector default
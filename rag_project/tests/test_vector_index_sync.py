@@ -0,0 +1,206 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("pgvector")
+
+from rag_project.db.mmap_index import MmapVectorIndex  # noqa: E402
+from rag_project.services import search_backend  # noqa: E402
+from rag_project.services.search_backend import MmapSearchBackend, agreeing_rows, sync_vector_index  # noqa: E402
+
+DIM = 4
+
+
+def embedding(content_id: int) -> np.ndarray:
+    vector = np.random.default_rng(content_id).standard_normal(DIM).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeContentCRUD:
+    """contents rows of ROWS, the id -> embedding table the tests set up."""
+    ROWS = {}
+    fetched = 0
+
+    def __init__(self, session):
+        pass
+
+    async def count_up_to(self, max_id):
+        return sum(1 for content_id in self.ROWS if content_id <= max_id)
+
+    async def iter_ids(self, up_to, batch_rows=3):
+        ids = sorted(content_id for content_id in self.ROWS if content_id <= up_to)
+        for start in range(0, len(ids), batch_rows):
+            yield np.array(ids[start:start + batch_rows], dtype=np.int64)
+
+    async def iter_embeddings(self, dim, after_id=0, batch_rows=3):
+        ids = sorted(content_id for content_id in self.ROWS if content_id > after_id)
+        for start in range(0, len(ids), batch_rows):
+            batch = ids[start:start + batch_rows]
+            FakeContentCRUD.fetched += len(batch)
+            yield np.array(batch, dtype=np.int64), np.vstack([self.ROWS[content_id] for content_id in batch])
+
+    async def get_contents(self, ids, filters=None, with_embeddings=False):
+        return {content_id: {'id': content_id, 'content': f"chunk {content_id}"} for content_id in ids
+                if content_id in self.ROWS}
+
+
+@asynccontextmanager
+async def fake_session():
+    yield None
+
+
+@pytest.fixture
+def postgres(monkeypatch):
+    monkeypatch.setattr(search_backend, "ContentCRUD", FakeContentCRUD)
+    FakeContentCRUD.ROWS = {content_id: embedding(content_id) for content_id in range(1, 21)}
+    FakeContentCRUD.fetched = 0
+    return FakeContentCRUD.ROWS
+
+
+def sync(index):
+    FakeContentCRUD.fetched = 0
+    asyncio.run(sync_vector_index(index, session_factory=fake_session))
+    return FakeContentCRUD.fetched
+
+
+def assert_in_sync(index, rows):
+    assert index.ids().tolist() == sorted(rows)
+    for content_id in rows:
+        assert index.search(rows[content_id], top_k=1)[0].tolist() == [content_id]
+
+
+def test_first_sync_builds_the_copy(postgres, tmp_path):
+    index = MmapVectorIndex(str(tmp_path), DIM)
+    assert sync(index) == 20
+    assert_in_sync(index, postgres)
+
+
+def test_new_rows_appended(postgres, tmp_path):
+    index = MmapVectorIndex(str(tmp_path), DIM)
+    sync(index)
+    postgres.update({content_id: embedding(content_id) for content_id in (21, 22)})
+    assert sync(index) == 2
+    assert_in_sync(index, postgres)
+
+
+def test_rolled_back_tail_dropped(postgres, tmp_path):
+    index = MmapVectorIndex(str(tmp_path), DIM)
+    sync(index)
+    # Tail of the copy that Postgres no longer has
+    index.append(np.array([21, 22]), np.vstack([embedding(21), embedding(22)]))
+    postgres[23] = embedding(23)
+
+    assert sync(index) == 1  # Only the row after the matching head
+    assert_in_sync(index, postgres)
+
+
+def test_divergence_resyncs_from_first_mismatch(postgres, tmp_path):
+    index = MmapVectorIndex(str(tmp_path), DIM)
+    sync(index)
+    del postgres[15]
+
+    assert sync(index) == 5  # Rows 16..20
+    assert_in_sync(index, postgres)
+
+
+def test_other_dim_rebuilt(postgres, tmp_path):
+    index = MmapVectorIndex(str(tmp_path), DIM)
+    with index.file_lock(), index.rebuilding() as write:
+        write(np.array([1]), embedding(1)[None])
+    (tmp_path / "meta.json").write_text('{"dim": 5}')
+
+    assert sync(index) == 20
+    assert_in_sync(index, postgres)
+
+
+def test_agreeing_rows(postgres):
+    crud = FakeContentCRUD(None)
+
+    def agreeing(ids):
+        return asyncio.run(agreeing_rows(crud, np.array(ids, dtype=np.int64)))
+
+    assert agreeing([]) == 0
+    assert agreeing(list(range(1, 21))) == 20
+    assert agreeing([1, 2, 3, 30]) == 3
+    assert agreeing([1, 2, 4, 5]) == 2
+    assert agreeing([2, 3]) == 0
+
+
+def test_row_copied_by_a_sync_before_its_append_kept_once(postgres, tmp_path):
+    index = MmapVectorIndex(str(tmp_path), DIM)
+    sync(index)
+    # Committed by a worker, copied by the startup sync of another process before the worker appends it
+    postgres[21] = embedding(21)
+    assert sync(index) == 1
+    index.append(np.array([21, 22]), np.vstack([embedding(21), embedding(22)]))
+
+    assert index.ids().tolist() == list(range(1, 23))
+
+
+def test_sync_waits_for_the_lock_off_the_event_loop(postgres, tmp_path):
+    index = MmapVectorIndex(str(tmp_path), DIM)
+    locked, release = threading.Event(), threading.Event()
+
+    def other_process():
+        with index.file_lock():
+            locked.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=other_process)
+    holder.start()
+    locked.wait(5)
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticking = asyncio.create_task(ticker())
+        syncing = asyncio.create_task(sync_vector_index(index, session_factory=fake_session))
+        await asyncio.sleep(0.2)
+        ticks_while_locked = ticks
+        release.set()
+        await syncing
+        ticking.cancel()
+        return ticks_while_locked
+
+    try:
+        assert asyncio.run(main()) > 5  # The loop kept running while the lock was held elsewhere
+    finally:
+        release.set()
+        holder.join()
+    assert_in_sync(index, postgres)
+
+
+def test_mmap_search_runs_off_the_event_loop(postgres, tmp_path):
+    index = MmapVectorIndex(str(tmp_path), DIM)
+    sync(index)
+    threads = []
+    search, search_many = index.search, index.search_many
+
+    def recording(method):
+        def wrapper(*args, **kwargs):
+            threads.append(threading.current_thread())
+            return method(*args, **kwargs)
+        return wrapper
+
+    index.search, index.search_many = recording(search), recording(search_many)
+    backend = MmapSearchBackend(index)
+
+    async def main():
+        single = await backend.search(None, postgres[7].tolist(), top_k=2, min_similarity=-1.0)
+        batch = await backend.search_batch(None, np.vstack([postgres[3], postgres[9]]), top_k=1, min_similarity=-1.0)
+        return single, batch
+
+    single, batch = asyncio.run(main())
+    assert single[0]['id'] == 7 and single[0]['similarity'] == pytest.approx(1.0)
+    assert [[document['id'] for document in documents] for documents in batch] == [[3], [9]]
+    assert len(threads) == 2 and threading.main_thread() not in threads
@@ -0,0 +1,14 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from rag_project.config import ENCODE_MAX_WORKERS
+
+# Bounded pool for CPU bound work: torch releases the GIL during the forward pass,
+# more threads than cores only adds contention
+cpu_executor = ThreadPoolExecutor(max_workers=ENCODE_MAX_WORKERS, thread_name_prefix="encode")
+
+
+async def run_cpu_bound(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor, functools.partial(fn, *args, **kwargs))
@@ -0,0 +1,131 @@
+"""
+Text extraction from HTML pages, selected with HTML_PARSER.
+
+html5lib: BeautifulSoup with the html5lib tree builder, pure Python (reference, slowest)
+lxml: libxml2 parser, C (default)
+selectolax: lexbor parser, C (optional dependency, not in requirements.txt)
+
+Every backend removes the same tags, then applies the same whitespace normalization,
+length filter and case-insensitive dedup to the text nodes of the page.
+"""
+import re
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urljoin
+
+from rag_project.exceptions import ScraperError
+
+REMOVED_TAGS = ("script", "style", "nav", "footer", "header", "aside", "form", "noscript")
+MIN_TEXT_LENGTH = 15  # Shorter texts are likely noise (menus, buttons, dates)
+
+_XML_DECLARATION = re.compile(r"^\s*<\?xml[^>]*\?>")
+
+
+def clean_texts(strings: Iterable[str]) -> str:
+    texts = []
+    seen = set()
+    for text in strings:
+        text = " ".join(text.split())  # Normalize whitespace
+        if len(text) < MIN_TEXT_LENGTH:
+            continue
+        key = text.lower()
+        if key in seen:  # Avoid exact duplicates (case-insensitive)
+            continue
+        seen.add(key)
+        texts.append(text)
+    return "\n\n".join(texts)
+
+
+def decode_html(html: bytes, encoding: Optional[str] = None) -> str:
+    # Same detection as BeautifulSoup: declared (HTTP header) encoding, then BOM / <meta charset>, then guesses
+    from bs4.dammit import UnicodeDammit
+
+    markup = UnicodeDammit(html, [encoding] if encoding else [], is_html=True).unicode_markup or ""
+    # lxml rejects str input with an encoding declaration
+    return _XML_DECLARATION.sub("", markup, count=1)
+
+
+def extract_html5lib(html: bytes, encoding: Optional[str] = None) -> str:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html5lib", from_encoding=encoding)
+    for tag in soup(list(REMOVED_TAGS)):
+        tag.decompose()
+    return clean_texts(soup.stripped_strings)
+
+
+def extract_lxml(html: bytes, encoding: Optional[str] = None) -> str:
+    from lxml import etree, html as lxml_html
+
+    markup = decode_html(html, encoding)
+    if not markup.strip():
+        return ""
+    parser = lxml_html.HTMLParser(remove_comments=True, remove_pis=True)
+    try:
+        root = lxml_html.document_fromstring(markup, parser=parser)
+    except etree.ParserError:  # Nothing but whitespace / comments
+        return ""
+    # The tail is the text following the tag, it is kept
+    etree.strip_elements(root, *REMOVED_TAGS, with_tail=False)
+    return clean_texts(root.itertext())
+
+
+def _selectolax_strings(root) -> Iterator[str]:
+    for node in root.traverse(include_text=True):
+        if node.tag == "-text":
+            yield node.text_content
+
+
+def extract_selectolax(html: bytes, encoding: Optional[str] = None) -> str:
+    try:
+        from selectolax.lexbor import LexborHTMLParser
+    except ImportError as e:
+        raise ScraperError("HTML_PARSER=selectolax requires the selectolax package") from e
+
+    tree = LexborHTMLParser(decode_html(html, encoding))
+    tree.strip_tags(list(REMOVED_TAGS))
+    if tree.root is None:
+        return ""
+    return clean_texts(_selectolax_strings(tree.root))
+
+
+def extract_links(html: bytes, encoding: Optional[str], base_url: str) -> List[str]:
+    """Absolute href of the <a> tags (navigation included), rel=nofollow and <meta name=robots nofollow> excluded."""
+    from lxml import etree, html as lxml_html
+
+    markup = decode_html(html, encoding)
+    if not markup.strip():
+        return []
+    try:
+        root = lxml_html.document_fromstring(markup)
+    except etree.ParserError:
+        return []
+
+    if any("nofollow" in content.lower() for content in root.xpath("//meta[@name='robots']/@content")):
+        return []
+    base = root.xpath("//base/@href")
+    if base:
+        base_url = urljoin(base_url, base[0].strip())
+
+    links = []
+    for anchor in root.iter("a"):
+        href = anchor.get("href")
+        if href and "nofollow" not in (anchor.get("rel") or "").lower().split():
+            try:
+                links.append(urljoin(base_url, href.strip()))
+            except ValueError:  # Malformed, e.g. unbalanced IPv6 brackets
+                continue
+    return links
+
+
+EXTRACTORS: Dict[str, Callable[[bytes, Optional[str]], str]] = {
+    "html5lib": extract_html5lib,
+    "lxml": extract_lxml,
+    "selectolax": extract_selectolax,
+}
+
+
+def get_extractor(parser: str) -> Callable[[bytes, Optional[str]], str]:
+    try:
+        return EXTRACTORS[parser]
+    except KeyError:
+        raise ScraperError(f"Unknown HTML parser {parser}, expected one of {', '.join(EXTRACTORS)}")
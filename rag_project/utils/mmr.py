@@ -0,0 +1,38 @@
+from typing import List, Optional
+
+import numpy as np
+
+
+def mmr_select(query: np.ndarray, candidates: np.ndarray, k: int, diversity_lambda: float = 0.5,
+               relevance: Optional[np.ndarray] = None) -> List[int]:
+    """
+    Maximal marginal relevance: indexes of k rows of candidates, in selection order. Each step takes the row
+    maximizing lambda * sim(query, row) - (1 - lambda) * max sim(row, selected rows).
+    lambda 1: plain similarity order, 0: diversity only. Cosine similarities, vectors normalized here.
+    relevance replaces sim(query, row) when given, e.g. re-ranker scores scaled to [0, 1].
+    """
+    candidates = np.asarray(candidates, dtype=np.float32)
+    n = len(candidates)
+    k = min(k, n)
+    if k <= 0:
+        return []
+
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query, dtype=np.float32)
+    if relevance is None:
+        relevance = candidates @ (query / (np.linalg.norm(query) or 1.0))
+    else:
+        relevance = np.asarray(relevance, dtype=np.float32)
+    if diversity_lambda >= 1.0:
+        return np.argsort(-relevance, kind="stable")[:k].tolist()
+
+    pairwise = candidates @ candidates.T  # n x n, a few dozen candidates
+    selected = [int(np.argmax(relevance))]  # Nothing selected yet: relevance only
+    redundancy = pairwise[selected[0]].copy()  # Max similarity of every row to the selected ones
+    for _ in range(k - 1):
+        scores = diversity_lambda * relevance - (1 - diversity_lambda) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        np.maximum(redundancy, pairwise[best], out=redundancy)
+    return selected
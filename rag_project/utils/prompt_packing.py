@@ -0,0 +1,71 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List
+
+import tiktoken
+
+from rag_project.config import LLM_MODEL, PROMPT_MAX_TOKENS, PROMPT_MIN_DOC_TOKENS
+from rag_project.domain.models import DocumentDomain
+from rag_project.utils.text_processing import sentence_prefix
+
+CONTEXT_SEPARATOR = "\n\n"
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:  # Model unknown to this tiktoken version
+        return tiktoken.get_encoding("o200k_base")
+
+
+@dataclass
+class PackedDocument:
+    doc: DocumentDomain
+    content: str  # Truncated at a sentence boundary when the whole document did not fit
+    tokens: int
+    truncated: bool = False
+
+
+class PromptPacker:
+    """Fills a token budget with the documents in retrieval order, counted with the LLM tokenizer."""
+
+    def __init__(self, model: str = LLM_MODEL, max_tokens: int = PROMPT_MAX_TOKENS,
+                 min_doc_tokens: int = PROMPT_MIN_DOC_TOKENS):
+        self.encoding = get_encoding(model)
+        self.max_tokens = max_tokens
+        self.min_doc_tokens = min_doc_tokens
+        self.separator_tokens = self.count(CONTEXT_SEPARATOR)
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        prefix = self.encoding.decode(tokens[:max_tokens])
+        # Hard cut when the allowed part holds no complete sentence
+        return sentence_prefix(prefix) or prefix.rstrip()
+
+    def pack(self, docs: List[DocumentDomain], budget: int) -> List[PackedDocument]:
+        packed: List[PackedDocument] = []
+        used = 0
+        # Order of the caller kept: similarity, fused rank, MMR selection or re-ranking, best first
+        for doc in docs:
+            separator = self.separator_tokens if packed else 0
+            tokens = self.count(doc.content)
+            if used + separator + tokens <= budget:
+                packed.append(PackedDocument(doc=doc, content=doc.content, tokens=tokens))
+                used += separator + tokens
+                continue
+
+            # First document that does not fit: its beginning fills the rest of the budget
+            remaining = budget - used - separator
+            if remaining >= self.min_doc_tokens:
+                content = self.truncate(doc.content, remaining)
+                tokens = self.count(content)
+                if content and tokens <= remaining:
+                    packed.append(PackedDocument(doc=doc, content=content, tokens=tokens, truncated=True))
+            break
+        return packed
@@ -1,6 +1,13 @@
-# TODO: set optimum max_tokens (see token_limite in rag_service)
+import copy
+import hashlib
+import re
+import threading
+from collections import deque
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple
 
-from typing import List
+# End of sentence followed by spaces, or paragraph break
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
 
 
 def default_chunker(text: str, max_tokens=300) -> List[str]:
@@ -17,3 +24,99 @@ def default_chunker(text: str, max_tokens=300) -> List[str]:
     if current:
         chunks.append(current.strip())
     return chunks
+
+
+def iter_sentences(text: str) -> Iterator[str]:
+    # Single regex scan over the text, sentences are yielded as they are found
+    start = 0
+    for match in _SENTENCE_BOUNDARY.finditer(text):
+        sentence = text[start:match.start()].strip()
+        if sentence:
+            yield sentence
+        start = match.end()
+    sentence = text[start:].strip()
+    if sentence:
+        yield sentence
+
+
+def sentence_prefix(text: str) -> str:
+    """Longest prefix of text ending at a sentence boundary, '' if there is none."""
+    end = 0
+    for match in _SENTENCE_BOUNDARY.finditer(text):
+        end = match.start()
+    return text[:end].rstrip()
+
+
+class TokenChunker:
+    """
+    Chunker measuring lengths with the embedding model tokenizer.
+
+    Sentences are packed into chunks of at most max_tokens word pieces (never more
+    than the model max_seq_length, beyond which the model silently truncates),
+    consecutive chunks share up to overlap_tokens of trailing sentences, and
+    sentences longer than the limit are cut on token boundaries.
+    Runs in linear time and yields chunks while reading the text.
+    """
+
+    def __init__(self, tokenizer, max_seq_length: int, overlap_tokens: int = 32, batch_sentences: int = 256):
+        # Own copy + lock: HF fast tokenizers fail when used by several threads at once (encode runs elsewhere)
+        self.tokenizer = copy.deepcopy(tokenizer)
+        self._lock = threading.Lock()
+        self.model_max_tokens = max_seq_length - tokenizer.num_special_tokens_to_add()  # [CLS] / [SEP]
+        self.overlap_tokens = overlap_tokens
+        self.batch_sentences = batch_sentences
+
+    @classmethod
+    def from_model(cls, model, **kwargs) -> "TokenChunker":
+        return cls(model.tokenizer, model.max_seq_length, **kwargs)
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        with self._lock:
+            encoded = self.tokenizer(texts, add_special_tokens=False, verbose=False)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def _split_long_sentence(self, sentence: str, max_tokens: int) -> Iterator[Tuple[str, int]]:
+        with self._lock:
+            offsets = self.tokenizer(
+                sentence, add_special_tokens=False, return_offsets_mapping=True, verbose=False
+            )["offset_mapping"]
+        for start in range(0, len(offsets), max_tokens):
+            piece = offsets[start:start + max_tokens]
+            yield sentence[piece[0][0]:piece[-1][1]], len(piece)
+
+    def _measured_sentences(self, sentences: Iterable[str], max_tokens: int) -> Iterator[Tuple[str, int]]:
+        sentences = iter(sentences)
+        while True:
+            batch = list(islice(sentences, self.batch_sentences))
+            if not batch:
+                return
+            for sentence, n_tokens in zip(batch, self.count_tokens(batch)):
+                if n_tokens > max_tokens:
+                    yield from self._split_long_sentence(sentence, max_tokens)
+                elif n_tokens:
+                    yield sentence, n_tokens
+
+    def __call__(self, text: str, max_tokens: int = 300) -> Iterator[str]:
+        max_tokens = min(max_tokens, self.model_max_tokens)
+        overlap_tokens = min(self.overlap_tokens, max_tokens // 2)
+
+        window = deque()  # (sentence, n_tokens) of the chunk being built
+        window_tokens = 0
+
+        for sentence, n_tokens in self._measured_sentences(iter_sentences(text), max_tokens):
+            if window and window_tokens + n_tokens > max_tokens:
+                yield " ".join(s for s, _ in window)
+                # Keep the tail of the chunk as overlap, each sentence leaves the window once
+                while window and (window_tokens > overlap_tokens or window_tokens + n_tokens > max_tokens):
+                    window_tokens -= window.popleft()[1]
+
+            window.append((sentence, n_tokens))
+            window_tokens += n_tokens
+
+        if window:
+            yield " ".join(s for s, _ in window)
+
+
+def compute_text_hash(text: str) -> str:
+    # Same value as encode(sha256(convert_to(text, 'UTF8')), 'hex') in PostgreSQL
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
@@ -0,0 +1,71 @@
+"""
+URL normalization and scope rules of the crawler: the normalized URL is the key of the frontier
+(crawl_urls) and the path_to_content of the sources it creates.
+"""
+import posixpath
+from typing import Iterable, Optional
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid")  # Prefixes, dropped from the query
+# Not HTML, not worth a request
+SKIPPED_EXTENSIONS = frozenset((
+    ".pdf", ".zip", ".gz", ".tar", ".tgz", ".rar", ".7z", ".exe", ".dmg", ".iso",
+    ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".ico", ".bmp", ".tif", ".tiff",
+    ".mp3", ".mp4", ".avi", ".mov", ".webm", ".wav", ".ogg",
+    ".css", ".js", ".json", ".xml", ".rss", ".atom", ".woff", ".woff2", ".ttf", ".eot",
+    ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".csv",
+))
+
+
+def _remove_dot_segments(path: str) -> str:
+    if not path:
+        return "/"
+    normalized = posixpath.normpath(path)
+    if normalized.startswith("//"):  # normpath keeps a leading double slash
+        normalized = "/" + normalized.lstrip("/")
+    if path.endswith("/") and normalized != "/":
+        normalized += "/"  # Directory and file are different resources
+    return normalized
+
+
+def normalize_url(url: str, base: Optional[str] = None) -> Optional[str]:
+    """
+    Canonical form: absolute http(s), lowercase scheme and host, no default port, no fragment,
+    dot segments resolved, query parameters sorted without the tracking ones. None when not crawlable.
+    """
+    try:
+        parts = urlsplit(urljoin(base, url.strip()) if base else url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+
+    scheme = parts.scheme.lower()
+    host = parts.hostname  # Lowercased, without credentials
+    if scheme not in DEFAULT_PORTS or not host:
+        return None
+    if ":" in host:  # IPv6
+        host = f"[{host}]"
+    netloc = host if port is None or port == DEFAULT_PORTS[scheme] else f"{host}:{port}"
+
+    # Raw key=value pairs: re-encoding could change what the server receives
+    params = sorted(
+        param for param in parts.query.split("&")
+        if param and not param.split("=", 1)[0].lower().startswith(TRACKING_PARAMS)
+    )
+    return urlunsplit((scheme, netloc, _remove_dot_segments(parts.path), "&".join(params), ""))
+
+
+def url_host(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+def in_scope(url: str, domains: Iterable[str]) -> bool:
+    # A domain also allows its subdomains
+    host = url_host(url)
+    return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+
+def looks_like_page(url: str) -> bool:
+    path = urlsplit(url).path.lower()
+    return posixpath.splitext(path)[1] not in SKIPPED_EXTENSIONS
@@ -0,0 +1,171 @@
+"""
+Crawl worker: pulls crawls from the crawls table and crawls them one at a time, ingesting pages as they come.
+
+    python -m rag_project.workers.crawl_worker
+    python -m rag_project.workers.crawl_worker --seed https://example.com/docs/ --max-depth 2
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+from datetime import timedelta
+from typing import Optional
+
+from prometheus_client import start_http_server
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from rag_project.config import (
+    EMBEDDING_MODELS, WORKER_POLL_INTERVAL, WORKER_STALE_JOB_SECONDS, WORKER_METRICS_PORT, CRAWL_MAX_DEPTH,
+    CRAWL_MAX_PAGES
+)
+from rag_project.db.crud.crawl import CrawlCRUD
+from rag_project.db.mmap_index import build_vector_index
+from rag_project.db.session import AsyncSessionLocal, engine
+from rag_project.db.session_manager import async_db_session_manager
+from rag_project.domain.models import CrawlDomain, CrawlRequest, JobStatusEnum
+from rag_project.logger import get_logger, request_id_var
+from rag_project.services.crawl_service import CrawlService
+from rag_project.services.crawler import Crawler
+from rag_project.services.ingestion_service import IngestionService
+from rag_project.services.model_registry import model_registry
+from rag_project.services.scraping_service import WebScraper, build_http_client
+from rag_project.services.search_backend import sync_vector_index
+
+
+logger = get_logger(__name__)
+
+
+class CrawlWorker:
+    def __init__(
+            self,
+            worker_id: str,
+            crawler: Crawler,
+            session_factory=AsyncSessionLocal,
+            poll_interval: float = WORKER_POLL_INTERVAL
+    ):
+        self.worker_id = worker_id
+        self.crawler = crawler
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        logger.info(f"Crawl worker {self.worker_id} stopping, the current crawl resumes later")
+        self._stopping.set()
+        self.crawler.stop()
+
+    @async_db_session_manager
+    async def claim_crawl(self, session: AsyncSession) -> Optional[CrawlDomain]:
+        crawl = await CrawlCRUD(session).claim_next_crawl(self.worker_id)
+        return CrawlDomain.from_orm(crawl) if crawl else None
+
+    @async_db_session_manager
+    async def finish_crawl(self, session: AsyncSession, crawl_id: int, status: JobStatusEnum, error: str = None):
+        await CrawlCRUD(session).finish_crawl(crawl_id, status, error)
+
+    @async_db_session_manager
+    async def requeue_stale_crawls(self, session: AsyncSession):
+        count = await CrawlCRUD(session).requeue_stale_crawls(stale_after=timedelta(seconds=WORKER_STALE_JOB_SECONDS))
+        if count:
+            logger.warning(f"{count} stale crawls requeued")
+
+    async def process(self, crawl: CrawlDomain):
+        token = request_id_var.set(f"crawl-{crawl.id}")
+        try:
+            logger.info(f"Crawl worker {self.worker_id} crawling {crawl.id} ({crawl.allowed_domains})")
+            try:
+                completed = await self.crawler.run(crawl)
+            except Exception as e:
+                await self.finish_crawl(crawl.id, JobStatusEnum.FAILED, str(e))
+                return
+            # Stopped: back in the queue, its frontier is kept
+            await self.finish_crawl(crawl.id, JobStatusEnum.SUCCEEDED if completed else JobStatusEnum.PENDING)
+        finally:
+            request_id_var.reset(token)
+
+    async def _idle(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self, once: bool = False):
+        logger.info(f"Crawl worker {self.worker_id} started")
+        loop = asyncio.get_running_loop()
+        next_requeue = 0.0
+
+        while not self._stopping.is_set():
+            try:
+                if loop.time() >= next_requeue:
+                    await self.requeue_stale_crawls()
+                    next_requeue = loop.time() + 60
+                crawl = await self.claim_crawl()
+            except Exception:
+                # Already logged by the session manager, DB may be restarting
+                await self._idle(self.poll_interval)
+                continue
+
+            if crawl is None:
+                if once:
+                    break
+                await self._idle(self.poll_interval)
+                continue
+
+            await self.process(crawl)
+
+        logger.info(f"Crawl worker {self.worker_id} stopped")
+
+
+async def serve(worker_id: str, request: Optional[CrawlRequest] = None):
+    model_registry.load_all(EMBEDDING_MODELS)
+    model = model_registry.get()
+    vector_index = build_vector_index(model.get_sentence_embedding_dimension())
+    if vector_index is not None:
+        await sync_vector_index(vector_index)
+    scraper = WebScraper(build_http_client())
+    service = IngestionService(model=model, scraper=scraper, vector_index=vector_index)
+    worker = CrawlWorker(worker_id, Crawler(service, scraper))
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+
+    try:
+        if request is not None:
+            crawl = await CrawlService().create_crawl(request=request)
+            logger.info(f"Crawl {crawl.id} created")
+        # With a crawl given on the command line, exit once the queue is empty
+        await worker.run(once=request is not None)
+    finally:
+        await scraper.aclose()
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl worker")
+    parser.add_argument("--seed", action="append", default=[], help="Start url, repeatable: queue a crawl and run it")
+    parser.add_argument("--sitemap", action="append", default=[], help="Sitemap or sitemap index, repeatable")
+    parser.add_argument("--allowed-domain", action="append", default=None,
+                        help="Domain to stay in, repeatable (hosts of the seeds and sitemaps by default)")
+    parser.add_argument("--max-depth", type=int, default=CRAWL_MAX_DEPTH)
+    parser.add_argument("--max-pages", type=int, default=CRAWL_MAX_PAGES)
+    args = parser.parse_args()
+
+    request = None
+    if args.seed or args.sitemap:
+        request = CrawlRequest(
+            seeds=args.seed,
+            sitemaps=args.sitemap,
+            allowed_domains=args.allowed_domain,
+            max_depth=args.max_depth,
+            max_pages=args.max_pages
+        )
+
+    if WORKER_METRICS_PORT:
+        start_http_server(WORKER_METRICS_PORT)
+    asyncio.run(serve(f"{socket.gethostname()}-{os.getpid()}-crawl", request))
+
+
+if __name__ == "__main__":
+    main()
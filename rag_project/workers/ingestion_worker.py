@@ -0,0 +1,228 @@
+"""
+Ingestion worker pool: separate processes pulling jobs from the ingestion_jobs table.
+
+    python -m rag_project.workers.ingestion_worker --processes 4
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+from datetime import timedelta
+from typing import Optional
+
+import httpx
+from prometheus_client import start_http_server
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from rag_project.config import (
+    EMBEDDING_MODELS, WORKER_PROCESSES, WORKER_POLL_INTERVAL, WORKER_JOB_MAX_ATTEMPTS, WORKER_STALE_JOB_SECONDS,
+    WORKER_METRICS_PORT, WORKER_HEARTBEAT_SECONDS
+)
+from rag_project.db.crud.job import JobCRUD
+from rag_project.db.mmap_index import build_vector_index
+from rag_project.db.session import AsyncSessionLocal, engine
+from rag_project.db.session_manager import async_db_session_manager
+from rag_project.domain.models import IngestionJobDomain
+from rag_project.exceptions import DataBaseError, TimeOutError
+from rag_project.logger import get_logger, request_id_var
+from rag_project.services.ingestion_service import IngestionService
+from rag_project.services.model_registry import model_registry
+from rag_project.services.scraping_service import WebScraper, build_http_client
+from rag_project.services.search_backend import sync_vector_index
+
+
+logger = get_logger(__name__)
+
+# Errors worth another attempt, anything else (bad URL, empty page...) fails the job right away.
+# Pages are fetched outside any session: their timeouts come untranslated
+RETRYABLE_ERRORS = (DataBaseError, TimeOutError, httpx.TimeoutException)
+
+
+class IngestionWorker:
+    def __init__(
+            self,
+            worker_id: str,
+            service: IngestionService,
+            session_factory=AsyncSessionLocal,
+            poll_interval: float = WORKER_POLL_INTERVAL,
+            heartbeat_interval: float = WORKER_HEARTBEAT_SECONDS
+    ):
+        self.worker_id = worker_id
+        self.service = service
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        logger.info(f"Worker {self.worker_id} stopping after current job")
+        self._stopping.set()
+
+    # Each job update is its own short transaction, visible to the API while the ingestion runs
+
+    @async_db_session_manager
+    async def claim_job(self, session: AsyncSession) -> Optional[IngestionJobDomain]:
+        job = await JobCRUD(session).claim_next_job(self.worker_id)
+        return IngestionJobDomain.from_orm(job) if job else None
+
+    @async_db_session_manager
+    async def report_progress(self, session: AsyncSession, job_id: int, stage: str, progress: float):
+        await JobCRUD(session).update_progress(job_id, stage, progress)
+
+    @async_db_session_manager
+    async def heartbeat(self, session: AsyncSession, job_id: int) -> bool:
+        return await JobCRUD(session).heartbeat(job_id, self.worker_id)
+
+    async def _heartbeats(self, job_id: int):
+        # updated_at only moves on progress: a long stage (embedding a large page) would look stale without it
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                if not await self.heartbeat(job_id):
+                    logger.warning(f"Job {job_id} is no longer held by worker {self.worker_id}")
+                    return
+            except Exception:
+                pass  # Already logged by the session manager, next beat may go through
+
+    @async_db_session_manager
+    async def finish_job(self, session: AsyncSession, job_id: int, chunks_count: int):
+        await JobCRUD(session).finish_job(job_id, chunks_count)
+
+    @async_db_session_manager
+    async def fail_job(self, session: AsyncSession, job_id: int, error: str, retry: bool):
+        await JobCRUD(session).fail_job(job_id, error, retry=retry)
+
+    @async_db_session_manager
+    async def requeue_stale_jobs(self, session: AsyncSession):
+        count = await JobCRUD(session).requeue_stale_jobs(
+            stale_after=timedelta(seconds=WORKER_STALE_JOB_SECONDS),
+            max_attempts=WORKER_JOB_MAX_ATTEMPTS
+        )
+        if count:
+            logger.warning(f"{count} stale jobs requeued")
+
+    async def process(self, job: IngestionJobDomain):
+        # Logs and stage spans of the job carry its id
+        token = request_id_var.set(f"job-{job.id}")
+        heartbeats = asyncio.create_task(self._heartbeats(job.id), name=f"job-{job.id}-heartbeat")
+        try:
+            await self._process(job)
+        finally:
+            heartbeats.cancel()
+            request_id_var.reset(token)
+
+    async def _process(self, job: IngestionJobDomain):
+        logger.info(f"Worker {self.worker_id} processing job {job.id} ({job.path_to_content})")
+
+        async def on_progress(stage: str, progress: float):
+            await self.report_progress(job.id, stage, progress)
+
+        try:
+            count = await self.service.ingest_content(
+                source_type=job.source_type,
+                url=job.path_to_content,
+                on_progress=on_progress
+            )
+        except Exception as e:
+            retry = isinstance(e, RETRYABLE_ERRORS) and job.attempts < WORKER_JOB_MAX_ATTEMPTS
+            await self.fail_job(job.id, str(e), retry)
+            return
+
+        await self.finish_job(job.id, count)
+        logger.info(f"Job {job.id} done : {count} chunks")
+
+    async def _idle(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self):
+        logger.info(f"Worker {self.worker_id} started")
+        loop = asyncio.get_running_loop()
+        next_requeue = 0.0
+
+        while not self._stopping.is_set():
+            try:
+                if loop.time() >= next_requeue:
+                    await self.requeue_stale_jobs()
+                    next_requeue = loop.time() + 60
+                job = await self.claim_job()
+            except Exception:
+                # Already logged by the session manager, DB may be restarting
+                await self._idle(self.poll_interval)
+                continue
+
+            if job is None:
+                await self._idle(self.poll_interval)
+                continue
+
+            await self.process(job)
+
+        logger.info(f"Worker {self.worker_id} stopped")
+
+
+async def serve(worker_id: str):
+    # Everything is built inside the child process: models, DB pool and HTTP pool are per process
+    model_registry.load_all(EMBEDDING_MODELS)
+    model = model_registry.get()
+    vector_index = build_vector_index(model.get_sentence_embedding_dimension())
+    if vector_index is not None:
+        await sync_vector_index(vector_index)
+    scraper = WebScraper(build_http_client())
+    worker = IngestionWorker(
+        worker_id, IngestionService(model=model, scraper=scraper, vector_index=vector_index)
+    )
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+
+    try:
+        await worker.run()
+    finally:
+        await scraper.aclose()
+        await engine.dispose()
+
+
+def run_worker_process(index: int):
+    if WORKER_METRICS_PORT:
+        # Each process has its own registry, hence its own port
+        start_http_server(WORKER_METRICS_PORT + index)
+    asyncio.run(serve(f"{socket.gethostname()}-{os.getpid()}-{index}"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestion worker pool")
+    parser.add_argument("--processes", type=int, default=WORKER_PROCESSES, help="Number of worker processes")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        run_worker_process(0)
+        return
+
+    # spawn: no engine / torch state inherited from the parent
+    mp_context = multiprocessing.get_context("spawn")
+    processes = [
+        mp_context.Process(target=run_worker_process, args=(index,), name=f"ingestion-worker-{index}")
+        for index in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    def forward_signal(signum, _frame):
+        for child in processes:
+            if child.is_alive():
+                os.kill(child.pid, signum)
+
+    signal.signal(signal.SIGTERM, forward_signal)
+    signal.signal(signal.SIGINT, forward_signal)
+
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()